@@ -1,6 +1,6 @@
 from .base import init_db
-from .session import get_db, engine, SessionLocal
+from .session import get_db, get_read_db, engine, read_engine, SessionLocal, ReadSessionLocal
 
-__all__ = ["init_db", "get_db", "engine", "SessionLocal"]
+__all__ = ["init_db", "get_db", "get_read_db", "engine", "read_engine", "SessionLocal", "ReadSessionLocal"]
 
 
@@ -1,8 +1,42 @@
-from app.models.entities import Base
+from sqlalchemy import exists, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.models.entities import Base, StoreStatus, StoreStatusRun, StoreUptimeHourly
 from app.db.session import engine
+from app.services.compaction_service import rebuild_status_runs
+from app.services.rollup_service import rebuild_hourly_rollups
 
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def _add_missing_columns():
+    # create_all skips existing tables, so add nullable columns introduced since
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
 
+def _backfill_derived_tables():
+    # Tables derived from store_status are kept up to date by ingest, but a
+    # database created before one existed has pings and no derived rows
+    with Session(bind=engine) as db:
+        if not db.execute(select(exists().select_from(StoreStatus))).scalar():
+            return
+        if not db.execute(select(exists().select_from(StoreUptimeHourly))).scalar():
+            rebuild_hourly_rollups(db)
+        if not db.execute(select(exists().select_from(StoreStatusRun))).scalar():
+            rebuild_status_runs(db)
 
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    # create_all skips existing tables, so add indexes introduced since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    _backfill_derived_tables()
@@ -1,14 +1,24 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.db.sqlite import configure_engine, read_only_url
+
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./store_monitoring.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+engine = configure_engine(
+    create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Reports, get_report polling and the store endpoints read through their
+# own pool of read-only connections, each session on one snapshot
+read_engine = configure_engine(
+    create_engine(read_only_url(SQLALCHEMY_DATABASE_URL), connect_args={"check_same_thread": False}),
+    read_only=True,
+)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 
 def get_db():
     db = SessionLocal()
@@ -18,3 +28,9 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
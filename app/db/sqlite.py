@@ -0,0 +1,62 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import URL, Engine, make_url
+
+
+# WAL lets reports and get_report polling read while an ingest or a job
+# update writes; SQLITE_WAL=0 leaves the journal mode alone (a database
+# already in WAL stays in WAL)
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "1").lower() in ("1", "true", "yes")
+# how long a writer waits for another writer's lock before failing
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+# page cache per connection
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+
+
+def read_only_url(url: str | URL) -> URL:
+    # The same SQLite file opened with mode=ro: writes to it fail, TEMP
+    # tables still work
+    url = make_url(url)
+    database = url.database
+    if not database or database == ":memory:" or database.startswith("file:"):
+        return url
+    return url.set(database=f"file:{database}", query={**url.query, "mode": "ro", "uri": "true"})
+
+
+def _apply_pragmas(dbapi_connection, read_only: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        if SQLITE_WAL and not read_only:
+            # persistent in the file; a no-op once set
+            cursor.execute("PRAGMA journal_mode = WAL")
+            # in WAL mode NORMAL can lose the last commits on power loss,
+            # never consistency
+            cursor.execute("PRAGMA synchronous = NORMAL")
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine: Engine, read_only: bool = False) -> Engine:
+    # Applies the pragmas to each new connection. With WAL, sessions of a
+    # read-only engine run in one SQLite read transaction each, so all
+    # their queries see the snapshot of their first one; without WAL that
+    # would hold a shared lock against writers, so reads stay autocommit.
+    snapshot = read_only and SQLITE_WAL
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _record):
+        _apply_pragmas(dbapi_connection, read_only)
+        if snapshot:
+            # pysqlite only opens transactions before writes; take over
+            dbapi_connection.isolation_level = None
+
+    if snapshot:
+
+        @event.listens_for(engine, "begin")
+        def _on_begin(connection):
+            connection.exec_driver_sql("BEGIN")
+
+    return engine
@@ -1,7 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import report
+from app.routers import ingest, metrics, report, stores
 from app.db.base import init_db
 
 
@@ -17,6 +17,10 @@ def create_app() -> FastAPI:
     )
 
     app.include_router(report.router, prefix="/api")
+    app.include_router(stores.router, prefix="/api")
+    app.include_router(ingest.router, prefix="/api")
+    # scraped by Prometheus at the conventional path, outside /api
+    app.include_router(metrics.router)
     return app
 
 
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, DateTime
+from sqlalchemy import String, Integer, Float, DateTime, Index
 
 
 class Base(DeclarativeBase):
@@ -8,6 +8,10 @@ class Base(DeclarativeBase):
 
 class StoreStatus(Base):
     __tablename__ = "store_status"
+    __table_args__ = (
+        # per-store time range scans and carry-in lookups in report queries
+        Index("ix_store_status_store_id_timestamp_utc", "store_id", "timestamp_utc"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     store_id: Mapped[str] = mapped_column(String, index=True)
@@ -33,13 +37,69 @@ class StoreTimezone(Base):
     timezone_str: Mapped[str] = mapped_column(String)
 
 
+class StoreUptimeHourly(Base):
+    # Business-hours up/down seconds per store and UTC hour, maintained at
+    # ingest so reports can sum complete hours instead of replaying pings
+    __tablename__ = "store_uptime_hourly"
+
+    store_id: Mapped[str] = mapped_column(String, primary_key=True)
+    hour_utc: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    up_seconds: Mapped[int] = mapped_column(Integer)
+    down_seconds: Mapped[int] = mapped_column(Integer)
+    first_status: Mapped[str] = mapped_column(String)  # status in force at the hour start
+    last_status: Mapped[str] = mapped_column(String)  # status in force at the hour end
+
+
+class StoreStatusRun(Base):
+    # store_status run-length encoded: status holds from start_utc (the ping
+    # where it changed) until end_utc, the next run's start or, for a
+    # store's last run, its latest ping
+    __tablename__ = "store_status_run"
+
+    store_id: Mapped[str] = mapped_column(String, primary_key=True)
+    start_utc: Mapped[DateTime] = mapped_column(DateTime, primary_key=True)
+    end_utc: Mapped[DateTime] = mapped_column(DateTime)
+    status: Mapped[str] = mapped_column(String)
+
+
+class StoreWatermark(Base):
+    # Latest ingest that touched a store; reports reuse a store's previous
+    # row only while its batch_id is unchanged
+    __tablename__ = "store_watermark"
+
+    store_id: Mapped[str] = mapped_column(String, primary_key=True)
+    batch_id: Mapped[int] = mapped_column(Integer, index=True)
+    last_timestamp_utc: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+
+
 class ReportJob(Base):
     __tablename__ = "report_job"
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
-    status: Mapped[str] = mapped_column(String, index=True)  # Running | Complete | Failed
+    status: Mapped[str] = mapped_column(String, index=True)  # Running | Complete | Failed | Expired
     created_at: Mapped[DateTime] = mapped_column(DateTime)
     completed_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
     csv_path: Mapped[str | None] = mapped_column(String, nullable=True)
+    horizons: Mapped[str | None] = mapped_column(String, nullable=True)  # e.g. "900s,21600s"; None = default
+    as_of_utc: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)  # fixed report end
+    # backfill: one long-format report per as-of from as_of_utc through
+    # as_of_until_utc, as_of_step_seconds apart
+    as_of_until_utc: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    as_of_step_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    report_end_utc: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    ingest_batch: Mapped[int | None] = mapped_column(Integer, nullable=True)  # latest batch the report saw
+    stores_total: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    stores_reused: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    reuse_ratio: Mapped[float | None] = mapped_column(Float, nullable=True)
+    cache_key: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
+    # queue lease: a Running job with no owner, or an expired lease, is claimable
+    lease_owner: Mapped[str | None] = mapped_column(String, nullable=True)
+    lease_expires_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # wall seconds of the last attempt, and its per-phase timings as JSON
+    # (PhaseTimings.to_dict)
+    duration_seconds: Mapped[float | None] = mapped_column(Float, nullable=True)
+    timings: Mapped[str | None] = mapped_column(String, nullable=True)
 
 
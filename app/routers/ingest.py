@@ -0,0 +1,86 @@
+from typing import Dict, List
+
+import pytz
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.db.session import get_db
+from app.services.ingest_service import StreamingLoad
+from app.utils.record_streams import RecordStreamError
+
+
+router = APIRouter(tags=["ingest"])
+
+# Content-Type of an upload -> record format
+UPLOAD_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class Reject(BaseModel):
+    line: int
+    error: str
+
+
+class IngestResult(BaseModel):
+    table: str
+    rows: int  # rows loaded into table
+    rejected: int
+    rejects: List[Reject]  # the first rejected rows
+    counts: Dict[str, int]  # rows written per table, as load_zip_into_db returns
+
+
+async def _ingest(request: Request, db: Session, table: str) -> IngestResult:
+    # The body is parsed chunk by chunk as it arrives; the next chunk is
+    # only read once the current one is parsed and any full batch staged.
+    # Nothing is published unless the whole body arrives.
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    record_format = UPLOAD_FORMATS.get(media_type)
+    if record_format is None:
+        raise HTTPException(
+            status_code=415, detail=f"expected a body of one of {sorted(UPLOAD_FORMATS)}, got {media_type!r}"
+        )
+    load = await run_in_threadpool(StreamingLoad, db, table, record_format)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(load.feed, chunk)
+        counts = await run_in_threadpool(load.finish)
+    except RecordStreamError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except (ValueError, pytz.UnknownTimeZoneError) as exc:
+        # rows that parsed but could not be published, e.g. pings of a store
+        # whose stored hours or timezone predate validation; nothing was
+        # published
+        error = f"unknown timezone {exc}" if isinstance(exc, pytz.UnknownTimeZoneError) else str(exc)
+        raise HTTPException(
+            status_code=422, detail={"error": error, "rejected": load.rejected, "rejects": load.rejects}
+        )
+    finally:
+        await run_in_threadpool(load.close)
+    return IngestResult(
+        table=table, rows=counts[table], rejected=load.rejected, rejects=load.rejects, counts=counts
+    )
+
+
+@router.post("/ingest/status", response_model=IngestResult)
+async def ingest_status(request: Request, db: Session = Depends(get_db)):
+    # store_id, timestamp_utc, status
+    return await _ingest(request, db, "store_status")
+
+
+@router.post("/ingest/business_hours", response_model=IngestResult)
+async def ingest_business_hours(request: Request, db: Session = Depends(get_db)):
+    # store_id, day (or day_of_week), start_time_local, end_time_local
+    return await _ingest(request, db, "business_hours")
+
+
+@router.post("/ingest/timezones", response_model=IngestResult)
+async def ingest_timezones(request: Request, db: Session = Depends(get_db)):
+    # store_id, timezone_str
+    return await _ingest(request, db, "store_timezone")
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+import pytz
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.db.session import get_read_db
+from app.services.metrics_service import render_metrics
+
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(db: Session = Depends(get_read_db)):
+    return PlainTextResponse(render_metrics(db, datetime.now(tz=pytz.UTC)), media_type=PROMETHEUS_CONTENT_TYPE)
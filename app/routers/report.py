@@ -1,16 +1,29 @@
-from datetime import datetime
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import AsyncIterator, List, Optional, Sequence
 from uuid import uuid4
 
 import pytz
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
-from fastapi.responses import FileResponse, PlainTextResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from app.db.session import get_db, SessionLocal
+from app.db.session import get_db, ReadSessionLocal, SessionLocal
 from app.models.entities import ReportJob
-from app.services.report_service import generate_report
+from app.services.backfill_service import as_of_times
+from app.services.report_cache import EXPIRED, cache_key, evict_reports, find_cached_job
+from app.services.report_events import REPORT_EVENTS
+from app.services.report_queue import WorkerConfig, process_jobs
+from app.services.report_service import HORIZONS, report_headers
+from app.services.watermark_service import current_batch
+from app.utils.horizons import format_horizons, parse_horizon, parse_horizons
+from app.utils.http_files import file_response
 
 
 router = APIRouter(tags=["report"])
@@ -21,52 +34,246 @@ class ReportStatus(BaseModel):
     status: str
 
 
-REPORT_DIR = Path("reports")
+class ReportRequest(BaseModel):
+    # e.g. ["15m", "6h", "30d"]; defaults to last hour, day and week
+    horizons: Optional[List[str]] = None
+    # report end; defaults to max(latest ping, trigger time). Only reports
+    # with the same end and horizons reuse each other's rows, so in practice
+    # only as_of reports are incremental
+    as_of: Optional[datetime] = None
+
+
+class BackfillRequest(BaseModel):
+    # as-of times start, start + step, ... through end
+    start: datetime
+    end: datetime
+    step: str = "1d"
+    horizons: Optional[List[str]] = None
+
+
+QUEUE_CONFIG = WorkerConfig.from_env()
+REPORT_DIR = QUEUE_CONFIG.output_dir
 REPORT_DIR.mkdir(exist_ok=True)
+# "background": the API process drains the queue from background tasks;
+# "worker": jobs are only queued, for scripts/report_worker.py to run
+REPORT_EXECUTOR = os.environ.get("REPORT_EXECUTOR", "background")
+# triggers within the same TTL bucket over unchanged data share one report; 0 disables
+REPORT_CACHE_TTL_SECONDS = int(os.environ.get("REPORT_CACHE_TTL_SECONDS", "60"))
+# report CSVs older than this are deleted and their jobs marked Expired
+REPORT_RETENTION_SECONDS = int(os.environ.get("REPORT_RETENTION_SECONDS", str(24 * 3600)))
+# longest get_report?wait= honoured, in seconds
+REPORT_WAIT_MAX_SECONDS = float(os.environ.get("REPORT_WAIT_MAX_SECONDS", "60"))
+# waiting requests and event streams re-read report_job this often, for jobs
+# run by a separate worker, which never publish to this process's events
+REPORT_WAIT_RECHECK_SECONDS = float(os.environ.get("REPORT_WAIT_RECHECK_SECONDS", "5"))
+
+_trigger_lock = threading.Lock()
+
+
+def _drain_queue():
+    # Runs queued jobs until none can be claimed (queue empty or
+    # REPORT_MAX_CONCURRENT leases live); finishing jobs drain the rest.
+    process_jobs(SessionLocal, QUEUE_CONFIG, stop_when_idle=True, read_session_factory=ReadSessionLocal)
+
 
+def _to_utc(value: datetime) -> datetime:
+    # naive timestamps are UTC, like the data
+    return value.replace(tzinfo=pytz.UTC) if value.tzinfo is None else value.astimezone(pytz.UTC)
 
-def _run_report_job(report_id: str):
-    db = SessionLocal()
+
+def _cache_params(horizons: Sequence[timedelta], as_of: datetime | None) -> dict:
+    # everything besides data and time that shapes the CSV
+    return {
+        "horizons": [int(h.total_seconds()) for h in horizons],
+        "columns": report_headers(horizons),
+        "as_of": int(as_of.timestamp()) if as_of is not None else None,
+    }
+
+
+def _enqueue(
+    background_tasks: BackgroundTasks, db: Session, params: dict, pinned: bool, **job_fields
+) -> ReportStatus:
+    # Attaches to a cached job with the same key or queues a new one;
+    # pinned reports (fixed as-of times) are keyed without the time bucket
+    now = datetime.now(tz=pytz.UTC)
+    evict_reports(db, REPORT_DIR, REPORT_RETENTION_SECONDS, now)
+    # look-up-or-create is serialised so concurrent triggers coalesce
+    with _trigger_lock:
+        key = None
+        if REPORT_CACHE_TTL_SECONDS > 0:
+            # a fixed as_of does not go stale with time, only with new data
+            key = cache_key(current_batch(db), None if pinned else now, REPORT_CACHE_TTL_SECONDS, params)
+            cached = find_cached_job(db, key)
+            if cached is not None:
+                return ReportStatus(report_id=cached.id, status=cached.status)
+        report_id = uuid4().hex
+        job = ReportJob(id=report_id, status="Running", created_at=now, cache_key=key, **job_fields)
+        db.add(job)
+        db.commit()
+    if REPORT_EXECUTOR == "background":
+        background_tasks.add_task(_drain_queue)
+    return ReportStatus(report_id=report_id, status="Running")
+
+
+@router.post("/trigger_report", response_model=ReportStatus)
+def trigger_report(
+    background_tasks: BackgroundTasks,
+    body: Optional[ReportRequest] = None,
+    db: Session = Depends(get_db),
+):
+    body = body or ReportRequest()
     try:
-        now = datetime.now(tz=pytz.UTC)
-        csv_path = generate_report(db=db, output_dir=REPORT_DIR, now_utc=now)
-        job = db.get(ReportJob, report_id)
-        if job:
-            job.status = "Complete"
-            job.completed_at = now
-            job.csv_path = str(csv_path)
-            db.add(job)
-            db.commit()
-    except Exception:
-        job = db.get(ReportJob, report_id)
-        if job:
-            job.status = "Failed"
-            db.add(job)
-            db.commit()
+        horizons = parse_horizons(body.horizons) if body.horizons is not None else HORIZONS
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    as_of = _to_utc(body.as_of) if body.as_of is not None else None
+    return _enqueue(
+        background_tasks,
+        db,
+        _cache_params(horizons, as_of),
+        pinned=as_of is not None,
+        horizons=format_horizons(horizons),
+        as_of_utc=as_of,
+    )
+
+
+@router.post("/trigger_backfill", response_model=ReportStatus)
+def trigger_backfill(
+    background_tasks: BackgroundTasks,
+    body: BackfillRequest,
+    db: Session = Depends(get_db),
+):
+    # One long-format CSV (store_id, as_of, ...) with the report for every
+    # as-of time from start to end, step apart; fetched via get_report
+    try:
+        horizons = parse_horizons(body.horizons) if body.horizons is not None else HORIZONS
+        step = parse_horizon(body.step)
+        start, end = _to_utc(body.start), _to_utc(body.end)
+        as_of_times(start, end, step)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    params = {
+        **_cache_params(horizons, start),
+        "until": int(end.timestamp()),
+        "step": int(step.total_seconds()),
+    }
+    return _enqueue(
+        background_tasks,
+        db,
+        params,
+        pinned=True,
+        horizons=format_horizons(horizons),
+        as_of_utc=start,
+        as_of_until_utc=end,
+        as_of_step_seconds=int(step.total_seconds()),
+    )
+
+
+def _load_job(report_id: str) -> ReportJob | None:
+    db = ReadSessionLocal()
+    try:
+        return db.get(ReportJob, report_id)
     finally:
         db.close()
 
 
-@router.post("/trigger_report", response_model=ReportStatus)
-def trigger_report(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    report_id = uuid4().hex
-    job = ReportJob(id=report_id, status="Running", created_at=datetime.now(tz=pytz.UTC))
-    db.add(job)
-    db.commit()
-    background_tasks.add_task(_run_report_job, report_id)
-    return ReportStatus(report_id=report_id, status="Running")
+async def _wait_for_job(report_id: str, timeout: float) -> ReportJob | None:
+    # The job once it has left Running, or as it is when timeout runs out.
+    # Woken by REPORT_EVENTS; report_job is only read again on an outcome
+    # or every REPORT_WAIT_RECHECK_SECONDS.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    with REPORT_EVENTS.subscribe(report_id) as events:
+        job = await run_in_threadpool(_load_job, report_id)
+        while job is not None and job.status == "Running":
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(events.get(), min(remaining, REPORT_WAIT_RECHECK_SECONDS))
+                if event.status == "Running":
+                    continue
+            except asyncio.TimeoutError:
+                pass
+            job = await run_in_threadpool(_load_job, report_id)
+    return job
+
+
+def _job_state(job: ReportJob) -> dict:
+    # stores_done: progress published while Running, stores_total once done
+    if job.status == "Running":
+        latest = REPORT_EVENTS.latest(job.id)
+        stores_done = latest.stores_done if latest is not None and latest.status == "Running" else None
+    else:
+        stores_done = job.stores_total
+    return {"report_id": job.id, "status": job.status, "stores_done": stores_done}
+
+
+def _sse(state: dict) -> str:
+    return f"event: status\ndata: {json.dumps(state)}\n\n"
+
+
+async def _job_events(report_id: str) -> AsyncIterator[str]:
+    with REPORT_EVENTS.subscribe(report_id) as events:
+        job = await run_in_threadpool(_load_job, report_id)
+        if job is None:
+            return
+        state = _job_state(job)
+        yield _sse(state)
+        while state["status"] == "Running":
+            try:
+                event = await asyncio.wait_for(events.get(), REPORT_WAIT_RECHECK_SECONDS)
+            except asyncio.TimeoutError:
+                event = None
+            if event is not None and event.status == "Running":
+                current = {"report_id": report_id, "status": "Running", "stores_done": event.stores_done}
+            else:
+                # an outcome, or time to check on a job run elsewhere
+                job = await run_in_threadpool(_load_job, report_id)
+                if job is None:
+                    return
+                current = _job_state(job)
+            if current == state:
+                # a comment, so proxies keep the connection open
+                yield ": keep-alive\n\n"
+                continue
+            state = current
+            yield _sse(state)
 
 
 @router.get("/get_report")
-def get_report(report_id: str, db: Session = Depends(get_db)):
-    job = db.get(ReportJob, report_id)
+async def get_report(report_id: str, request: Request, wait: float = Query(0, ge=0)):
+    # wait: hold the request up to that many seconds (capped at
+    # REPORT_WAIT_MAX_SECONDS) while the report is Running, instead of
+    # answering "Running" straight away
+    if wait > 0:
+        job = await _wait_for_job(report_id, min(wait, REPORT_WAIT_MAX_SECONDS))
+    else:
+        job = await run_in_threadpool(_load_job, report_id)
     if not job:
         raise HTTPException(status_code=404, detail="report_id not found")
+    if job.status == EXPIRED:
+        raise HTTPException(status_code=410, detail="report expired; trigger a new one")
     if job.status != "Complete" or not job.csv_path:
         return PlainTextResponse("Running")
     file_path = Path(job.csv_path)
     if not file_path.exists():
         raise HTTPException(status_code=500, detail="report file missing")
-    return FileResponse(path=str(file_path), media_type="text/csv", filename=file_path.name)
+    # ETag/If-None-Match, Range and gzip negotiation for large reports
+    filename = file_path.name.removesuffix(".gz")
+    return file_response(request, file_path, media_type="text/csv", filename=filename)
 
 
+@router.get("/report_events")
+async def report_events(report_id: str):
+    # Server-Sent Events: a `status` event with the job's state
+    # ({"report_id", "status", "stores_done"}), then one per progress update
+    # or transition; the stream ends once the job leaves Running
+    if await run_in_threadpool(_load_job, report_id) is None:
+        raise HTTPException(status_code=404, detail="report_id not found")
+    return StreamingResponse(
+        _job_events(report_id),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
@@ -0,0 +1,41 @@
+import os
+from datetime import datetime
+from typing import Dict, List
+
+import pytz
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.db.session import get_read_db
+from app.services.store_uptime_service import StoreResultCache, store_uptime
+
+
+router = APIRouter(tags=["stores"])
+
+# per-store results are reused for this long unless the store is re-ingested
+STORE_UPTIME_TTL_SECONDS = float(os.environ.get("STORE_UPTIME_TTL_SECONDS", "5"))
+# stores accepted by one list request; larger sets belong in a report
+STORE_UPTIME_MAX_STORES = int(os.environ.get("STORE_UPTIME_MAX_STORES", "50"))
+
+_results = StoreResultCache(ttl_seconds=STORE_UPTIME_TTL_SECONDS)
+
+
+@router.get("/stores/uptime")
+def get_stores_uptime(
+    store_id: List[str] = Query(..., description="repeat for several stores"),
+    db: Session = Depends(get_read_db),
+) -> List[Dict[str, object]]:
+    if len(set(store_id)) > STORE_UPTIME_MAX_STORES:
+        raise HTTPException(
+            status_code=400, detail=f"at most {STORE_UPTIME_MAX_STORES} stores per request; use trigger_report"
+        )
+    results = store_uptime(db, store_id, datetime.now(tz=pytz.UTC), _results)
+    return list(results.values())
+
+
+@router.get("/stores/{store_id}/uptime")
+def get_store_uptime(store_id: str, db: Session = Depends(get_read_db)) -> Dict[str, object]:
+    results = store_uptime(db, [store_id], datetime.now(tz=pytz.UTC), _results)
+    if store_id not in results:
+        raise HTTPException(status_code=404, detail="store_id not found")
+    return results[store_id]
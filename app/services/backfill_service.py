@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import csv
+from contextlib import ExitStack
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.services.compaction_service import require_status_runs
+from app.services.report_service import HORIZONS, open_report, report_headers
+from app.services.store_queries import load_observations, load_schedules, store_pages
+from app.services.watermark_service import current_batch
+from app.utils import uptime_engine
+from app.utils.horizons import horizon_label, horizon_unit_seconds
+from app.utils.observations import epoch_to_naive_utc
+from app.utils.schedules import compile_store_schedule
+
+
+# Historical backfill: the reports generate_report(as_of=t) would write for
+# a series of as-of times, computed together. Each page of stores is read
+# once over [first as-of - longest horizon, last as-of], schedule windows
+# are expanded once over the same span, and every (as-of, horizon) total is
+# a difference of two prefix sums over that one timeline.
+
+# one output file per as-of time keeps that many files open at once
+MAX_BACKFILL_REPORTS = 400
+BACKFILL_STORE_BATCH_SIZE = 1000
+# backfills replay a timeline; rollups only help reports ending at one instant
+BACKFILL_SOURCES = ("raw", "compact")
+
+
+def as_of_times(start: datetime, until: datetime, step: timedelta) -> List[datetime]:
+    # start, start + step, ... up to and including until
+    if start.tzinfo is None or until.tzinfo is None:
+        raise ValueError("backfill bounds must be timezone-aware")
+    if step <= timedelta(0):
+        raise ValueError("backfill step must be positive")
+    if until < start:
+        raise ValueError("backfill end is before its start")
+    count = (until - start) // step + 1
+    if count > MAX_BACKFILL_REPORTS:
+        raise ValueError(f"at most {MAX_BACKFILL_REPORTS} as-of times per backfill; use a larger step")
+    return [start + i * step for i in range(count)]
+
+
+def _backfill_page(
+    db: Session,
+    page: List[str],
+    ends: np.ndarray,
+    horizons: Sequence[timedelta],
+    compact: bool,
+) -> List[Tuple[int, Dict[str, object]]]:
+    # (as-of index, report row) for the stores of one page, by store_id and
+    # then as-of time
+    seconds = [int(h.total_seconds()) for h in horizons]
+    origin = int(ends[0]) - max(seconds)
+    last_end = int(ends[-1])
+    if compact:
+        require_status_runs(db, last_end, page[0], page[-1])
+    store_to_obs = load_observations(db, origin, last_end, page[0], page[-1], compact=compact)
+    store_to_bh, tz_map = load_schedules(db, page[0], page[-1])
+
+    labels = [horizon_label(h) for h in horizons]
+    units = [horizon_unit_seconds(h) for h in horizons]
+    rows: List[Tuple[int, Dict[str, object]]] = []
+    for store_id in sorted(store_to_obs):
+        times, statuses = store_to_obs[store_id].as_numpy()
+        schedule = compile_store_schedule(store_to_bh.get(store_id, []), tz_map.get(store_id))
+        windows = np.asarray(schedule.epoch_windows_for_range(origin, last_end), dtype=np.int64).reshape(-1, 2)
+        up, down = uptime_engine.compute_uptime_sliding(
+            times, statuses, windows[:, 0], windows[:, 1], origin, ends, seconds
+        )
+        # a store only appears in reports ending after its first ping
+        for i in range(int(np.searchsorted(ends, times.min())), ends.size):
+            row: Dict[str, object] = {"store_id": store_id}
+            for label, unit, u in zip(labels, units, up[i]):
+                row[f"uptime_last_{label}"] = round(int(u) / unit, 2)
+            for label, unit, d in zip(labels, units, down[i]):
+                row[f"downtime_last_{label}"] = round(int(d) / unit, 2)
+            rows.append((i, row))
+    return rows
+
+
+@dataclass(frozen=True)
+class BackfillRun:
+    paths: List[Path]
+    as_of_utc: List[datetime]  # naive UTC, one per report
+    ingest_batch: int
+    stores_total: int  # stores in the last report
+
+
+def run_backfill(
+    db: Session,
+    output_dir: Path,
+    start: datetime,
+    until: datetime,
+    step: timedelta = timedelta(days=1),
+    horizons: Sequence[timedelta] = HORIZONS,
+    long_format: bool = False,
+    compress: bool = False,
+    store_batch_size: int = BACKFILL_STORE_BATCH_SIZE,
+    filename: str | None = None,
+    source: str = "raw",
+    progress: Callable[[int], None] | None = None,
+) -> BackfillRun:
+    # Writes the report for every as-of time from start to until, step
+    # apart: report_asof_<ts>.csv each, or with long_format one file
+    # (filename, default backfill_<start>_<until>.csv) with an as_of column
+    # after store_id, ordered by store and then as-of. Replays raw pings or,
+    # with source="compact", store_status_run; each report matches
+    # generate_report with the same as_of, horizons and source. progress,
+    # if given, is called with the store count of each page written.
+    if source not in BACKFILL_SOURCES:
+        raise ValueError(f"unknown source {source!r}; expected one of {BACKFILL_SOURCES}")
+    if not horizons:
+        raise ValueError("at least one horizon is required")
+    if store_batch_size < 1:
+        raise ValueError("store_batch_size must be >= 1")
+    times = as_of_times(start, until, step)
+    ends = np.array([int(t.timestamp()) for t in times], dtype=np.int64)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    suffix = ".gz" if compress else ""
+    headers = report_headers(horizons)
+    labels = [t.strftime("%Y-%m-%dT%H:%M:%SZ") for t in times]
+
+    ingest_batch = current_batch(db)
+    if long_format:
+        filename = filename or f"backfill_{ends[0]}_{ends[-1]}.csv"
+        paths = [output_dir / f"{filename}{suffix}"]
+    else:
+        paths = [output_dir / f"report_asof_{end}.csv{suffix}" for end in ends]
+
+    stores_total = 0
+    with ExitStack() as stack:
+        writers = [
+            csv.writer(stack.enter_context(open_report(path, "w")), lineterminator="\n") for path in paths
+        ]
+        if long_format:
+            writers[0].writerow(headers[:1] + ["as_of"] + headers[1:])
+        else:
+            for writer in writers:
+                writer.writerow(headers)
+        # pages of stores keep the loaded pings bounded
+        for page in store_pages(db, store_batch_size):
+            written = stores_total
+            for i, row in _backfill_page(db, page, ends, horizons, source == "compact"):
+                values = [row[header] for header in headers]
+                if long_format:
+                    writers[0].writerow(values[:1] + [labels[i]] + values[1:])
+                else:
+                    writers[i].writerow(values)
+                stores_total += i == len(times) - 1
+            db.expunge_all()
+            if progress is not None:
+                progress(stores_total - written)
+    return BackfillRun(
+        paths=paths,
+        as_of_utc=[epoch_to_naive_utc(int(end)) for end in ends],
+        ingest_batch=ingest_batch,
+        stores_total=stores_total,
+    )
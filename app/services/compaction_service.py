@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from sqlalchemy import and_, delete, exists, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.entities import StoreStatus, StoreStatusRun
+from app.services.store_queries import bounded
+from app.utils.observations import epoch_to_naive_utc
+
+
+# Pings are hourly and status rarely flips, so most store_status rows only
+# repeat the status before them. store_status_run keeps one row per run of
+# equal statuses; reports with source="compact" read it instead of pings.
+# Pruning then drops old pings that start no run, which leaves the status
+# timeline, and so every report source, unchanged.
+
+RUN_INSERT_BATCH_SIZE = 10_000
+
+
+def _refresh_store(db: Session, store_id: str, since: Optional[datetime]) -> List[Dict[str, object]]:
+    # Recomputes store_id's runs from the one in force at `since`, or all of
+    # them when since is None or precedes the first run.
+    run_columns = select(StoreStatusRun.start_utc, StoreStatusRun.end_utc, StoreStatusRun.status).where(
+        StoreStatusRun.store_id == store_id
+    )
+    pings = select(StoreStatus.timestamp_utc, StoreStatus.status).where(StoreStatus.store_id == store_id)
+    stale = delete(StoreStatusRun).where(StoreStatusRun.store_id == store_id)
+    rows: List[Dict[str, object]] = []
+    if since is not None:
+        current = db.execute(
+            run_columns.where(StoreStatusRun.start_utc <= since).order_by(StoreStatusRun.start_utc.desc()).limit(1)
+        ).first()
+        if current is not None:
+            pings = pings.where(StoreStatus.timestamp_utc >= current.start_utc)
+            stale = stale.where(StoreStatusRun.start_utc >= current.start_utc)
+            previous = db.execute(
+                run_columns.where(StoreStatusRun.start_utc < current.start_utc)
+                .order_by(StoreStatusRun.start_utc.desc())
+                .limit(1)
+            ).first()
+            if previous is not None:
+                # a late ping at current's start can merge it into the run
+                # before; that run's pings may be pruned, so its row is reused
+                stale = delete(StoreStatusRun).where(
+                    StoreStatusRun.store_id == store_id, StoreStatusRun.start_utc >= previous.start_utc
+                )
+                rows.append({"store_id": store_id, **previous._asdict()})
+
+    for timestamp_utc, status in db.execute(pings.order_by(StoreStatus.timestamp_utc, StoreStatus.id)):
+        if rows and rows[-1]["start_utc"] == timestamp_utc:
+            # of pings sharing a timestamp the last one holds from there
+            rows.pop()
+        if rows and rows[-1]["status"] == status:
+            rows[-1]["end_utc"] = timestamp_utc
+            continue
+        if rows:
+            rows[-1]["end_utc"] = timestamp_utc
+        rows.append({"store_id": store_id, "start_utc": timestamp_utc, "end_utc": timestamp_utc, "status": status})
+    db.execute(stale)
+    return rows
+
+
+def refresh_status_runs(
+    db: Session, since_by_store: Mapping[str, Optional[datetime]], commit: bool = True
+) -> int:
+    # since_by_store maps each store with new pings to the earliest of them,
+    # or to None to recompute all its runs. commit=False leaves the rows to
+    # the caller's transaction.
+    stmt = insert(StoreStatusRun.__table__)
+    total = 0
+    batch: List[Dict[str, object]] = []
+    for store_id in sorted(since_by_store):
+        batch.extend(_refresh_store(db, store_id, since_by_store[store_id]))
+        if len(batch) >= RUN_INSERT_BATCH_SIZE:
+            db.execute(stmt, batch)
+            if commit:
+                db.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.execute(stmt, batch)
+        total += len(batch)
+    if commit:
+        db.commit()
+    return total
+
+
+def rebuild_status_runs(db: Session) -> int:
+    db.execute(delete(StoreStatusRun))
+    store_ids = db.execute(select(StoreStatus.store_id).distinct()).scalars()
+    return refresh_status_runs(db, {store_id: None for store_id in store_ids})
+
+
+def uncovered_stores(
+    db: Session,
+    end: int,
+    first_store: str | None = None,
+    last_store: str | None = None,
+    store_ids: Sequence[str] | None = None,
+) -> List[str]:
+    # Stores with pings up to `end` whose runs end before their latest one,
+    # e.g. pings loaded before the table existed. A store's last run ends
+    # at its latest ping, which pruning always keeps.
+    latest_ping = bounded(
+        select(StoreStatus.store_id, func.max(StoreStatus.timestamp_utc).label("latest"))
+        .where(StoreStatus.timestamp_utc <= epoch_to_naive_utc(end))
+        .group_by(StoreStatus.store_id),
+        StoreStatus.store_id,
+        first_store,
+        last_store,
+        store_ids,
+    ).subquery()
+    latest_run = bounded(
+        select(StoreStatusRun.store_id, func.max(StoreStatusRun.end_utc).label("latest")).group_by(
+            StoreStatusRun.store_id
+        ),
+        StoreStatusRun.store_id,
+        first_store,
+        last_store,
+        store_ids,
+    ).subquery()
+    return list(
+        db.execute(
+            select(latest_ping.c.store_id)
+            .outerjoin(latest_run, latest_run.c.store_id == latest_ping.c.store_id)
+            .where(or_(latest_run.c.latest.is_(None), latest_run.c.latest < latest_ping.c.latest))
+            .order_by(latest_ping.c.store_id)
+        ).scalars()
+    )
+
+
+def require_status_runs(
+    db: Session,
+    end: int,
+    first_store: str | None = None,
+    last_store: str | None = None,
+    store_ids: Sequence[str] | None = None,
+) -> None:
+    # Compact reads take their stores from store_status_run, so uncovered
+    # stores would silently drop out of a report or replay a stale timeline
+    uncovered = uncovered_stores(db, end, first_store, last_store, store_ids)
+    if uncovered:
+        raise ValueError(
+            f"{len(uncovered)} stores have pings without status runs (first: {uncovered[0]!r}); "
+            "run scripts/compact_status.py --rebuild"
+        )
+
+
+def prune_status_pings(db: Session, older_than: datetime) -> int:
+    # Deletes pings before older_than that are already compacted and neither
+    # start a run nor are their store's latest ping. The pings kept still
+    # describe every status change, so raw and rollup reports, hourly
+    # rollup refreshes and run rebuilds give the same results as before.
+    run = StoreStatusRun
+    result = db.execute(
+        delete(StoreStatus)
+        .where(
+            StoreStatus.timestamp_utc < older_than,
+            exists().where(run.store_id == StoreStatus.store_id, run.end_utc >= StoreStatus.timestamp_utc),
+            ~exists().where(
+                and_(
+                    run.store_id == StoreStatus.store_id,
+                    or_(run.start_utc == StoreStatus.timestamp_utc, run.end_utc == StoreStatus.timestamp_utc),
+                )
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
@@ -1,106 +1,465 @@
 from __future__ import annotations
 
 import io
+import re
+import tempfile
 import zipfile
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 import csv
-from pathlib import Path
-from typing import Optional
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional
 
+import pytz
 import requests
+from sqlalchemy import Table, insert
 from sqlalchemy.orm import Session
 
-from app.models.entities import BusinessHours, StoreStatus, StoreTimezone
+from app.services.compaction_service import refresh_status_runs
+from app.services.ingest_staging import IngestStaging
+from app.services.metrics_service import INGEST_REJECTED, INGEST_ROWS, record_timings
+from app.services.rollup_service import refresh_hourly_rollups
+from app.services.watermark_service import record_ingest
+from app.utils.phase_timings import Phase, PhaseTimings
+from app.utils.record_streams import RECORD_FORMATS, Record
 
 
-def _find_csv(zip_bytes: bytes, expected_name_contains: str) -> Optional[bytes]:
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
-        for name in zf.namelist():
-            if expected_name_contains in name and name.lower().endswith(".csv"):
-                return zf.read(name)
-    return None
-
+DEFAULT_BATCH_SIZE = 10_000
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# local times of day in business_hours: HH:MM or HH:MM:SS
+TIME_OF_DAY = re.compile(r"([0-9]{1,2}):([0-9]{2})(?::([0-9]{2}))?")
 
-def load_zip_into_db(db: Session, source: str) -> None:
-    # source can be URL or file path
+@contextmanager
+def _open_source(source: str) -> Iterator[IO[bytes]]:
+    # source can be URL or file path; downloads are spooled to disk in chunks
+    # so the archive never has to fit in memory.
     if source.startswith("http://") or source.startswith("https://"):
-        resp = requests.get(source, timeout=60)
-        resp.raise_for_status()
-        zip_bytes = resp.content
+        with tempfile.TemporaryFile() as tmp:
+            with requests.get(source, stream=True, timeout=60) as resp:
+                resp.raise_for_status()
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    tmp.write(chunk)
+            tmp.seek(0)
+            yield tmp
     else:
-        zip_bytes = Path(source).read_bytes()
-
-    status_bytes = _find_csv(zip_bytes, "store_status")
-    bh_bytes = _find_csv(zip_bytes, "business_hours")
-    tz_bytes = _find_csv(zip_bytes, "store_timezone")
-
-    # Ingest timezone
-    if tz_bytes:
-        text = tz_bytes.decode("utf-8").splitlines()
-        reader = csv.DictReader(text)
-        for row in reader:
-            store_id = str(row.get("store_id", "")).strip()
-            timezone_str = (row.get("timezone_str") or row.get("timezone") or "").strip()
-            if not store_id:
-                continue
-            db.add(StoreTimezone(store_id=store_id, timezone_str=timezone_str))
+        with open(source, "rb") as f:
+            yield f
+
+
+def _find_csv(zf: zipfile.ZipFile, expected_name_contains: str) -> Optional[str]:
+    for name in zf.namelist():
+        if expected_name_contains in name and name.lower().endswith(".csv"):
+            return name
+    return None
+
+
+def _iter_csv(zf: zipfile.ZipFile, name: str) -> Iterator[Dict[str, str]]:
+    # Decompress and decode incrementally; only one buffer of the member is
+    # held at a time.
+    with zf.open(name) as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        yield from csv.DictReader(text)
+
+
+def _parse_timestamp(ts_str: str) -> Optional[datetime]:
+    # Try multiple timestamp formats
+    dt = None
+    for fmt in ("%Y-%m-%d %H:%M:%S %Z", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%dT%H:%M:%S.%f%z"):
+        try:
+            if fmt.endswith("%z"):
+                dt = datetime.strptime(ts_str.replace("Z", "+0000"), fmt)
+            else:
+                dt = datetime.strptime(ts_str.replace("UTC", "" ).strip(), fmt)
+            break
+        except Exception:
+            continue
+    if dt is None:
+        try:
+            dt = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+        except Exception:
+            return None
+    return dt.replace(tzinfo=None)
+
+
+def _time_of_day(value: str, name: str) -> str:
+    match = TIME_OF_DAY.fullmatch(value)
+    if match is None:
+        raise ValueError(f"{name} {value!r} is not HH:MM[:SS]")
+    hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    if hours > 23 or minutes > 59 or seconds > 59:
+        raise ValueError(f"{name} {value!r} is not a time of day")
+    return value
+
+
+def _timezone_row(row: Dict[str, str]) -> Dict[str, object]:
+    # Each _*_row raises ValueError saying why a row cannot be loaded. Rows
+    # that load are ones reports can compile into a schedule.
+    store_id = str(row.get("store_id", "")).strip()
+    timezone_str = (row.get("timezone_str") or row.get("timezone") or "").strip()
+    if not store_id:
+        raise ValueError("missing store_id")
+    if not timezone_str:
+        raise ValueError("missing timezone_str")
+    if timezone_str not in pytz.all_timezones_set:
+        raise ValueError(f"unknown timezone {timezone_str!r}")
+    return {"store_id": store_id, "timezone_str": timezone_str}
+
+
+def _business_hours_row(row: Dict[str, str]) -> Dict[str, object]:
+    store_id = str(row.get("store_id", "")).strip()
+    day_str = str(row.get("day") or row.get("day_of_week") or "").strip()
+    start_time_local = str(row.get("start_time_local", "")).strip()
+    end_time_local = str(row.get("end_time_local", "")).strip()
+    if not store_id:
+        raise ValueError("missing store_id")
+    if day_str == "":
+        raise ValueError("missing day")
+    try:
+        day_of_week = int(day_str)
+    except ValueError:
+        raise ValueError(f"day {day_str!r} is not an integer") from None
+    if not 0 <= day_of_week <= 6:
+        raise ValueError(f"day {day_of_week} is not in 0 (Monday) .. 6 (Sunday)")
+    return {
+        "store_id": store_id,
+        "day_of_week": day_of_week,
+        "start_time_local": _time_of_day(start_time_local, "start_time_local"),
+        "end_time_local": _time_of_day(end_time_local, "end_time_local"),
+    }
+
+
+def _status_row(row: Dict[str, str]) -> Dict[str, object]:
+    store_id = str(row.get("store_id", "")).strip()
+    ts_str = str(row.get("timestamp_utc", "")).strip()
+    status = str(row.get("status", "")).strip().lower()
+    if not store_id:
+        raise ValueError("missing store_id")
+    if not ts_str:
+        raise ValueError("missing timestamp_utc")
+    dt = _parse_timestamp(ts_str)
+    if dt is None:
+        raise ValueError(f"unparseable timestamp_utc {ts_str!r}")
+    return {"store_id": store_id, "timestamp_utc": dt, "status": status}
+
+
+def _valid_rows(
+    rows: Iterable[Dict[str, str]],
+    parse: Callable[[Dict[str, str]], Dict[str, object]],
+    table: str,
+    rejected: Dict[str, int],
+) -> Iterator[Dict[str, object]]:
+    # rows of a feed file that parse; the rest are skipped and counted
+    for row in rows:
+        try:
+            yield parse(row)
+        except ValueError:
+            rejected[table] = rejected.get(table, 0) + 1
+            INGEST_REJECTED.inc((table,))
+
+
+def _track_touched(
+    rows: Iterable[Dict[str, object]],
+    touched: Dict[str, Optional[datetime]],
+    latest: Dict[str, Optional[datetime]],
+    by_time: bool,
+) -> Iterator[Dict[str, object]]:
+    # Records, per store, the earliest new ping (by_time) or None, meaning
+    # its schedule changed and every hourly rollup must be recomputed, and
+    # the latest new ping for its watermark.
+    for row in rows:
+        store_id = row["store_id"]
+        latest.setdefault(store_id, None)
+        if not by_time:
+            touched[store_id] = None
+            yield row
+            continue
+        timestamp_utc = row["timestamp_utc"]
+        if store_id not in touched:
+            touched[store_id] = timestamp_utc
+        elif touched[store_id] is not None and timestamp_utc < touched[store_id]:
+            touched[store_id] = timestamp_utc
+        if latest[store_id] is None or timestamp_utc > latest[store_id]:
+            latest[store_id] = timestamp_utc
+        yield row
+
+
+def bulk_insert(
+    db: Session,
+    model,
+    rows: Iterable[Dict[str, object]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    # Core executemany in fixed-size batches; nothing enters the identity map
+    # and each batch is committed so memory stays flat for any file size.
+    # progress, if given, is called with the row count of each commit.
+    if batch_size < 1:
+        raise ValueError("batch_size must be >= 1")
+    # model may also be a Core table
+    stmt = insert(getattr(model, "__table__", model))
+    total = 0
+    batch: List[Dict[str, object]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.execute(stmt, batch)
+            db.commit()
+            total += len(batch)
+            if progress is not None:
+                progress(len(batch))
+            batch = []
+    if batch:
+        db.execute(stmt, batch)
         db.commit()
+        total += len(batch)
+        if progress is not None:
+            progress(len(batch))
+    return total
 
-    # Ingest business hours
-    if bh_bytes:
-        text = bh_bytes.decode("utf-8").splitlines()
-        reader = csv.DictReader(text)
-        for row in reader:
-            store_id = str(row.get("store_id", "")).strip()
-            day_str = str(row.get("day") or row.get("day_of_week") or "").strip()
-            start_time_local = str(row.get("start_time_local", "")).strip()
-            end_time_local = str(row.get("end_time_local", "")).strip()
-            if not store_id or day_str == "":
-                continue
-            db.add(
-                BusinessHours(
-                    store_id=store_id,
-                    day_of_week=int(day_str),
-                    start_time_local=start_time_local,
-                    end_time_local=end_time_local,
-                )
+
+def _committed(phase: Phase, table: str) -> Callable[[int], None]:
+    # counts committed rows into the phase and the live ingest counter
+    def progress(rows: int) -> None:
+        phase.add(rows)
+        INGEST_ROWS.inc((table,), rows)
+
+    return progress
+
+
+def _stage(
+    db: Session,
+    source: str,
+    staging: Dict[str, Table],
+    counts: Dict[str, int],
+    rejected: Dict[str, int],
+    touched: Dict[str, Optional[datetime]],
+    latest: Dict[str, Optional[datetime]],
+    batch_size: int,
+    timings: PhaseTimings,
+) -> None:
+    with ExitStack() as stack:
+        with timings.span("open"):
+            zf = stack.enter_context(zipfile.ZipFile(stack.enter_context(_open_source(source))))
+        status_name = _find_csv(zf, "store_status")
+        bh_name = _find_csv(zf, "business_hours")
+        tz_name = _find_csv(zf, "store_timezone")
+
+        # Stage timezone
+        if tz_name:
+            rows = _track_touched(
+                _valid_rows(_iter_csv(zf, tz_name), _timezone_row, "store_timezone", rejected),
+                touched,
+                latest,
+                by_time=False,
             )
-        db.commit()
+            with timings.span("store_timezone") as phase:
+                progress = _committed(phase, "store_timezone")
+                counts["store_timezone"] = bulk_insert(db, staging["store_timezone"], rows, batch_size, progress)
 
-    # Ingest status
-    if status_bytes:
-        text = status_bytes.decode("utf-8").splitlines()
-        reader = csv.DictReader(text)
-        for row in reader:
-            store_id = str(row.get("store_id", "")).strip()
-            ts_str = str(row.get("timestamp_utc", "")).strip()
-            status = str(row.get("status", "")).strip().lower()
-            if not store_id or not ts_str:
-                continue
-            # Try multiple timestamp formats
-            dt = None
-            for fmt in ("%Y-%m-%d %H:%M:%S %Z", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%dT%H:%M:%S.%f%z"):
-                try:
-                    if fmt.endswith("%z"):
-                        dt = datetime.strptime(ts_str.replace("Z", "+0000"), fmt)
-                    else:
-                        dt = datetime.strptime(ts_str.replace("UTC", "" ).strip(), fmt)
-                    break
-                except Exception:
-                    continue
-            if dt is None:
-                try:
-                    dt = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
-                except Exception:
-                    continue
-            dt = dt.replace(tzinfo=None)
-            db.add(
-                StoreStatus(
-                    store_id=store_id,
-                    timestamp_utc=dt,
-                    status=status,
-                )
+        # Stage business hours
+        if bh_name:
+            rows = _track_touched(
+                _valid_rows(_iter_csv(zf, bh_name), _business_hours_row, "business_hours", rejected),
+                touched,
+                latest,
+                by_time=False,
             )
+            with timings.span("business_hours") as phase:
+                progress = _committed(phase, "business_hours")
+                counts["business_hours"] = bulk_insert(db, staging["business_hours"], rows, batch_size, progress)
+
+        # Stage status
+        if status_name:
+            rows = _track_touched(
+                _valid_rows(_iter_csv(zf, status_name), _status_row, "store_status", rejected),
+                touched,
+                latest,
+                by_time=True,
+            )
+            with timings.span("store_status") as phase:
+                progress = _committed(phase, "store_status")
+                counts["store_status"] = bulk_insert(db, staging["store_status"], rows, batch_size, progress)
+
+
+def _publish(
+    db: Session,
+    staging: IngestStaging,
+    counts: Dict[str, int],
+    touched: Dict[str, Optional[datetime]],
+    latest: Dict[str, Optional[datetime]],
+    timings: PhaseTimings,
+) -> None:
+    # Derives the rollups and runs of the staged rows, then publishes them
+    # with the watermarks
+    if not touched:
+        return
+    pinged = {store_id: touched[store_id] for store_id, last in latest.items() if last is not None}
+    with timings.span("shadow", "stores") as phase:
+        staging.shadow(touched)
+        phase.add(len(touched))
+    # Roll up the hours this load touched
+    with timings.span("store_uptime_hourly") as phase:
+        counts["store_uptime_hourly"] = refresh_hourly_rollups(db, touched)
+        phase.add(counts["store_uptime_hourly"])
+    # Re-encode status runs for the stores that got pings
+    with timings.span("store_status_run") as phase:
+        counts["store_status_run"] = refresh_status_runs(db, pinged)
+        phase.add(counts["store_status_run"])
+
+    # Publish and mark the touched stores dirty for incremental reports, in
+    # one transaction
+    with timings.span("publish") as phase:
+        if not staging.publish():
+            # another load published meanwhile; derive again from the live
+            # tables, under the write lock
+            staging.drop_shadows()
+            staging.copy_staged()
+            counts["store_uptime_hourly"] = refresh_hourly_rollups(db, touched, commit=False)
+            counts["store_status_run"] = refresh_status_runs(db, pinged, commit=False)
+        record_ingest(db, latest, commit=False)
         db.commit()
+        phase.add(sum(counts.values()))
+
+
+def _empty_counts() -> Dict[str, int]:
+    return {
+        "store_timezone": 0,
+        "business_hours": 0,
+        "store_status": 0,
+        "store_uptime_hourly": 0,
+        "store_status_run": 0,
+    }
+
+
+def load_zip_into_db(
+    db: Session,
+    source: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    timings: PhaseTimings | None = None,
+    rejected: Dict[str, int] | None = None,
+) -> Dict[str, int]:
+    # Rows are staged and their rollups and runs derived in TEMP tables, then
+    # published in one short transaction (see ingest_staging), so readers see
+    # all of a load or none of it, writers only wait for the copy, and a
+    # failed load leaves no trace. Phase timings (download, staging each
+    # table, rollups, runs, publishing) are recorded into `timings`, or a new
+    # PhaseTimings. Rows that cannot be loaded (the upload rejects) are
+    # skipped; their count per table is added into `rejected` if given.
+    timings = timings or PhaseTimings()
+    rejected = {} if rejected is None else rejected
+    counts = _empty_counts()
+    touched: Dict[str, Optional[datetime]] = {}
+    latest: Dict[str, Optional[datetime]] = {}
+
+    # one connection throughout: TEMP tables only exist on the one that made them
+    with db.get_bind().connect() as conn, Session(bind=conn) as staged:
+        staging = IngestStaging(staged)
+        try:
+            staging.create()
+            _stage(staged, source, staging.tables, counts, rejected, touched, latest, batch_size, timings)
+            _publish(staged, staging, counts, touched, latest, timings)
+        finally:
+            staging.close()
+    timings.finish()
+    record_timings("ingest", timings)
+    return counts
+
+
+# table -> (row parser, whether its rows are pings)
+UPLOAD_TABLES = {
+    "store_timezone": (_timezone_row, False),
+    "business_hours": (_business_hours_row, False),
+    "store_status": (_status_row, True),
+}
+# rejected rows listed individually in an upload's result; all are counted
+MAX_REPORTED_REJECTS = 100
+
+
+class StreamingLoad:
+    # One upload of a single table, in a RECORD_FORMATS format, fed chunk by
+    # chunk as its body arrives. Parsed rows are staged every batch_size, so
+    # a caller that waits for feed() before reading more applies
+    # back-pressure, and finish() publishes the load like load_zip_into_db.
+    # Rows that cannot be loaded are counted in `rejected`, the first
+    # MAX_REPORTED_REJECTS listed in `rejects` with their line and reason.
+    # close() discards anything unpublished and must always be called.
+    def __init__(
+        self,
+        db: Session,
+        table: str,
+        record_format: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        timings: PhaseTimings | None = None,
+    ):
+        if table not in UPLOAD_TABLES:
+            raise ValueError(f"unknown table {table!r}; expected one of {sorted(UPLOAD_TABLES)}")
+        if record_format not in RECORD_FORMATS:
+            raise ValueError(f"unknown format {record_format!r}; expected one of {sorted(RECORD_FORMATS)}")
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        self.table = table
+        self.timings = timings or PhaseTimings()
+        self.counts = _empty_counts()
+        self.rejected = 0
+        self.rejects: List[Dict[str, object]] = []
+        self._parse, self._by_time = UPLOAD_TABLES[table]
+        self._records = RECORD_FORMATS[record_format]()
+        self._batch_size = batch_size
+        self._pending: List[Dict[str, object]] = []
+        self._touched: Dict[str, Optional[datetime]] = {}
+        self._latest: Dict[str, Optional[datetime]] = {}
+        # one connection throughout, as in load_zip_into_db
+        self._conn = db.get_bind().connect()
+        self._db = Session(bind=self._conn)
+        self._staging = IngestStaging(self._db)
+        try:
+            self._staging.create()
+        except Exception:
+            self.close()
+            raise
+
+    def feed(self, chunk: bytes) -> None:
+        self._add(self._records.feed(chunk))
+
+    def finish(self) -> Dict[str, int]:
+        self._add(self._records.close())
+        self._flush()
+        _publish(self._db, self._staging, self.counts, self._touched, self._latest, self.timings)
+        self.timings.finish()
+        record_timings("ingest", self.timings)
+        return self.counts
+
+    def close(self) -> None:
+        try:
+            self._staging.close()
+        finally:
+            self._db.close()
+            self._conn.close()
+
+    def _add(self, records: Iterable[Record]) -> None:
+        for record in records:
+            if record.fields is None:
+                self._reject(record, record.error)
+                continue
+            try:
+                self._pending.append(self._parse(record.fields))
+            except ValueError as exc:
+                self._reject(record, str(exc))
+                continue
+            if len(self._pending) >= self._batch_size:
+                self._flush()
 
+    def _reject(self, record: Record, error: str | None) -> None:
+        self.rejected += 1
+        INGEST_REJECTED.inc((self.table,))
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({"line": record.line, "error": error})
 
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        rows = _track_touched(self._pending, self._touched, self._latest, by_time=self._by_time)
+        with self.timings.span(self.table) as phase:
+            progress = _committed(phase, self.table)
+            staging = self._staging.tables[self.table]
+            self.counts[self.table] += bulk_insert(self._db, staging, rows, self._batch_size, progress)
+        self._pending = []
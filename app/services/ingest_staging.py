@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable
+
+from sqlalchemy import Column, Index, MetaData, String, Table, insert, text
+from sqlalchemy.orm import Session
+
+from app.models.entities import BusinessHours, StoreStatus, StoreStatusRun, StoreTimezone, StoreUptimeHourly
+from app.services.watermark_service import current_batch
+
+
+# A load goes through TEMP tables on one pinned connection, so readers see
+# all of it or none of it, and the database file is only write-locked
+# while finished rows are copied in:
+#
+# 1. stage: rows are parsed into staging_<table>; the per-batch commits
+#    only touch SQLite's temp database.
+# 2. shadow: TEMP views named like the ingested tables union the live rows
+#    with the staged ones, and TEMP copies of the touched stores' rollups
+#    and runs shadow the derived tables. SQLite resolves unqualified names
+#    in temp first, so the usual refresh functions run unchanged on this
+#    connection and write only TEMP tables.
+# 3. publish: the staged rows, then the touched stores' derived rows, are
+#    copied into main in one transaction. If another load published after
+#    step 2, the shadows are stale and the caller reruns the refreshes
+#    inside that transaction instead.
+
+INGESTED_TABLES = {
+    "store_timezone": StoreTimezone.__table__,
+    "business_hours": BusinessHours.__table__,
+    "store_status": StoreStatus.__table__,
+}
+DERIVED_TABLES = (StoreUptimeHourly.__table__, StoreStatusRun.__table__)
+# built after staging, for the refreshes' per-store lookups
+STAGING_INDEXES = {
+    "store_timezone": ("store_id",),
+    "business_hours": ("store_id",),
+    "store_status": ("store_id", "timestamp_utc"),
+}
+
+
+def _columns(table: Table) -> str:
+    return ", ".join(column.name for column in table.columns)
+
+
+class IngestStaging:
+    def __init__(self, db: Session):
+        # db must stay on one connection, e.g. a Session bound to a Connection
+        self.db = db
+        metadata = MetaData()
+        # the ingested tables without their id keys; rowid keeps file order
+        self.tables: Dict[str, Table] = {
+            name: Table(
+                f"staging_{name}",
+                metadata,
+                *(Column(column.name, column.type) for column in live.columns if not column.primary_key),
+                prefixes=["TEMPORARY"],
+            )
+            for name, live in INGESTED_TABLES.items()
+        }
+        self.touched = Table(
+            "staging_touched", metadata, Column("store_id", String, primary_key=True), prefixes=["TEMPORARY"]
+        )
+        self.shadows = [
+            Table(
+                live.name,
+                metadata,
+                *(Column(column.name, column.type, primary_key=column.primary_key) for column in live.columns),
+                prefixes=["TEMPORARY"],
+            )
+            for live in DERIVED_TABLES
+        ]
+        self.seen_batch: int | None = None
+
+    def create(self) -> None:
+        for table in self.tables.values():
+            table.create(self.db.connection())
+        self.db.commit()
+
+    def shadow(self, store_ids: Iterable[str]) -> None:
+        # read before anything else, so a load published from here on is
+        # caught by publish
+        self.seen_batch = current_batch(self.db)
+        connection = self.db.connection()
+        for name, columns in STAGING_INDEXES.items():
+            table = self.tables[name]
+            Index(f"ix_{table.name}", *(table.c[column] for column in columns)).create(connection)
+        self.touched.create(connection)
+        rows = [{"store_id": store_id} for store_id in store_ids]
+        if rows:
+            self.db.execute(insert(self.touched), rows)
+
+        for name in INGESTED_TABLES:
+            staged = _columns(self.tables[name])
+            # the ids publishing will give the staged rows, in the same order
+            base = self.db.execute(text(f"SELECT coalesce(max(id), 0) FROM main.{name}")).scalar()
+            self.db.execute(
+                text(
+                    f"CREATE TEMP VIEW {name} AS SELECT id, {staged} FROM main.{name} "
+                    f"UNION ALL SELECT {int(base)} + rowid, {staged} FROM temp.staging_{name}"
+                )
+            )
+        for shadow in self.shadows:
+            shadow.create(connection)
+            columns = _columns(shadow)
+            self.db.execute(
+                text(
+                    f"INSERT INTO temp.{shadow.name} ({columns}) SELECT {columns} FROM main.{shadow.name} "
+                    f"WHERE store_id IN (SELECT store_id FROM temp.{self.touched.name})"
+                )
+            )
+        self.db.commit()
+
+    def copy_staged(self) -> None:
+        # the first write of a transaction, which takes the write lock
+        for name, table in self.tables.items():
+            columns = _columns(table)
+            self.db.execute(
+                text(f"INSERT INTO main.{name} ({columns}) SELECT {columns} FROM temp.{table.name} ORDER BY rowid")
+            )
+
+    def publish(self) -> bool:
+        # Copies staged and derived rows into main, leaving the transaction
+        # open for the caller to add watermarks and commit. False, with the
+        # transaction rolled back, if another load published since shadow().
+        self.copy_staged()
+        if current_batch(self.db) != self.seen_batch:
+            self.db.rollback()
+            return False
+        for shadow in self.shadows:
+            columns = _columns(shadow)
+            self.db.execute(
+                text(
+                    f"DELETE FROM main.{shadow.name} "
+                    f"WHERE store_id IN (SELECT store_id FROM temp.{self.touched.name})"
+                )
+            )
+            self.db.execute(
+                text(f"INSERT INTO main.{shadow.name} ({columns}) SELECT {columns} FROM temp.{shadow.name}")
+            )
+        return True
+
+    def drop_shadows(self) -> None:
+        # unqualified names resolve to main again
+        for name in INGESTED_TABLES:
+            self.db.execute(text(f"DROP VIEW IF EXISTS temp.{name}"))
+        for shadow in self.shadows:
+            self.db.execute(text(f"DROP TABLE IF EXISTS temp.{shadow.name}"))
+
+    def close(self) -> None:
+        # pooled connections outlive the load; leave nothing behind on them
+        self.db.rollback()
+        self.drop_shadows()
+        for table in [*self.tables.values(), self.touched]:
+            self.db.execute(text(f"DROP TABLE IF EXISTS temp.{table.name}"))
+        self.db.commit()
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.models.entities import ReportJob
+from app.utils.phase_timings import PhaseTimings
+
+
+# Prometheus text exposition (format 0.0.4), without a client library.
+# Job counts, queue depth and job durations are read from report_job, so
+# they cover jobs run by any worker process; phase histograms and ingest
+# row counters live in this process and cover the work it ran itself.
+
+PREFIX = "store_monitoring"
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+JOB_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+JOB_STATUSES = ("Running", "Complete", "Failed", "Expired")
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[object]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _header(name: str, help_text: str, kind: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _histogram_lines(
+    name: str,
+    labels: Sequence[str],
+    values: Sequence[object],
+    buckets: Sequence[float],
+    cumulative: Sequence[int],
+    total: float,
+    count: int,
+) -> List[str]:
+    # cumulative[i] observations were <= buckets[i]
+    lines = []
+    for bound, observed in zip(list(buckets) + [float("inf")], list(cumulative) + [count]):
+        le = _labels([*labels, "le"], [*values, _number(bound)])
+        lines.append(f"{name}_bucket{le} {observed}")
+    lines.append(f"{name}_sum{_labels(labels, values)} {_number(total)}")
+    lines.append(f"{name}_count{_labels(labels, values)} {count}")
+    return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values: Sequence[str] = (), amount: float = 1) -> None:
+        key = tuple(values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = _header(self.name, self.help_text, "counter")
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in values)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (not cumulative), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values: Sequence[str], value: float) -> None:
+        key = tuple(values)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (key, (list(per_bucket), total, count)) for key, (per_bucket, total, count) in self._series.items()
+            )
+        lines = _header(self.name, self.help_text, "histogram")
+        for key, (per_bucket, total, count) in series:
+            cumulative, running = [], 0
+            for observed in per_bucket:
+                running += observed
+                cumulative.append(running)
+            lines.extend(_histogram_lines(self.name, self.labels, key, self.buckets, cumulative, total, count))
+        return lines
+
+
+OPERATION_SECONDS = Histogram(
+    f"{PREFIX}_operation_duration_seconds",
+    "Wall seconds of reports and ingests run in this process",
+    ("operation",),
+    JOB_BUCKETS,
+)
+PHASE_SECONDS = Histogram(
+    f"{PREFIX}_phase_duration_seconds",
+    "Seconds spent in one phase of a report or ingest run in this process",
+    ("operation", "phase"),
+    PHASE_BUCKETS,
+)
+PHASE_ITEMS = Counter(
+    f"{PREFIX}_phase_items_total",
+    "Rows or stores processed by each phase in this process",
+    ("operation", "phase", "unit"),
+)
+INGEST_ROWS = Counter(
+    f"{PREFIX}_ingest_rows_total",
+    "Rows staged by ingest per table, counted as each batch is written",
+    ("table",),
+)
+INGEST_REJECTED = Counter(
+    f"{PREFIX}_ingest_rejected_rows_total",
+    "Rows ingest could not load per table, from uploads and zip loads",
+    ("table",),
+)
+LOCAL_METRICS = (OPERATION_SECONDS, PHASE_SECONDS, PHASE_ITEMS, INGEST_ROWS, INGEST_REJECTED)
+
+
+def record_timings(operation: str, timings: PhaseTimings) -> None:
+    OPERATION_SECONDS.observe((operation,), timings.seconds)
+    for name, phase in timings.phases.items():
+        PHASE_SECONDS.observe((operation, name), phase.seconds)
+        PHASE_ITEMS.inc((operation, name, phase.unit), phase.items)
+
+
+def _job_lines(db: Session, now: datetime) -> List[str]:
+    by_status = dict(db.execute(select(ReportJob.status, func.count()).group_by(ReportJob.status)).all())
+    lines = _header(f"{PREFIX}_report_jobs", "Report jobs by status", "gauge")
+    for status in sorted(set(JOB_STATUSES) | set(by_status)):
+        lines.append(f"{PREFIX}_report_jobs{_labels(('status',), (status,))} {by_status.get(status, 0)}")
+
+    # a Running job is queued until a worker holds a live lease on it
+    leased = ReportJob.lease_owner.is_not(None) & (ReportJob.lease_expires_at >= now)
+    queued, running = db.execute(
+        select(
+            func.coalesce(func.sum(case((leased, 0), else_=1)), 0),
+            func.coalesce(func.sum(case((leased, 1), else_=0)), 0),
+        ).where(ReportJob.status == "Running")
+    ).one()
+    lines += _header(f"{PREFIX}_report_queue_depth", "Report jobs waiting for a worker", "gauge")
+    lines.append(f"{PREFIX}_report_queue_depth {queued}")
+    lines += _header(f"{PREFIX}_report_jobs_leased", "Report jobs a worker is running now", "gauge")
+    lines.append(f"{PREFIX}_report_jobs_leased {running}")
+
+    # expiry flips Complete to Expired, so both count as complete and the
+    # buckets only ever grow
+    kind = case((ReportJob.as_of_until_utc.is_not(None), "backfill"), else_="report")
+    outcome = case((ReportJob.status == "Failed", "failed"), else_="complete")
+    duration = ReportJob.duration_seconds
+    rows = db.execute(
+        select(
+            kind,
+            outcome,
+            func.count(),
+            func.sum(duration),
+            *(func.sum(case((duration <= bound, 1), else_=0)) for bound in JOB_BUCKETS),
+        )
+        .where(duration.is_not(None))
+        .group_by(kind, outcome)
+        .order_by(kind, outcome)
+    ).all()
+    name = f"{PREFIX}_report_job_duration_seconds"
+    lines += _header(name, "Wall seconds of finished report jobs, from any worker", "histogram")
+    for job_kind, job_outcome, count, total, *cumulative in rows:
+        lines += _histogram_lines(
+            name, ("kind", "outcome"), (job_kind, job_outcome), JOB_BUCKETS, cumulative, total or 0.0, count
+        )
+    return lines
+
+
+def render_metrics(db: Session, now: datetime) -> str:
+    lines = _job_lines(db, now)
+    for metric in LOCAL_METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Mapping
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.entities import ReportJob
+
+
+# Reports are content-addressed by (data watermark, "now" bucket, report
+# parameters): two triggers with the same key would produce the same CSV,
+# so the later one attaches to the earlier job instead of recomputing.
+
+EXPIRED = "Expired"
+
+
+def cache_key(
+    ingest_batch: int, now_utc: datetime | None, ttl_seconds: int, params: Mapping[str, object]
+) -> str:
+    # now is bucketed by the TTL, so a completed report is served for at
+    # most ttl_seconds after its bucket opened; None (a report pinned to an
+    # as-of time) only goes stale when the data changes
+    bucket = int(now_utc.timestamp()) // ttl_seconds if now_utc is not None else None
+    payload = json.dumps({"batch": ingest_batch, "bucket": bucket, "params": params}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def find_cached_job(db: Session, key: str) -> ReportJob | None:
+    # A running job to attach to, or a complete one whose CSV still exists
+    jobs = db.execute(
+        select(ReportJob)
+        .where(ReportJob.cache_key == key, ReportJob.status.in_(("Running", "Complete")))
+        .order_by(ReportJob.created_at.desc())
+    ).scalars()
+    for job in jobs:
+        if job.status == "Running":
+            return job
+        if job.csv_path and Path(job.csv_path).exists():
+            return job
+    return None
+
+
+def evict_reports(db: Session, report_dir: Path, max_age_seconds: int, now_utc: datetime) -> int:
+    # Deletes report CSVs older than max_age_seconds and marks their jobs
+    # Expired so they are neither served nor reused. Returns files removed.
+    cutoff = now_utc - timedelta(seconds=max_age_seconds)
+    removed = 0
+    for path in report_dir.glob("report_*.csv*"):
+        if path.stat().st_mtime < cutoff.timestamp():
+            path.unlink(missing_ok=True)
+            removed += 1
+
+    stale = db.execute(
+        select(ReportJob).where(ReportJob.status == "Complete", ReportJob.completed_at < cutoff)
+    ).scalars()
+    for job in stale:
+        if job.csv_path:
+            Path(job.csv_path).unlink(missing_ok=True)
+        job.status = EXPIRED
+        job.csv_path = None
+    db.commit()
+    return removed
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Tuple
+
+
+# In-process notifications of report job transitions, for long-polling
+# get_report and the SSE stream. Jobs run by this process (the background
+# executor) publish here as they are claimed, make progress and finish;
+# jobs run by a separate report_worker do not, so listeners still re-read
+# report_job every so often.
+
+# latest event kept for this many jobs, for progress the database lacks
+RETAINED_JOBS = 1024
+
+
+@dataclass(frozen=True)
+class ReportEvent:
+    seq: int  # increases across all jobs
+    report_id: str
+    status: str  # Running | Complete | Failed | Expired
+    stores_done: int | None = None  # stores written so far, while Running
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ReportEventHub:
+    def __init__(self, retained: int = RETAINED_JOBS):
+        self._retained = retained
+        self._seq = itertools.count(1)
+        self._latest: OrderedDict[str, ReportEvent] = OrderedDict()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, report_id: str, status: str, stores_done: int | None = None) -> ReportEvent:
+        # Safe from any thread; subscribers get the event on their own loop
+        with self._lock:
+            event = ReportEvent(next(self._seq), report_id, status, stores_done)
+            self._latest[report_id] = event
+            self._latest.move_to_end(report_id)
+            while len(self._latest) > self._retained:
+                self._latest.popitem(last=False)
+            subscribers = list(self._subscribers.get(report_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # the subscriber's loop has closed
+                pass
+        return event
+
+    def latest(self, report_id: str) -> ReportEvent | None:
+        with self._lock:
+            return self._latest.get(report_id)
+
+    @contextmanager
+    def subscribe(self, report_id: str) -> Iterator[asyncio.Queue]:
+        # A queue of the job's events published from now on; subscribe
+        # before reading report_job so no transition falls in between
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(report_id, []).append(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers[report_id]
+                subscribers.remove(subscriber)
+                if not subscribers:
+                    del self._subscribers[report_id]
+
+
+REPORT_EVENTS = ReportEventHub()
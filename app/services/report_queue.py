@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Sequence
+from uuid import uuid4
+
+import pytz
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.entities import ReportJob
+from app.services.backfill_service import BACKFILL_STORE_BATCH_SIZE, run_backfill
+from app.services.metrics_service import record_timings
+from app.services.report_events import REPORT_EVENTS
+from app.services.report_service import HORIZONS, report_now, run_report
+from app.utils.horizons import parse_horizons
+from app.utils.observations import epoch_to_naive_utc
+from app.utils.phase_timings import PhaseTimings
+
+
+# Report jobs queued in report_job itself. A job is Running from trigger
+# until it finishes; while running it holds a lease (owner + expiry) that
+# its worker renews from a heartbeat thread. A claim is a compare-and-swap
+# UPDATE, so any number of processes can poll the same table, and a job
+# whose worker died becomes claimable again once its lease expires.
+
+CLAIM_RETRIES = 5
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WorkerConfig:
+    output_dir: Path = Path("reports")
+    workers: int = 1  # report worker processes per job
+    store_batch_size: int | None = 1000
+    source: str = "raw"
+    compress: bool = False  # write report_<ts>.csv.gz
+    lease_seconds: int = 120
+    max_concurrent: int = 2  # jobs holding a live lease at once, across all workers
+    max_attempts: int = 3
+    poll_seconds: float = 2.0
+
+    @classmethod
+    def from_env(cls) -> WorkerConfig:
+        return cls(
+            output_dir=Path(os.environ.get("REPORT_DIR", "reports")),
+            workers=int(os.environ.get("REPORT_WORKERS", "1")),
+            store_batch_size=int(os.environ.get("REPORT_STORE_BATCH_SIZE", "1000")),
+            source=os.environ.get("REPORT_SOURCE", "raw"),
+            compress=os.environ.get("REPORT_COMPRESS", "0").lower() in ("1", "true", "yes"),
+            lease_seconds=int(os.environ.get("REPORT_LEASE_SECONDS", "120")),
+            max_concurrent=int(os.environ.get("REPORT_MAX_CONCURRENT", "2")),
+            max_attempts=int(os.environ.get("REPORT_MAX_ATTEMPTS", "3")),
+            poll_seconds=float(os.environ.get("REPORT_POLL_SECONDS", "2")),
+        )
+
+
+def new_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+def _now() -> datetime:
+    return datetime.now(tz=pytz.UTC)
+
+
+def _claimable(now: datetime, max_attempts: int):
+    return (
+        (ReportJob.status == "Running")
+        & (ReportJob.lease_owner.is_(None) | (ReportJob.lease_expires_at < now))
+        & (func.coalesce(ReportJob.attempts, 0) < max_attempts)
+    )
+
+
+def _live_leases(now: datetime):
+    return (
+        select(func.count())
+        .select_from(ReportJob)
+        .where(
+            ReportJob.status == "Running",
+            ReportJob.lease_owner.is_not(None),
+            ReportJob.lease_expires_at >= now,
+        )
+        .scalar_subquery()
+    )
+
+
+def recover_expired(db: Session, max_attempts: int) -> int:
+    # Jobs whose worker kept dying are failed instead of retried forever
+    result = db.execute(
+        update(ReportJob)
+        .where(
+            ReportJob.status == "Running",
+            ReportJob.lease_expires_at < _now(),
+            func.coalesce(ReportJob.attempts, 0) >= max_attempts,
+        )
+        .values(status="Failed", lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def claim_next(db: Session, owner: str, config: WorkerConfig) -> ReportJob | None:
+    # Leases the oldest claimable job to owner, unless max_concurrent jobs
+    # already hold live leases. None if nothing was claimed.
+    for _ in range(CLAIM_RETRIES):
+        now = _now()
+        candidate = db.execute(
+            select(ReportJob.id)
+            .where(_claimable(now, config.max_attempts))
+            .order_by(ReportJob.created_at)
+            .limit(1)
+        ).scalar()
+        if candidate is None:
+            return None
+        result = db.execute(
+            update(ReportJob)
+            .where(
+                ReportJob.id == candidate,
+                _claimable(now, config.max_attempts),
+                _live_leases(now) < config.max_concurrent,
+            )
+            .values(
+                lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=config.lease_seconds),
+                heartbeat_at=now,
+                attempts=func.coalesce(ReportJob.attempts, 0) + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return db.get(ReportJob, candidate, populate_existing=True)
+        if db.execute(select(_live_leases(now))).scalar() >= config.max_concurrent:
+            return None
+        # another worker took the candidate first; try the next one
+    return None
+
+
+def renew_lease(db: Session, job_id: str, owner: str, lease_seconds: int) -> bool:
+    now = _now()
+    result = db.execute(
+        update(ReportJob)
+        .where(ReportJob.id == job_id, ReportJob.lease_owner == owner, ReportJob.status == "Running")
+        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def finish_job(db: Session, job_id: str, owner: str, status: str, **values) -> bool:
+    # Records the outcome only if owner still holds the lease; a worker
+    # whose lease expired mid-run lost the job to another one.
+    result = db.execute(
+        update(ReportJob)
+        .where(ReportJob.id == job_id, ReportJob.lease_owner == owner, ReportJob.status == "Running")
+        .values(status=status, lease_owner=None, lease_expires_at=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _heartbeat(session_factory: Callable[[], Session], job_id: str, owner: str, lease_seconds: int, stop):
+    # Renews four times per lease, so a renewal that fails (e.g. the
+    # database is locked by a writer) is retried on the next tick while
+    # the lease still holds. Stops once the lease is lost.
+    while not stop.wait(lease_seconds / 4):
+        db = session_factory()
+        try:
+            if not renew_lease(db, job_id, owner, lease_seconds):
+                return
+        except SQLAlchemyError:
+            logger.warning("lease renewal for report job %s failed; retrying", job_id, exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
+
+
+def _previous_report(
+    db: Session, report_id: str, report_end_utc: datetime, horizons: Sequence[timedelta]
+) -> ReportJob | None:
+    # The latest completed report with the same end and horizons, the only
+    # ones whose rows can be reused; reports for other ends may have run since
+    candidates = db.execute(
+        select(ReportJob)
+        .where(
+            ReportJob.status == "Complete",
+            ReportJob.id != report_id,
+            ReportJob.as_of_until_utc.is_(None),
+            ReportJob.report_end_utc == report_end_utc,
+        )
+        .order_by(ReportJob.completed_at.desc())
+    ).scalars()
+    for candidate in candidates:
+        if (parse_horizons(candidate.horizons) if candidate.horizons else HORIZONS) == tuple(horizons):
+            return candidate
+    return None
+
+
+def _progress(job_id: str) -> Callable[[int], None]:
+    # publishes the job's running store count as batches are written
+    done = 0
+
+    def progress(stores: int) -> None:
+        nonlocal done
+        done += stores
+        REPORT_EVENTS.publish(job_id, "Running", done)
+
+    return progress
+
+
+def _finished(job_id: str, status: str, recorded: bool) -> bool:
+    if recorded:
+        REPORT_EVENTS.publish(job_id, status)
+    return recorded
+
+
+def _timing_fields(timings: PhaseTimings) -> dict:
+    timings.finish()
+    return {"duration_seconds": timings.seconds, "timings": json.dumps(timings.to_dict())}
+
+
+def _execute_backfill(
+    db: Session,
+    reader: Session,
+    job: ReportJob,
+    owner: str,
+    config: WorkerConfig,
+    now: datetime,
+    timings: PhaseTimings,
+) -> bool:
+    with timings.span("backfill", "stores") as phase:
+        run = run_backfill(
+            reader,
+            config.output_dir,
+            job.as_of_utc.replace(tzinfo=pytz.UTC),
+            job.as_of_until_utc.replace(tzinfo=pytz.UTC),
+            timedelta(seconds=job.as_of_step_seconds),
+            horizons=parse_horizons(job.horizons) if job.horizons else HORIZONS,
+            long_format=True,
+            compress=config.compress,
+            store_batch_size=config.store_batch_size or BACKFILL_STORE_BATCH_SIZE,
+            filename=f"report_{int(now.timestamp())}_{job.id}.csv",
+            source="compact" if config.source == "compact" else "raw",
+            progress=_progress(job.id),
+        )
+        phase.add(run.stores_total)
+    timings.finish()
+    record_timings("backfill", timings)
+    recorded = finish_job(
+        db,
+        job.id,
+        owner,
+        "Complete",
+        completed_at=now,
+        csv_path=str(run.paths[0]),
+        report_end_utc=run.as_of_utc[-1],
+        ingest_batch=run.ingest_batch,
+        stores_total=run.stores_total,
+        **_timing_fields(timings),
+    )
+    return _finished(job.id, "Complete", recorded)
+
+
+def execute_job(
+    session_factory: Callable[[], Session],
+    job: ReportJob,
+    owner: str,
+    config: WorkerConfig,
+    read_session_factory: Callable[[], Session] | None = None,
+) -> bool:
+    # Runs a claimed job to completion while renewing its lease. Returns
+    # whether the outcome was recorded. The report reads through
+    # read_session_factory when given (one snapshot for the whole report);
+    # job updates always go through session_factory. Progress and the
+    # outcome are published to REPORT_EVENTS.
+    stop = threading.Event()
+    beat = threading.Thread(
+        target=_heartbeat, args=(session_factory, job.id, owner, config.lease_seconds, stop), daemon=True
+    )
+    beat.start()
+    db = session_factory()
+    reader = (read_session_factory or session_factory)()
+    timings = PhaseTimings()
+    REPORT_EVENTS.publish(job.id, "Running", 0)
+    try:
+        now = _now()
+        if job.as_of_until_utc is not None:
+            return _execute_backfill(db, reader, job, owner, config, now, timings)
+        as_of = job.as_of_utc.replace(tzinfo=pytz.UTC) if job.as_of_utc is not None else None
+        horizons = parse_horizons(job.horizons) if job.horizons else HORIZONS
+        # run_report derives the same end from the same snapshot
+        end = epoch_to_naive_utc(int(report_now(reader, now, as_of).timestamp()))
+        run = run_report(
+            db=reader,
+            output_dir=config.output_dir,
+            now_utc=now,
+            workers=config.workers,
+            store_batch_size=config.store_batch_size,
+            source=config.source,
+            compress=config.compress,
+            previous=_previous_report(reader, job.id, end, horizons),
+            horizons=horizons,
+            as_of=as_of,
+            # one file per job: jobs in the same second may differ in horizons
+            filename=f"report_{int(now.timestamp())}_{job.id}.csv",
+            timings=timings,
+            progress=_progress(job.id),
+        )
+        recorded = finish_job(
+            db,
+            job.id,
+            owner,
+            "Complete",
+            completed_at=now,
+            csv_path=str(run.path),
+            report_end_utc=run.report_end_utc,
+            ingest_batch=run.ingest_batch,
+            stores_total=run.stores_total,
+            stores_reused=run.stores_reused,
+            reuse_ratio=run.reuse_ratio,
+            **_timing_fields(timings),
+        )
+        return _finished(job.id, "Complete", recorded)
+    except Exception:
+        db.rollback()
+        recorded = finish_job(db, job.id, owner, "Failed", **_timing_fields(timings))
+        return _finished(job.id, "Failed", recorded)
+    finally:
+        stop.set()
+        beat.join()
+        reader.close()
+        db.close()
+
+
+def process_jobs(
+    session_factory: Callable[[], Session],
+    config: WorkerConfig,
+    owner: str | None = None,
+    stop_when_idle: bool = False,
+    stop: threading.Event | None = None,
+    read_session_factory: Callable[[], Session] | None = None,
+) -> int:
+    # Claims and runs jobs until stopped, or until none can be claimed when
+    # stop_when_idle is set. Returns the number of jobs run.
+    owner = owner or new_owner()
+    stop = stop or threading.Event()
+    done = 0
+    while not stop.is_set():
+        db = session_factory()
+        try:
+            recover_expired(db, config.max_attempts)
+            job = claim_next(db, owner, config)
+        finally:
+            db.close()
+        if job is None:
+            if stop_when_idle:
+                break
+            stop.wait(config.poll_seconds)
+            continue
+        execute_job(session_factory, job, owner, config, read_session_factory)
+        done += 1
+    return done
@@ -1,103 +1,468 @@
 from __future__ import annotations
 
+import csv
+import gzip
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import IO, Callable, Dict, Iterator, List, Sequence, Tuple
 
+import numpy as np
 import pytz
-from sqlalchemy import select
+from sqlalchemy import create_engine, distinct, func, select
 from sqlalchemy.orm import Session
 
-from app.models.entities import StoreStatus, BusinessHours, StoreTimezone
-from app.utils.time_windows import (
-    compute_intervals_with_status,
-    get_business_windows_for_range,
-)
+from app.db.sqlite import configure_engine
+from app.models.entities import ReportJob, StoreStatus
+from app.utils.observations import ObservationArray, epoch_to_naive_utc, naive_utc_to_epoch
+from app.services import sql_engine
+from app.services.compaction_service import require_status_runs
+from app.services.metrics_service import record_timings
+from app.services.rollup_service import rollup_totals
+from app.services.store_queries import load_observations, load_schedules, observation_selects, store_pages
+from app.services.watermark_service import current_batch, unchanged_stores
+from app.utils.schedules import compile_store_schedule
+from app.utils.time_windows import compute_epoch_intervals_for_horizons
+from app.utils import uptime_engine
+from app.utils.horizons import DEFAULT_HORIZONS, horizon_label, horizon_unit_seconds
+from app.utils.phase_timings import Phase, PhaseTimings
 
 
-def generate_report(db: Session, output_dir: Path, now_utc: datetime) -> Path:
-    output_dir.mkdir(exist_ok=True)
-    output_path = output_dir / f"report_{int(now_utc.timestamp())}.csv"
+# sql: segments and overlaps computed inside SQLite (app/services/sql_engine.py)
+ENGINES = ("python", "numpy", "sql")
+# raw: replay pings; rollup: sum store_uptime_hourly plus live partial hours;
+# compact: replay store_status_run, one row per status change
+SOURCES = ("raw", "rollup", "compact")
+# more shards than workers so one slow slice doesn't leave the others idle
+SHARDS_PER_WORKER = 4
 
-    # Load all data
-    statuses: List[StoreStatus] = list(db.execute(select(StoreStatus)).scalars())
-    bhs: List[BusinessHours] = list(db.execute(select(BusinessHours)).scalars())
-    tzs: List[StoreTimezone] = list(db.execute(select(StoreTimezone)).scalars())
+# last hour, day and week unless a report asks for others; each range is
+# a suffix of the next
+HORIZONS = DEFAULT_HORIZONS
 
-    default_tz = "America/Chicago"
-    tz_map: Dict[str, str] = {tz.store_id: tz.timezone_str for tz in tzs}
 
-    # current time is max status timestamp
-    if len(statuses) == 0:
-        now = now_utc
-    else:
-        max_ts = max(s.timestamp_utc for s in statuses)
-        now = max(max_ts.replace(tzinfo=pytz.UTC), now_utc)
+def report_headers(horizons: Sequence[timedelta] = HORIZONS) -> List[str]:
+    labels = [horizon_label(h) for h in horizons]
+    return (
+        ["store_id"]
+        + [f"uptime_last_{label}" for label in labels]
+        + [f"downtime_last_{label}" for label in labels]
+    )
+
+
+HEADERS = report_headers()
+# reuse selects dirty stores by id; pages stay under SQLite's 999-parameter limit
+REUSE_PAGE_SIZE = 900
+
+
+def _compute_numpy(
+    store_to_obs: Dict[str, ObservationArray],
+    store_windows: Dict[str, Sequence[Tuple[int, int]]],
+    horizons: Sequence[int],
+    end: int,
+) -> Dict[str, List[Tuple[int, int]]]:
+    store_ids = list(store_to_obs.keys())
+    obs_arrays = [store_to_obs[sid].as_numpy() for sid in store_ids]
+    obs_offsets = uptime_engine.offsets_from_lengths([len(t) for t, _ in obs_arrays])
+    obs_times = np.concatenate([t for t, _ in obs_arrays])
+    obs_status = np.concatenate([st for _, st in obs_arrays])
 
+    win_arrays = [np.asarray(store_windows[sid], dtype=np.int64).reshape(-1, 2) for sid in store_ids]
+    win_offsets = uptime_engine.offsets_from_lengths([len(w) for w in win_arrays])
+    windows = np.concatenate(win_arrays)
+
+    totals: Dict[str, List[Tuple[int, int]]] = {sid: [] for sid in store_ids}
+    for horizon in horizons:
+        # windows cover the longest horizon and are clipped per call
+        up, down = uptime_engine.compute_uptime_batch(
+            obs_offsets,
+            obs_times,
+            obs_status,
+            win_offsets,
+            windows[:, 0],
+            windows[:, 1],
+            end - horizon,
+            end,
+        )
+        for sid, u, d in zip(store_ids, up, down):
+            totals[sid].append((int(u), int(d)))
+    return totals
+
+
+def _compute_rows(
+    db: Session,
+    now: datetime,
+    engine: str,
+    first_store: str | None = None,
+    last_store: str | None = None,
+    source: str = "raw",
+    store_ids: Sequence[str] | None = None,
+    report_horizons: Sequence[timedelta] = HORIZONS,
+    timings: PhaseTimings | None = None,
+) -> List[Dict[str, object]]:
+    # The hot path works in whole epoch seconds; every horizon comes out of
+    # one pass over each store's pings
+    timings = timings or PhaseTimings()
+    end = int(now.timestamp())
+    horizons = [int(h.total_seconds()) for h in report_horizons]
     # define windows
-    last_hour_start = now - timedelta(hours=1)
-    last_day_start = now - timedelta(days=1)
-    last_week_start = now - timedelta(days=7)
+    lookback_start = end - max(horizons)
+
+    with timings.span("schedules") as phase:
+        store_to_bh, tz_map = load_schedules(db, first_store, last_store, store_ids)
+        phase.add(sum(len(hours) for hours in store_to_bh.values()) + len(tz_map))
 
-    # Group by store
+    def windows_for(store_ids):
+        store_windows: Dict[str, Sequence[Tuple[int, int]]] = {}
+        with timings.span("windows", "stores") as phase:
+            for store_id in store_ids:
+                # Stores sharing hours and timezone share one compiled schedule,
+                # and its windows for the longest range are expanded once
+                schedule = compile_store_schedule(store_to_bh.get(store_id, []), tz_map.get(store_id))
+                store_windows[store_id] = schedule.epoch_windows_for_range(lookback_start, end)
+            phase.add(len(store_windows))
+        return store_windows
+
+    if source == "compact":
+        require_status_runs(db, end, first_store, last_store, store_ids)
+    if source == "rollup":
+        with timings.span("rollup", "stores") as phase:
+            totals = rollup_totals(db, end, horizons, windows_for, first_store, last_store, store_ids)
+            phase.add(len(totals))
+    elif engine == "sql":
+        carried, recent, _order = observation_selects(
+            lookback_start, end, first_store, last_store, store_ids, compact=source == "compact"
+        )
+        with timings.span("sql", "stores") as phase:
+            totals = sql_engine.compute_totals(db, carried, recent, end, horizons, windows_for)
+            phase.add(len(totals))
+    else:
+        store_to_obs = load_observations(
+            db, lookback_start, end, first_store, last_store, store_ids, source == "compact", timings
+        )
+        store_windows = windows_for(store_to_obs)
+        with timings.span("intervals", "stores") as phase:
+            if engine == "numpy" and store_to_obs:
+                totals = _compute_numpy(store_to_obs, store_windows, horizons, end)
+            else:
+                totals = {
+                    store_id: compute_epoch_intervals_for_horizons(obs, store_windows[store_id], end, horizons)
+                    for store_id, obs in store_to_obs.items()
+                }
+            phase.add(len(totals))
+
+    # minutes for horizons up to an hour, hours beyond
+    labels = [horizon_label(h) for h in report_horizons]
+    units = [horizon_unit_seconds(h) for h in report_horizons]
     results: List[Dict[str, object]] = []
-    # Group observations by store
-    store_to_obs: Dict[str, List[Tuple[datetime, str]]] = {}
-    for s in statuses:
-        store_to_obs.setdefault(s.store_id, []).append((s.timestamp_utc.replace(tzinfo=pytz.UTC), s.status))
-
-    store_to_bh: Dict[str, List[Tuple[int, str, str]]] = {}
-    for bh in bhs:
-        store_to_bh.setdefault(bh.store_id, []).append((bh.day_of_week, bh.start_time_local, bh.end_time_local))
-
-    for store_id, obs_list in store_to_obs.items():
-        tz_name = tz_map.get(store_id, default_tz) or default_tz
-        tz = pytz.timezone(tz_name)
-        store_bh_rows = store_to_bh.get(store_id, [])
-        # Build business windows within ranges
-        windows_hour = get_business_windows_for_range(store_bh_rows, tz, last_hour_start, now)
-        windows_day = get_business_windows_for_range(store_bh_rows, tz, last_day_start, now)
-        windows_week = get_business_windows_for_range(store_bh_rows, tz, last_week_start, now)
-
-        up_h, down_h = compute_intervals_with_status(obs_list, windows_hour, last_hour_start, now)
-        up_d, down_d = compute_intervals_with_status(obs_list, windows_day, last_day_start, now)
-        up_w, down_w = compute_intervals_with_status(obs_list, windows_week, last_week_start, now)
-
-        results.append(
-            {
-                "store_id": store_id,
-                "uptime_last_hour": round(up_h.total_seconds() / 60, 2),
-                "uptime_last_day": round(up_d.total_seconds() / 3600, 2),
-                "uptime_last_week": round(up_w.total_seconds() / 3600, 2),
-                "downtime_last_hour": round(down_h.total_seconds() / 60, 2),
-                "downtime_last_day": round(down_d.total_seconds() / 3600, 2),
-                "downtime_last_week": round(down_w.total_seconds() / 3600, 2),
-            }
+    with timings.span("format", "stores") as phase:
+        for store_id in sorted(totals):
+            row: Dict[str, object] = {"store_id": store_id}
+            for label, unit, (up, _down) in zip(labels, units, totals[store_id]):
+                row[f"uptime_last_{label}"] = round(up / unit, 2)
+            for label, unit, (_up, down) in zip(labels, units, totals[store_id]):
+                row[f"downtime_last_{label}"] = round(down / unit, 2)
+            results.append(row)
+        phase.add(len(results))
+    return results
+
+
+def _compute_shard(
+    db_url: str,
+    now: datetime,
+    engine: str,
+    first_store: str,
+    last_store: str,
+    source: str = "raw",
+    store_ids: Sequence[str] | None = None,
+    report_horizons: Sequence[timedelta] = HORIZONS,
+) -> Tuple[List[Dict[str, object]], Dict[str, Phase]]:
+    # Runs in a worker process, which opens its own connection; the shard's
+    # phase timings travel back with its rows
+    timings = PhaseTimings()
+    shard_engine = configure_engine(create_engine(db_url), read_only=True)
+    try:
+        with Session(shard_engine) as db:
+            rows = _compute_rows(
+                db, now, engine, first_store, last_store, source, store_ids, report_horizons, timings
+            )
+        return rows, timings.phases
+    finally:
+        shard_engine.dispose()
+
+
+def _dirty_stores(page: List[str], reused: Dict[str, Dict[str, str]]) -> List[str] | None:
+    # the page's stores that need computing; None means all of them
+    if not reused:
+        return None
+    dirty = [store_id for store_id in page if store_id not in reused]
+    return None if len(dirty) == len(page) else dirty
+
+
+def _with_reused(
+    rows: List[Dict[str, object]], page: List[str], reused: Dict[str, Dict[str, str]]
+) -> List[Dict[str, object]]:
+    if not reused:
+        return rows
+    rows = rows + [reused[store_id] for store_id in page if store_id in reused]
+    rows.sort(key=lambda row: row["store_id"])
+    return rows
+
+
+def _compute_batches_parallel(
+    db: Session,
+    now: datetime,
+    engine: str,
+    workers: int,
+    store_batch_size: int | None,
+    source: str,
+    reused: Dict[str, Dict[str, str]],
+    horizons: Sequence[timedelta],
+    timings: PhaseTimings,
+) -> Iterator[List[Dict[str, object]]]:
+    if store_batch_size is None:
+        store_count = db.execute(select(func.count(distinct(StoreStatus.store_id)))).scalar() or 0
+        store_batch_size = max(1, -(-store_count // (workers * SHARDS_PER_WORKER)))
+    if reused:
+        store_batch_size = min(store_batch_size, REUSE_PAGE_SIZE)
+    pages = list(store_pages(db, store_batch_size))
+    if not pages:
+        return
+    db_url = db.get_bind().url.render_as_string(hide_password=False)
+    # spawn, not fork: the API process runs reports from a thread
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = []
+        for page in pages:
+            dirty = _dirty_stores(page, reused)
+            if dirty == []:
+                futures.append(None)
+                continue
+            futures.append(
+                pool.submit(_compute_shard, db_url, now, engine, page[0], page[-1], source, dirty, horizons)
+            )
+        # shards are yielded in submission order, i.e. by store_id
+        for page, future in zip(pages, futures):
+            rows = []
+            if future is not None:
+                rows, phases = future.result()
+                timings.merge(phases)
+            yield _with_reused(rows, page, reused)
+
+
+def _compute_batches(
+    db: Session,
+    now: datetime,
+    engine: str,
+    workers: int,
+    store_batch_size: int | None,
+    source: str,
+    reused: Dict[str, Dict[str, str]],
+    horizons: Sequence[timedelta] = HORIZONS,
+    timings: PhaseTimings | None = None,
+) -> Iterator[List[Dict[str, object]]]:
+    timings = timings or PhaseTimings()
+    if workers > 1:
+        yield from _compute_batches_parallel(
+            db, now, engine, workers, store_batch_size, source, reused, horizons, timings
         )
+        return
+    if reused:
+        store_batch_size = min(store_batch_size or REUSE_PAGE_SIZE, REUSE_PAGE_SIZE)
+    if store_batch_size is None:
+        yield _compute_rows(db, now, engine, source=source, report_horizons=horizons, timings=timings)
+        return
+    for page in store_pages(db, store_batch_size):
+        dirty = _dirty_stores(page, reused)
+        rows = []
+        if dirty != []:
+            rows = _compute_rows(db, now, engine, page[0], page[-1], source, dirty, horizons, timings)
+        yield _with_reused(rows, page, reused)
+        db.expunge_all()
+
+
+def open_report(path: Path, mode: str) -> IO[str]:
+    # report CSVs ending in .gz are gzip-compressed
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return path.open(mode, encoding="utf-8", newline="")
+
+
+def _reusable_rows(
+    db: Session, previous: ReportJob | None, end: int, headers: List[str]
+) -> Dict[str, Dict[str, str]]:
+    # Rows of the previous report for stores no ingest has touched since.
+    # Only valid when it ended at the same instant with the same horizons:
+    # otherwise every window boundary has moved.
+    if previous is None or previous.status != "Complete" or not previous.csv_path:
+        return {}
+    if previous.report_end_utc is None or previous.ingest_batch is None:
+        return {}
+    if naive_utc_to_epoch(previous.report_end_utc) != end:
+        return {}
+    path = Path(previous.csv_path)
+    if not path.exists():
+        return {}
+    unchanged = unchanged_stores(db, previous.ingest_batch)
+    with open_report(path, "r") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames != headers:
+            return {}
+        return {row["store_id"]: row for row in reader if row["store_id"] in unchanged}
+
+
+def report_now(db: Session, now_utc: datetime, as_of: datetime | None = None) -> datetime:
+    # current time is max status timestamp, or now_utc if that is later;
+    # an explicit as_of overrides both
+    if as_of is not None:
+        return as_of
+    max_ts = db.execute(select(func.max(StoreStatus.timestamp_utc))).scalar()
+    if max_ts is None:
+        return now_utc
+    return max(max_ts.replace(tzinfo=pytz.UTC), now_utc)
+
+
+def compute_store_rows(
+    db: Session,
+    store_ids: Sequence[str],
+    now: datetime,
+    source: str = "raw",
+    horizons: Sequence[timedelta] = HORIZONS,
+) -> List[Dict[str, object]]:
+    # Report rows ending at `now` (see report_now) for a few stores, read
+    # through store_id-bounded queries; stores without pings have no row.
+    if source not in SOURCES:
+        raise ValueError(f"unknown source {source!r}; expected one of {SOURCES}")
+    if not store_ids:
+        return []
+    return _compute_rows(
+        db, now, "python", source=source, store_ids=sorted(set(store_ids)), report_horizons=horizons
+    )
+
+
+@dataclass(frozen=True)
+class ReportRun:
+    path: Path
+    report_end_utc: datetime  # naive UTC
+    ingest_batch: int
+    stores_total: int
+    stores_reused: int
+    timings: PhaseTimings
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.stores_reused / self.stores_total if self.stores_total else 0.0
+
+
+def run_report(
+    db: Session,
+    output_dir: Path,
+    now_utc: datetime,
+    engine: str = "python",
+    workers: int = 1,
+    store_batch_size: int | None = None,
+    source: str = "raw",
+    previous: ReportJob | None = None,
+    compress: bool = False,
+    horizons: Sequence[timedelta] = HORIZONS,
+    as_of: datetime | None = None,
+    filename: str | None = None,
+    timings: PhaseTimings | None = None,
+    progress: Callable[[int], None] | None = None,
+) -> ReportRun:
+    # generate_report, reusing `previous`'s rows for stores whose data is
+    # unchanged since it ran and recomputing only the rest. filename
+    # overrides report_<ts>.csv; .gz is appended when compressing. Phase
+    # timings are recorded into `timings`, or a new PhaseTimings.
+    # progress, if given, is called with the store count of each batch
+    # written.
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}; expected one of {ENGINES}")
+    if source not in SOURCES:
+        raise ValueError(f"unknown source {source!r}; expected one of {SOURCES}")
+    if workers < 1:
+        raise ValueError("workers must be >= 1")
+    if store_batch_size is not None and store_batch_size < 1:
+        raise ValueError("store_batch_size must be >= 1")
+    if not horizons:
+        raise ValueError("at least one horizon is required")
+    if as_of is not None and as_of.tzinfo is None:
+        raise ValueError("as_of must be timezone-aware")
+    timings = timings or PhaseTimings()
+    output_dir.mkdir(exist_ok=True)
+    filename = filename or f"report_{int(now_utc.timestamp())}.csv"
+    output_path = output_dir / f"{filename}{'.gz' if compress else ''}"
+
+    # read before computing: stores ingested meanwhile count as dirty next time
+    ingest_batch = current_batch(db)
+
+    now = report_now(db, now_utc, as_of)
+    end = int(now.timestamp())
+    headers = report_headers(horizons)
+    with timings.span("reuse") as phase:
+        reused = _reusable_rows(db, previous, end, headers)
+        phase.add(len(reused))
 
-    # Write CSV manually
-    headers = [
-        "store_id",
-        "uptime_last_hour",
-        "uptime_last_day",
-        "uptime_last_week",
-        "downtime_last_hour",
-        "downtime_last_day",
-        "downtime_last_week",
-    ]
-    with output_path.open("w", encoding="utf-8") as f:
-        f.write(",".join(headers) + "\n")
-        for row in results:
-            values = [
-                str(row["store_id"]),
-                str(row["uptime_last_hour"]),
-                str(row["uptime_last_day"]),
-                str(row["uptime_last_week"]),
-                str(row["downtime_last_hour"]),
-                str(row["downtime_last_day"]),
-                str(row["downtime_last_week"]),
-            ]
-            f.write(",".join(values) + "\n")
-    return output_path
+    # Rows stream through csv.writer straight into the (optionally gzipped)
+    # file, one batch at a time
+    stores_total = stores_reused = 0
+    with open_report(output_path, "w") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(headers)
+        batches = _compute_batches(db, now, engine, workers, store_batch_size, source, reused, horizons, timings)
+        for results in batches:
+            with timings.span("write") as phase:
+                writer.writerows([row[header] for header in headers] for row in results)
+                phase.add(len(results))
+            stores_total += len(results)
+            stores_reused += sum(row["store_id"] in reused for row in results)
+            if progress is not None:
+                progress(len(results))
+    timings.finish()
+    record_timings("report", timings)
+    return ReportRun(
+        path=output_path,
+        report_end_utc=epoch_to_naive_utc(end),
+        ingest_batch=ingest_batch,
+        stores_total=stores_total,
+        stores_reused=stores_reused,
+        timings=timings,
+    )
 
 
+def generate_report(
+    db: Session,
+    output_dir: Path,
+    now_utc: datetime,
+    engine: str = "python",
+    workers: int = 1,
+    store_batch_size: int | None = None,
+    source: str = "raw",
+    compress: bool = False,
+    horizons: Sequence[timedelta] = HORIZONS,
+    as_of: datetime | None = None,
+    timings: PhaseTimings | None = None,
+) -> Path:
+    # store_batch_size bounds memory: stores are computed and written that
+    # many at a time instead of all at once. source="rollup" reads complete
+    # hours from store_uptime_hourly instead of replaying every ping;
+    # source="compact" replays status changes from store_status_run.
+    # compress=True writes report_<ts>.csv.gz. horizons picks the lookbacks
+    # (one uptime/downtime column pair each); as_of fixes the report end
+    # instead of deriving it from the data and now_utc. Pass a PhaseTimings
+    # to get the time, rows and peak memory of each phase.
+    return run_report(
+        db,
+        output_dir,
+        now_utc,
+        engine,
+        workers,
+        store_batch_size,
+        source,
+        compress=compress,
+        horizons=horizons,
+        as_of=as_of,
+        timings=timings,
+    ).path
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.entities import BusinessHours, StoreStatus, StoreTimezone, StoreUptimeHourly
+from app.services.store_queries import bounded
+from app.utils.observations import ObservationArray, epoch_to_naive_utc, naive_utc_to_epoch
+from app.utils.schedules import compile_store_schedule
+from app.utils.time_windows import compute_epoch_buckets, compute_epoch_intervals_for_horizons
+
+
+HOUR_SECONDS = 3600
+ROLLUP_INSERT_BATCH_SIZE = 10_000
+
+
+def _status_name(active: bool) -> str:
+    return "active" if active else "inactive"
+
+
+def _floor_hour(epoch: int) -> int:
+    return epoch - epoch % HOUR_SECONDS
+
+
+def _store_schedule(db: Session, store_id: str):
+    bh_rows = [
+        (bh.day_of_week, bh.start_time_local, bh.end_time_local)
+        for bh in db.execute(select(BusinessHours).where(BusinessHours.store_id == store_id)).scalars()
+    ]
+    tz_name = None
+    for tz in db.execute(select(StoreTimezone).where(StoreTimezone.store_id == store_id)).scalars():
+        tz_name = tz.timezone_str
+    return compile_store_schedule(bh_rows, tz_name)
+
+
+def _refresh_store(db: Session, store_id: str, since: Optional[datetime]) -> List[Dict[str, object]]:
+    # Recomputes every hour of store_id from the hour holding `since` (or
+    # from its first ping) through the hour of its latest ping.
+    pings = select(StoreStatus.timestamp_utc, StoreStatus.status).where(StoreStatus.store_id == store_id)
+    obs = ObservationArray()
+    if since is not None:
+        last_hour = db.execute(
+            select(func.max(StoreUptimeHourly.hour_utc)).where(StoreUptimeHourly.store_id == store_id)
+        ).scalar()
+        if last_hour is None:
+            since = None
+        else:
+            # the hours between the last rollup row and `since` are new too
+            since = min(since, last_hour)
+    if since is not None:
+        start = _floor_hour(naive_utc_to_epoch(since))
+        carry = db.execute(
+            pings.where(StoreStatus.timestamp_utc < epoch_to_naive_utc(start))
+            .order_by(StoreStatus.timestamp_utc.desc(), StoreStatus.id.desc())
+            .limit(1)
+        ).first()
+        if carry is not None:
+            obs.append(naive_utc_to_epoch(carry[0]), carry[1])
+        pings = pings.where(StoreStatus.timestamp_utc >= epoch_to_naive_utc(start))
+    for timestamp_utc, status in db.execute(pings.order_by(StoreStatus.timestamp_utc, StoreStatus.id)):
+        obs.append(naive_utc_to_epoch(timestamp_utc), status)
+    if len(obs) == 0:
+        return []
+    if since is None:
+        start = _floor_hour(min(obs.times))
+    end = _floor_hour(max(obs.times)) + HOUR_SECONDS
+
+    stale = delete(StoreUptimeHourly).where(StoreUptimeHourly.store_id == store_id)
+    if since is not None:
+        stale = stale.where(StoreUptimeHourly.hour_utc >= epoch_to_naive_utc(start))
+    db.execute(stale)
+    windows = _store_schedule(db, store_id).epoch_windows_for_range(start, end)
+    return [
+        {
+            "store_id": store_id,
+            "hour_utc": epoch_to_naive_utc(hour),
+            "up_seconds": up,
+            "down_seconds": down,
+            "first_status": _status_name(first),
+            "last_status": _status_name(last),
+        }
+        for hour, up, down, first, last in compute_epoch_buckets(obs, windows, start, end, HOUR_SECONDS)
+    ]
+
+
+def refresh_hourly_rollups(
+    db: Session, since_by_store: Mapping[str, Optional[datetime]], commit: bool = True
+) -> int:
+    # since_by_store maps each touched store to its earliest new ping, or to
+    # None when its hours or timezone changed and all its hours need redoing.
+    # commit=False leaves the rows to the caller's transaction.
+    stmt = insert(StoreUptimeHourly.__table__)
+    total = 0
+    batch: List[Dict[str, object]] = []
+    for store_id in sorted(since_by_store):
+        batch.extend(_refresh_store(db, store_id, since_by_store[store_id]))
+        if len(batch) >= ROLLUP_INSERT_BATCH_SIZE:
+            db.execute(stmt, batch)
+            if commit:
+                db.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.execute(stmt, batch)
+        total += len(batch)
+    if commit:
+        db.commit()
+    return total
+
+
+def rebuild_hourly_rollups(db: Session) -> int:
+    db.execute(delete(StoreUptimeHourly))
+    store_ids = db.execute(select(StoreStatus.store_id).distinct()).scalars()
+    return refresh_hourly_rollups(db, {store_id: None for store_id in store_ids})
+
+
+def uncovered_stores(
+    db: Session,
+    end: int,
+    first_store: str | None = None,
+    last_store: str | None = None,
+    store_ids: Sequence[str] | None = None,
+) -> List[str]:
+    # Stores with pings up to `end` whose hourly rollups stop short of the
+    # hour of their latest one, e.g. pings loaded before the table existed
+    latest_ping = bounded(
+        select(StoreStatus.store_id, func.max(StoreStatus.timestamp_utc).label("latest"))
+        .where(StoreStatus.timestamp_utc <= epoch_to_naive_utc(end))
+        .group_by(StoreStatus.store_id),
+        StoreStatus.store_id,
+        first_store,
+        last_store,
+        store_ids,
+    ).subquery()
+    latest_hour = bounded(
+        select(StoreUptimeHourly.store_id, func.max(StoreUptimeHourly.hour_utc).label("latest")).group_by(
+            StoreUptimeHourly.store_id
+        ),
+        StoreUptimeHourly.store_id,
+        first_store,
+        last_store,
+        store_ids,
+    ).subquery()
+    rows = db.execute(
+        select(latest_ping.c.store_id, latest_ping.c.latest, latest_hour.c.latest)
+        .outerjoin(latest_hour, latest_hour.c.store_id == latest_ping.c.store_id)
+        .order_by(latest_ping.c.store_id)
+    )
+    return [
+        store_id
+        for store_id, ping, hour in rows
+        if hour is None or naive_utc_to_epoch(hour) < _floor_hour(naive_utc_to_epoch(ping))
+    ]
+
+
+def rollup_totals(
+    db: Session,
+    end: int,
+    horizons: Sequence[int],
+    windows_for: Callable[[Iterable[str]], Mapping[str, Sequence[Tuple[int, int]]]],
+    first_store: str | None = None,
+    last_store: str | None = None,
+    store_ids: Sequence[str] | None = None,
+) -> Dict[str, List[Tuple[int, int]]]:
+    # Per-store (up, down) seconds for each horizon ending at `end`. Complete
+    # hours come from store_uptime_hourly; the partial hours at either end of
+    # each horizon, and hours with no rollup row, are computed from raw pings
+    # and the status carried in from neighbouring rows.
+    lookback_start = end - max(horizons)
+    first_hour = _floor_hour(lookback_start)
+    end_hour = _floor_hour(end)
+
+    def scoped(stmt, column):
+        return bounded(stmt, column, first_store, last_store, store_ids)
+
+    # the store set comes from rollup rows, so uncovered stores would
+    # silently drop out of the report
+    uncovered = uncovered_stores(db, end, first_store, last_store, store_ids)
+    if uncovered:
+        raise ValueError(
+            f"{len(uncovered)} stores have pings without hourly rollups (first: {uncovered[0]!r}); "
+            "run scripts/rebuild_rollups.py"
+        )
+
+    store_rows: Dict[str, Dict[int, Tuple[int, int, str, str]]] = {}
+    for store_id, hour_utc, up, down, first, last in db.execute(
+        scoped(
+            select(
+                StoreUptimeHourly.store_id,
+                StoreUptimeHourly.hour_utc,
+                StoreUptimeHourly.up_seconds,
+                StoreUptimeHourly.down_seconds,
+                StoreUptimeHourly.first_status,
+                StoreUptimeHourly.last_status,
+            ).where(
+                StoreUptimeHourly.hour_utc >= epoch_to_naive_utc(first_hour),
+                StoreUptimeHourly.hour_utc <= epoch_to_naive_utc(end_hour),
+            ),
+            StoreUptimeHourly.store_id,
+        )
+    ):
+        store_rows.setdefault(store_id, {})[naive_utc_to_epoch(hour_utc)] = (up, down, first, last)
+
+    # last status of each store's latest hour before the range
+    carry_in = scoped(
+        select(StoreUptimeHourly.store_id, func.max(StoreUptimeHourly.hour_utc).label("hour_utc"))
+        .where(StoreUptimeHourly.hour_utc < epoch_to_naive_utc(first_hour))
+        .group_by(StoreUptimeHourly.store_id),
+        StoreUptimeHourly.store_id,
+    ).subquery()
+    carried: Dict[str, str] = dict(
+        db.execute(
+            select(StoreUptimeHourly.store_id, StoreUptimeHourly.last_status).join(
+                carry_in,
+                (StoreUptimeHourly.store_id == carry_in.c.store_id)
+                & (StoreUptimeHourly.hour_utc == carry_in.c.hour_utc),
+            )
+        ).all()
+    )
+
+    # raw pings only for the hours that are computed live
+    live_ranges = {(end_hour, end + 1)}
+    for horizon in horizons:
+        start = end - horizon
+        if start % HOUR_SECONDS and _floor_hour(start) < end_hour:
+            live_ranges.add((_floor_hour(start), _floor_hour(start) + HOUR_SECONDS))
+    store_pings: Dict[str, List[Tuple[int, str]]] = {}
+    for store_id, timestamp_utc, status in db.execute(
+        scoped(
+            select(StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.status).where(
+                or_(
+                    *(
+                        and_(
+                            StoreStatus.timestamp_utc >= epoch_to_naive_utc(a),
+                            StoreStatus.timestamp_utc < epoch_to_naive_utc(b),
+                        )
+                        for a, b in sorted(live_ranges)
+                    )
+                )
+            ),
+            StoreStatus.store_id,
+        ).order_by(StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.id)
+    ):
+        store_pings.setdefault(store_id, []).append((naive_utc_to_epoch(timestamp_utc), status))
+
+    store_ids = sorted(store_rows.keys() | carried.keys())
+    # a store first seen in the last hour only counts if it pinged by `end`
+    store_ids = [
+        store_id
+        for store_id in store_ids
+        if store_id in carried
+        or min(store_rows[store_id]) < end_hour
+        or any(t <= end for t, _ in store_pings.get(store_id, []))
+    ]
+    store_windows = windows_for(store_ids)
+    totals: Dict[str, List[Tuple[int, int]]] = {}
+    for store_id in store_ids:
+        rows = store_rows.get(store_id, {})
+        pings = store_pings.get(store_id, [])
+        windows = store_windows[store_id]
+
+        # status in force at each hour boundary of the range
+        status_at: Dict[int, str] = {}
+        status = carried.get(store_id)
+        for hour in range(first_hour, end_hour + HOUR_SECONDS, HOUR_SECONDS):
+            if hour in rows:
+                status_at[hour] = rows[hour][2]
+                status = rows[hour][3]
+            elif status is not None:
+                status_at[hour] = status
+        if rows:
+            # before a store's first ping its first status is carried back
+            first_status = rows[min(rows)][2]
+            for hour in range(first_hour, min(rows), HOUR_SECONDS):
+                status_at[hour] = first_status
+
+        def live(region_start: int, stop: int, since: int) -> Tuple[int, int]:
+            # [since, stop) replayed from the status at hour boundary
+            # region_start plus any raw pings in between
+            obs = ObservationArray()
+            obs.append(region_start, status_at[region_start])
+            for t, st in pings:
+                if region_start <= t <= stop:
+                    obs.append(t, st)
+            return compute_epoch_intervals_for_horizons(obs, windows, stop, [stop - since])[0]
+
+        results: List[Tuple[int, int]] = []
+        for horizon in horizons:
+            start = end - horizon
+            up = down = 0
+            if start >= end_hour:
+                u, d = live(end_hour, end, start)
+                up, down = up + u, down + d
+            else:
+                hour = start
+                if start % HOUR_SECONDS:
+                    hour = _floor_hour(start) + HOUR_SECONDS
+                    u, d = live(_floor_hour(start), hour, start)
+                    up, down = up + u, down + d
+                while hour < end_hour:
+                    if hour in rows:
+                        up, down = up + rows[hour][0], down + rows[hour][1]
+                        hour += HOUR_SECONDS
+                        continue
+                    # hours with no pings hold one carried status throughout
+                    gap_end = hour
+                    while gap_end < end_hour and gap_end not in rows:
+                        gap_end += HOUR_SECONDS
+                    u, d = live(hour, gap_end, hour)
+                    up, down = up + u, down + d
+                    hour = gap_end
+                u, d = live(end_hour, end, end_hour)
+                up, down = up + u, down + d
+            results.append((up, down))
+        totals[store_id] = results
+    return totals
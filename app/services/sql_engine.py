@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, and_, case, cast, func, literal, select, text, union_all
+from sqlalchemy.orm import Session
+
+
+# engine="sql": status segments are built inside SQLite with LEAD() over
+# each store's pings and intersected there with the business windows, so
+# only per-store, per-horizon sums come back to Python. The selects that
+# pick a report's pings are shared with the Python engines; this module
+# only adds the arithmetic. SQLite-specific (strftime('%s'), temp tables).
+
+_windows = Table(
+    "report_window",
+    MetaData(),
+    Column("store_id", String),
+    Column("window_start", Integer),
+    Column("window_end", Integer),
+    prefixes=["TEMPORARY"],
+)
+WINDOW_INSERT_BATCH_SIZE = 10_000
+
+
+def _load_windows(db: Session, store_windows: Mapping[str, Sequence[Tuple[int, int]]]) -> None:
+    # One temp table per connection, refilled for every call
+    db.execute(
+        text(
+            "CREATE TEMP TABLE IF NOT EXISTS report_window "
+            "(store_id TEXT NOT NULL, window_start INTEGER NOT NULL, window_end INTEGER NOT NULL)"
+        )
+    )
+    db.execute(
+        text("CREATE INDEX IF NOT EXISTS temp.ix_report_window ON report_window (store_id, window_start)")
+    )
+    db.execute(_windows.delete())
+    batch: List[Dict[str, object]] = []
+    for store_id, windows in store_windows.items():
+        for window_start, window_end in windows:
+            batch.append({"store_id": store_id, "window_start": window_start, "window_end": window_end})
+            if len(batch) >= WINDOW_INSERT_BATCH_SIZE:
+                db.execute(_windows.insert(), batch)
+                batch = []
+    if batch:
+        db.execute(_windows.insert(), batch)
+
+
+def _epoch(column):
+    # whole seconds since the epoch; the fraction is cut off first because
+    # strftime('%s') rounds it, where naive_utc_to_epoch floors
+    return cast(func.strftime("%s", func.substr(column, 1, 19)), Integer)
+
+
+def compute_totals(
+    db: Session,
+    carried,
+    recent,
+    end: int,
+    horizons: Sequence[int],
+    windows_for: Callable[[Iterable[str]], Mapping[str, Sequence[Tuple[int, int]]]],
+) -> Dict[str, List[Tuple[int, int]]]:
+    # (up, down) seconds per horizon ending at `end` for every store with a
+    # ping. carried/recent select (store_id, timestamp_utc, status, seq) rows
+    # as store_queries.observation_selects builds them; windows_for maps
+    # store ids to their windows over [end - max(horizons), end].
+    earliest = end - max(horizons)
+    pings = union_all(carried, recent).subquery()
+    store_ids = list(db.execute(select(pings.c.store_id).distinct()).scalars())
+    if not store_ids:
+        return {}
+    store_windows = windows_for(store_ids)
+    _load_windows(db, store_windows)
+
+    by_store = {"partition_by": pings.c.store_id, "order_by": (pings.c.timestamp_utc, pings.c.seq)}
+    at = _epoch(pings.c.timestamp_utc)
+    # each ping's status holds until the next one; the first is carried
+    # back to the range start and the last forward to its end
+    segments = select(
+        pings.c.store_id,
+        (pings.c.status == "active").label("active"),
+        case((func.row_number().over(**by_store) == 1, earliest), else_=func.max(at, earliest)).label("seg_start"),
+        func.coalesce(func.lead(at).over(**by_store), end).label("seg_end"),
+    ).subquery()
+    horizon_starts = union_all(
+        *(select(literal(i).label("idx"), literal(end - h).label("start")) for i, h in enumerate(horizons))
+    ).subquery()
+
+    window = _windows.c
+    overlap = func.min(segments.c.seg_end, window.window_end) - func.max(
+        segments.c.seg_start, window.window_start, horizon_starts.c.start
+    )
+    stmt = (
+        select(
+            segments.c.store_id,
+            horizon_starts.c.idx,
+            func.sum(case((segments.c.active, overlap), else_=0)),
+            func.sum(case((segments.c.active, 0), else_=overlap)),
+        )
+        .select_from(
+            segments.join(
+                _windows,
+                and_(
+                    window.store_id == segments.c.store_id,
+                    window.window_start < segments.c.seg_end,
+                    window.window_end > segments.c.seg_start,
+                ),
+            ).join(horizon_starts, overlap > 0)
+        )
+        .group_by(segments.c.store_id, horizon_starts.c.idx)
+    )
+
+    totals: Dict[str, List[Tuple[int, int]]] = {store_id: [(0, 0)] * len(horizons) for store_id in store_windows}
+    for store_id, idx, up, down in db.execute(stmt):
+        totals[store_id][idx] = (int(up), int(down))
+    return totals
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.orm import Session
+
+from app.models.entities import BusinessHours, StoreStatus, StoreStatusRun, StoreTimezone
+from app.utils.observations import ObservationArray, epoch_to_naive_utc, naive_utc_to_epoch
+from app.utils.phase_timings import PhaseTimings
+
+
+# Query helpers shared by the report, rollup and backfill services. Reports
+# run over slices of stores: a store_id range (a page or a worker's shard),
+# optionally narrowed to a list of ids.
+
+# pings fetched per round trip; fetching and grouping are timed apart
+FETCH_CHUNK_SIZE = 10_000
+
+
+def bounded(
+    stmt, column, first_store: str | None, last_store: str | None, store_ids: Sequence[str] | None = None
+):
+    # restricts a query to stores in [first_store, last_store], and to
+    # store_ids when given
+    if first_store is not None:
+        stmt = stmt.where(column >= first_store)
+    if last_store is not None:
+        stmt = stmt.where(column <= last_store)
+    if store_ids is not None:
+        stmt = stmt.where(column.in_(store_ids))
+    return stmt
+
+
+def load_schedules(
+    db: Session,
+    first_store: str | None = None,
+    last_store: str | None = None,
+    store_ids: Sequence[str] | None = None,
+) -> Tuple[Dict[str, List[Tuple[int, str, str]]], Dict[str, str]]:
+    bhs: List[BusinessHours] = list(
+        db.execute(
+            bounded(select(BusinessHours), BusinessHours.store_id, first_store, last_store, store_ids)
+        ).scalars()
+    )
+    tzs: List[StoreTimezone] = list(
+        db.execute(
+            bounded(select(StoreTimezone), StoreTimezone.store_id, first_store, last_store, store_ids)
+        ).scalars()
+    )
+
+    tz_map: Dict[str, str] = {tz.store_id: tz.timezone_str for tz in tzs}
+
+    store_to_bh: Dict[str, List[Tuple[int, str, str]]] = {}
+    for bh in bhs:
+        store_to_bh.setdefault(bh.store_id, []).append((bh.day_of_week, bh.start_time_local, bh.end_time_local))
+
+    return store_to_bh, tz_map
+
+
+def observation_selects(
+    lookback_start: int,
+    end: int,
+    first_store: str | None = None,
+    last_store: str | None = None,
+    store_ids: Sequence[str] | None = None,
+    compact: bool = False,
+):
+    # (carried, recent, order): selects of (store_id, timestamp_utc, status,
+    # seq) rows and the order that replays them. With compact, each run's
+    # start in store_status_run stands in for the pings of that run.
+    def scoped(stmt, column):
+        return bounded(stmt, column, first_store, last_store, store_ids)
+
+    if compact:
+        store_column, time_column = StoreStatusRun.store_id, StoreStatusRun.start_utc
+        # a store has one run per start time
+        ping_columns = (
+            store_column,
+            time_column.label("timestamp_utc"),
+            StoreStatusRun.status,
+            literal(0).label("seq"),
+        )
+        ping_order = (store_column, time_column)
+    else:
+        store_column, time_column = StoreStatus.store_id, StoreStatus.timestamp_utc
+        ping_columns = (store_column, time_column, StoreStatus.status, StoreStatus.id.label("seq"))
+        ping_order = (store_column, time_column, StoreStatus.id)
+
+    # Only pings inside the lookback matter, plus each store's last ping
+    # before it, which carries its status into the range. Both queries are
+    # served by the (store_id, time) index of either table.
+    since = epoch_to_naive_utc(lookback_start)
+    carry_in = scoped(
+        select(store_column, func.max(time_column).label("timestamp_utc"))
+        .where(time_column < since)
+        .group_by(store_column),
+        store_column,
+    ).subquery()
+    carried = select(*ping_columns).join(
+        carry_in,
+        (store_column == carry_in.c.store_id) & (time_column == carry_in.c.timestamp_utc),
+    )
+    # pings after `end` (an as-of report) must not leak in
+    recent = scoped(
+        select(*ping_columns).where(time_column >= since, time_column <= epoch_to_naive_utc(end)),
+        store_column,
+    )
+    return carried, recent, ping_order
+
+
+def load_observations(
+    db: Session,
+    lookback_start: int,
+    end: int,
+    first_store: str | None = None,
+    last_store: str | None = None,
+    store_ids: Sequence[str] | None = None,
+    compact: bool = False,
+    timings: PhaseTimings | None = None,
+) -> Dict[str, ObservationArray]:
+    # Pings are read as plain row tuples straight into compact per-store
+    # arrays; no ORM objects are built.
+    timings = timings or PhaseTimings()
+    carried, recent, order = observation_selects(
+        lookback_start, end, first_store, last_store, store_ids, compact
+    )
+
+    # Group observations by store
+    store_to_obs: Dict[str, ObservationArray] = {}
+    for stmt in (carried, recent):
+        with timings.span("load"):
+            result = db.execute(stmt.order_by(*order))
+        while True:
+            with timings.span("load") as load:
+                chunk = result.fetchmany(FETCH_CHUNK_SIZE)
+                load.add(len(chunk))
+            if not chunk:
+                break
+            with timings.span("group") as group:
+                for store_id, timestamp_utc, status, _seq in chunk:
+                    obs = store_to_obs.get(store_id)
+                    if obs is None:
+                        obs = store_to_obs[store_id] = ObservationArray()
+                    obs.append(naive_utc_to_epoch(timestamp_utc), status)
+                group.add(len(chunk))
+    return store_to_obs
+
+
+def store_pages(db: Session, page_size: int) -> Iterator[List[str]]:
+    # Keyset pagination over distinct store ids: each page starts after the
+    # last id of the previous one, so every query is an index range scan.
+    last_store: str | None = None
+    while True:
+        stmt = select(StoreStatus.store_id).distinct().order_by(StoreStatus.store_id).limit(page_size)
+        if last_store is not None:
+            stmt = stmt.where(StoreStatus.store_id > last_store)
+        store_ids = list(db.execute(stmt).scalars())
+        if not store_ids:
+            return
+        yield store_ids
+        last_store = store_ids[-1]
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.entities import StoreWatermark
+from app.services.report_service import compute_store_rows, report_now
+
+
+# Synchronous uptime for a handful of stores. Compiled schedules are
+# already memoised in app.utils.schedules; recent per-store results are
+# kept here, keyed by the store's ingest watermark so a new ingest for the
+# store invalidates its entry immediately.
+
+RESULT_CACHE_SIZE = 4096
+
+
+class StoreResultCache:
+    # LRU of store_id -> (batch_id, expires_at, result); thread-safe, as
+    # sync endpoints run on a thread pool
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, ttl_seconds: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, Tuple[Optional[int], float, Dict[str, object]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, store_id: str, batch_id: Optional[int]) -> Dict[str, object] | None:
+        with self._lock:
+            entry = self._entries.get(store_id)
+            if entry is None:
+                return None
+            cached_batch, expires_at, result = entry
+            if cached_batch != batch_id or expires_at < time.monotonic():
+                del self._entries[store_id]
+                return None
+            self._entries.move_to_end(store_id)
+            return result
+
+    def put(self, store_id: str, batch_id: Optional[int], result: Dict[str, object]) -> None:
+        with self._lock:
+            self._entries[store_id] = (batch_id, time.monotonic() + self.ttl_seconds, result)
+            self._entries.move_to_end(store_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def store_uptime(
+    db: Session,
+    store_ids: Sequence[str],
+    now_utc: datetime,
+    cache: StoreResultCache | None = None,
+) -> Dict[str, Dict[str, object]]:
+    # Uptime/downtime for each known store in store_ids, with an "as_of"
+    # field holding the instant the horizons end at; unknown stores are
+    # left out.
+    store_ids = sorted(set(store_ids))
+    batches: Dict[str, Optional[int]] = dict(
+        db.execute(
+            select(StoreWatermark.store_id, StoreWatermark.batch_id).where(StoreWatermark.store_id.in_(store_ids))
+        ).all()
+    )
+
+    results: Dict[str, Dict[str, object]] = {}
+    missing = []
+    for store_id in store_ids:
+        cached = cache.get(store_id, batches.get(store_id)) if cache is not None else None
+        if cached is None:
+            missing.append(store_id)
+        else:
+            results[store_id] = cached
+
+    if missing:
+        now = report_now(db, now_utc)
+        for row in compute_store_rows(db, missing, now):
+            result = {**row, "as_of": now.isoformat()}
+            results[row["store_id"]] = result
+            if cache is not None:
+                cache.put(row["store_id"], batches.get(row["store_id"]), result)
+    return {store_id: results[store_id] for store_id in store_ids if store_id in results}
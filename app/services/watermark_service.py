@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.entities import StoreStatus, StoreWatermark
+
+
+# SQLite's historical bound-parameter limit is 999
+WATERMARK_CHUNK_SIZE = 500
+
+
+def current_batch(db: Session) -> int:
+    return db.execute(select(func.max(StoreWatermark.batch_id))).scalar() or 0
+
+
+def record_ingest(db: Session, latest_by_store: Mapping[str, Optional[datetime]], commit: bool = True) -> int:
+    # Stamps every store touched by one ingest with a new batch id, keeping
+    # the latest ping timestamp seen for it (None for schedule-only changes).
+    # Returns the batch id. commit=False leaves it to the caller's transaction.
+    batch_id = current_batch(db) + 1
+    store_ids = sorted(latest_by_store)
+    for i in range(0, len(store_ids), WATERMARK_CHUNK_SIZE):
+        chunk = store_ids[i : i + WATERMARK_CHUNK_SIZE]
+        previous: Dict[str, Optional[datetime]] = dict(
+            db.execute(
+                select(StoreWatermark.store_id, StoreWatermark.last_timestamp_utc).where(
+                    StoreWatermark.store_id.in_(chunk)
+                )
+            ).all()
+        )
+        rows: List[Dict[str, object]] = []
+        for store_id in chunk:
+            latest = latest_by_store[store_id]
+            if previous.get(store_id) is not None and (latest is None or previous[store_id] > latest):
+                latest = previous[store_id]
+            rows.append({"store_id": store_id, "batch_id": batch_id, "last_timestamp_utc": latest})
+        db.execute(delete(StoreWatermark).where(StoreWatermark.store_id.in_(chunk)))
+        db.execute(insert(StoreWatermark.__table__), rows)
+    if commit:
+        db.commit()
+    return batch_id
+
+
+def unchanged_stores(db: Session, since_batch: int) -> set[str]:
+    # stores whose data has not been touched by any ingest after since_batch
+    return set(db.execute(select(StoreWatermark.store_id).where(StoreWatermark.batch_id <= since_batch)).scalars())
+
+
+def rebuild_watermarks(db: Session) -> int:
+    # Marks every store with pings dirty after data was replaced outside the
+    # ingest path. Batch ids keep increasing, so older reports stay stale.
+    latest = dict(
+        db.execute(
+            select(StoreStatus.store_id, func.max(StoreStatus.timestamp_utc)).group_by(StoreStatus.store_id)
+        ).all()
+    )
+    return record_ingest(db, latest)
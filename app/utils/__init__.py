@@ -1,8 +1,27 @@
-from .time_windows import compute_intervals_with_status, get_business_windows_for_range
+from .time_windows import (
+    compute_epoch_intervals_for_horizons,
+    compute_horizon_totals,
+    compute_intervals_for_horizons,
+    compute_intervals_with_status,
+    get_business_windows_for_range,
+)
+from .observations import ObservationArray
+from .schedules import CompiledSchedule, compile_schedule
+from .tz_offsets import OffsetTable, offset_table
+from .uptime_engine import compute_uptime_batch, compute_uptime_for_stores, compute_uptime_seconds
 
 __all__ = [
+    "ObservationArray",
+    "CompiledSchedule",
+    "compile_schedule",
+    "OffsetTable",
+    "offset_table",
+    "compute_epoch_intervals_for_horizons",
+    "compute_horizon_totals",
+    "compute_intervals_for_horizons",
     "compute_intervals_with_status",
     "get_business_windows_for_range",
+    "compute_uptime_batch",
+    "compute_uptime_for_stores",
+    "compute_uptime_seconds",
 ]
-
-
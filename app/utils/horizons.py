@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import re
+from datetime import timedelta
+from typing import List, Sequence, Tuple
+
+
+# Report lookback horizons written as "<n><unit>", e.g. 15m, 6h, 30d, 2w.
+
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+# the original report columns keep their names: *_last_hour/day/week
+NAMED_HORIZONS = {3600: "hour", 86400: "day", 7 * 86400: "week"}
+DEFAULT_HORIZONS = (timedelta(hours=1), timedelta(days=1), timedelta(days=7))
+MAX_HORIZONS = 16
+# longest lookback; also keeps report origins well inside datetime's range
+MAX_HORIZON = timedelta(days=366)
+
+_HORIZON_RE = re.compile(r"^\s*(\d+)\s*([smhdw])\s*$", re.IGNORECASE)
+
+
+def parse_horizon(text: str) -> timedelta:
+    match = _HORIZON_RE.match(text)
+    if not match:
+        raise ValueError(f"invalid horizon {text!r}; expected e.g. 15m, 6h, 30d")
+    seconds = int(match.group(1)) * UNIT_SECONDS[match.group(2).lower()]
+    if seconds <= 0:
+        raise ValueError(f"horizon {text!r} must be positive")
+    # checked before building the timedelta, which overflows on huge counts
+    if seconds > MAX_HORIZON.total_seconds():
+        raise ValueError(f"horizon {text!r} is longer than {MAX_HORIZON.days}d")
+    return timedelta(seconds=seconds)
+
+
+def parse_horizons(spec: str | Sequence[str]) -> Tuple[timedelta, ...]:
+    # "15m,6h,30d" or ["15m", "6h", "30d"]; order is kept, duplicates dropped
+    parts = spec.split(",") if isinstance(spec, str) else list(spec)
+    horizons: List[timedelta] = []
+    for part in parts:
+        if not part.strip():
+            continue
+        horizon = parse_horizon(part)
+        if horizon not in horizons:
+            horizons.append(horizon)
+    if not horizons:
+        raise ValueError("at least one horizon is required")
+    if len(horizons) > MAX_HORIZONS:
+        raise ValueError(f"at most {MAX_HORIZONS} horizons per report")
+    return tuple(horizons)
+
+
+def horizon_label(horizon: timedelta) -> str:
+    seconds = int(horizon.total_seconds())
+    if seconds in NAMED_HORIZONS:
+        return NAMED_HORIZONS[seconds]
+    for unit in ("w", "d", "h", "m"):
+        if seconds % UNIT_SECONDS[unit] == 0:
+            return f"{seconds // UNIT_SECONDS[unit]}{unit}"
+    return f"{seconds}s"
+
+
+def format_horizons(horizons: Sequence[timedelta]) -> str:
+    # inverse of parse_horizons, for storing a job's horizons
+    return ",".join(f"{int(h.total_seconds())}s" for h in horizons)
+
+
+def horizon_unit_seconds(horizon: timedelta) -> int:
+    # horizons up to an hour are reported in minutes, longer ones in hours
+    return 60 if horizon <= timedelta(hours=1) else 3600
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import gzip
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+
+# Conditional and ranged downloads of report files. Starlette's
+# FileResponse sets ETag/Last-Modified but ignores If-None-Match and
+# Range, so reports are served through here instead.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() not in ("gzip", "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def parse_byte_range(header: str, size: int) -> Tuple[int, int] | None:
+    # The inclusive (first, last) bytes of a single "bytes=" range, or None
+    # when the header should be ignored (malformed or multiple ranges)
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first_str, sep, last_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first_str:
+            # suffix range: the last N bytes
+            length = int(last_str)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(0, size - length), size - 1
+        first = int(first_str)
+        last = int(last_str) if last_str else size - 1
+    except ValueError:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable(header)
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in header.split(",")]
+    # weak comparison, as If-None-Match requires
+    return "*" in candidates or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in candidates]
+
+
+def _read_range(path: Path, first: int, last: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _read_gunzipped(path: Path) -> Iterator[bytes]:
+    with gzip.open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+def file_response(request: Request, path: Path, media_type: str, filename: str) -> Response:
+    # Serves `path`, a plain file or a .gz one. A gzipped file goes out as
+    # stored with Content-Encoding: gzip when the client accepts it, and is
+    # decompressed on the fly (without range support) otherwise.
+    stat = os.stat(path)
+    gzipped = path.suffix == ".gz"
+    send_encoded = gzipped and accepts_gzip(request.headers.get("accept-encoding"))
+    decode = gzipped and not send_encoded
+    variant = "-gzip" if send_encoded else ("-identity" if decode else "")
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{variant}"'
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        "content-disposition": f'attachment; filename="{filename}"',
+        "accept-ranges": "none" if decode else "bytes",
+    }
+    if gzipped:
+        headers["vary"] = "Accept-Encoding"
+    if send_encoded:
+        headers["content-encoding"] = "gzip"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and int(stat.st_mtime) <= since:
+            return Response(status_code=304, headers=headers)
+
+    if decode:
+        return StreamingResponse(_read_gunzipped(path), media_type=media_type, headers=headers)
+
+    size = stat.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            first, last = byte_range
+            headers["content-range"] = f"bytes {first}-{last}/{size}"
+            headers["content-length"] = str(last - first + 1)
+            return StreamingResponse(
+                _read_range(path, first, last), status_code=206, media_type=media_type, headers=headers
+            )
+
+    headers["content-length"] = str(size)
+    return StreamingResponse(_read_range(path, 0, size - 1), media_type=media_type, headers=headers)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from array import array
+from datetime import datetime, timedelta
+from typing import Tuple
+
+import numpy as np
+
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+STATUS_ACTIVE = 1
+STATUS_INACTIVE = 0
+
+
+def naive_utc_to_epoch(value: datetime) -> int:
+    return (value - EPOCH) // ONE_SECOND
+
+
+def epoch_to_naive_utc(value: int) -> datetime:
+    return EPOCH + timedelta(seconds=value)
+
+
+class ObservationArray:
+    # One store's pings as parallel buffers: int64 epoch seconds and a uint8
+    # status code (1 = active). Around 9 bytes per ping, against several
+    # hundred for an ORM row or a (datetime, str) tuple.
+    __slots__ = ("times", "statuses")
+
+    def __init__(self) -> None:
+        self.times = array("q")
+        self.statuses = array("B")
+
+    def append(self, epoch_seconds: int, status: str) -> None:
+        self.times.append(epoch_seconds)
+        self.statuses.append(STATUS_ACTIVE if status == "active" else STATUS_INACTIVE)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def nbytes(self) -> int:
+        return self.times.itemsize * len(self.times) + self.statuses.itemsize * len(self.statuses)
+
+    def as_numpy(self) -> Tuple[np.ndarray, np.ndarray]:
+        # zero-copy views over the same buffers
+        return (
+            np.frombuffer(self.times, dtype=np.int64),
+            np.frombuffer(self.statuses, dtype=np.uint8),
+        )
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Mapping
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Wall time, item counts and peak memory per named phase of one operation
+# (a report, an ingest). Spans of the same name accumulate over batches; a
+# span opened inside another is not counted in its parent, so the phase
+# seconds of an operation add up without overlap.
+
+
+def peak_rss_mb() -> float | None:
+    # the process's high-water mark, not the memory in use now
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class Phase:
+    unit: str = "rows"
+    seconds: float = 0.0
+    items: int = 0
+    calls: int = 0
+    peak_rss_mb: float | None = None
+
+    def add(self, items: int) -> None:
+        self.items += items
+
+    def merge(self, other: Phase) -> None:
+        self.seconds += other.seconds
+        self.items += other.items
+        self.calls += other.calls
+        if other.peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, other.peak_rss_mb)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "seconds": round(self.seconds, 6),
+            "items": self.items,
+            "unit": self.unit,
+            "calls": self.calls,
+            "per_second": round(self.items / self.seconds, 1) if self.seconds > 0 else None,
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+        }
+
+
+class PhaseTimings:
+    def __init__(self) -> None:
+        self.phases: Dict[str, Phase] = {}
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        self._child_seconds: List[float] = []  # one entry per open span
+
+    @contextmanager
+    def span(self, name: str, unit: str = "rows") -> Iterator[Phase]:
+        # with timings.span("load") as phase: ...; phase.add(len(rows))
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(unit=unit)
+        self._child_seconds.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            elapsed = time.perf_counter() - started
+            phase.seconds += elapsed - self._child_seconds.pop()
+            phase.calls += 1
+            phase.peak_rss_mb = peak_rss_mb()
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+
+    def merge(self, phases: Mapping[str, Phase]) -> None:
+        # Adds phases recorded elsewhere, e.g. in a worker process; their
+        # seconds are that worker's, so parallel phases can sum to more
+        # than the wall time
+        for name, other in phases.items():
+            phase = self.phases.get(name)
+            if phase is None:
+                phase = self.phases[name] = Phase(unit=other.unit)
+            phase.merge(other)
+
+    def finish(self) -> float:
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        return self.seconds
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_dict(self) -> Dict[str, object]:
+        peaks = [phase.peak_rss_mb for phase in self.phases.values() if phase.peak_rss_mb is not None]
+        peak = peak_rss_mb()
+        if peak is not None:
+            peaks.append(peak)
+        return {
+            "seconds": round(self.seconds, 6),
+            "peak_rss_mb": round(max(peaks), 1) if peaks else None,
+            "phases": {name: phase.to_dict() for name, phase in self.phases.items()},
+        }
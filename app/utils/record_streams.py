@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+from dataclasses import dataclass
+from typing import Dict, List
+
+
+# Incremental decoders for uploaded bodies: feed() takes chunks exactly as
+# they arrive and returns the records completed so far, close() the rest.
+# Only the unfinished last line is buffered between chunks.
+
+
+class RecordStreamError(ValueError):
+    # the body as a whole cannot be decoded
+    pass
+
+
+@dataclass(frozen=True)
+class Record:
+    line: int  # 1-based line the record starts on
+    fields: Dict[str, str] | None  # None when the line itself is malformed
+    error: str | None = None
+
+
+class _Lines:
+    # Splits UTF-8 chunks into numbered lines; a leading BOM is dropped
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._tail = ""
+        self.line = 0
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[str]:
+        try:
+            text = self._tail + self._decoder.decode(chunk, final)
+        except UnicodeDecodeError as exc:
+            raise RecordStreamError("body is not valid UTF-8") from exc
+        lines = text.split("\n")
+        self._tail = "" if final else lines.pop()
+        if final and lines and lines[-1] == "":
+            lines.pop()
+        return [line.removesuffix("\r") for line in lines]
+
+
+class CsvRecords:
+    # A header line, then one record per line; quoted fields may span lines
+    def __init__(self):
+        self._lines = _Lines()
+        self._header: List[str] | None = None
+        self._pending: List[str] = []
+        self._start = 0
+
+    def feed(self, chunk: bytes) -> List[Record]:
+        return self._records(self._lines.feed(chunk))
+
+    def close(self) -> List[Record]:
+        records = self._records(self._lines.feed(b"", final=True))
+        if self._pending:
+            records.append(Record(self._start, None, "unterminated quoted field"))
+            self._pending = []
+        return records
+
+    def _records(self, lines: List[str]) -> List[Record]:
+        records = []
+        for line in lines:
+            self._lines.line += 1
+            if not self._pending:
+                if not line.strip():
+                    continue
+                self._start = self._lines.line
+            self._pending.append(line)
+            text = "\n".join(self._pending)
+            # an odd number of quotes leaves a quoted field open
+            if text.count('"') % 2:
+                continue
+            self._pending = []
+            try:
+                values = next(csv.reader([text]))
+            except csv.Error as exc:
+                records.append(Record(self._start, None, str(exc)))
+                continue
+            if self._header is None:
+                self._header = [name.strip() for name in values]
+                continue
+            records.append(Record(self._start, dict(zip(self._header, values))))
+        return records
+
+
+class NdjsonRecords:
+    # One JSON object per line; values are turned into strings like CSV's
+    def __init__(self):
+        self._lines = _Lines()
+
+    def feed(self, chunk: bytes) -> List[Record]:
+        return self._records(self._lines.feed(chunk))
+
+    def close(self) -> List[Record]:
+        return self._records(self._lines.feed(b"", final=True))
+
+    def _records(self, lines: List[str]) -> List[Record]:
+        records = []
+        for line in lines:
+            self._lines.line += 1
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError as exc:
+                records.append(Record(self._lines.line, None, f"invalid JSON: {exc}"))
+                continue
+            if not isinstance(value, dict):
+                records.append(Record(self._lines.line, None, "expected a JSON object"))
+                continue
+            fields = {str(key): "" if item is None else str(item) for key, item in value.items()}
+            records.append(Record(self._lines.line, fields))
+        return records
+
+
+RECORD_FORMATS = {"csv": CsvRecords, "ndjson": NdjsonRecords}
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+import pytz
+
+from app.utils.tz_offsets import offset_table
+
+
+DAY_SECONDS = 24 * 3600
+WEEK_SECONDS = 7 * DAY_SECONDS
+
+# stores without a timezone row are assumed to be in Chicago
+DEFAULT_TZ = "America/Chicago"
+
+SCHEDULE_CACHE_SIZE = 4096
+EXPANSION_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class CompiledSchedule:
+    # Local business hours as merged [start, end) offsets in seconds from
+    # Monday 00:00 local time. An empty row set compiles to the 24x7 default.
+    signature: str
+    tz_name: str
+    intervals: Tuple[Tuple[int, int], ...]
+
+    def windows_for_range(self, start_utc: datetime, end_utc: datetime) -> Tuple[Tuple[datetime, datetime], ...]:
+        return _expand_schedule(self, start_utc, end_utc)
+
+    def epoch_windows_for_range(self, start: int, end: int) -> Tuple[Tuple[int, int], ...]:
+        return _expand_schedule_epoch(self, start, end)
+
+
+def _parse_seconds(value: str) -> int:
+    parts = [int(p) for p in str(value).split(":")]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def _merge(intervals: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _normalize_rows(bh_rows: Sequence[Tuple[int, str, str]] | None) -> Tuple[Tuple[int, str, str], ...]:
+    return tuple(sorted((int(d), str(s), str(e)) for d, s, e in (bh_rows or ())))
+
+
+def schedule_signature(bh_rows: Sequence[Tuple[int, str, str]] | None) -> str:
+    payload = ";".join(f"{d},{s},{e}" for d, s, e in _normalize_rows(bh_rows))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def compile_schedule(bh_rows: Sequence[Tuple[int, str, str]] | None, tz_name: str) -> CompiledSchedule:
+    return _compile_schedule(_normalize_rows(bh_rows), tz_name)
+
+
+def compile_store_schedule(
+    bh_rows: Sequence[Tuple[int, str, str]] | None, tz_name: str | None
+) -> CompiledSchedule:
+    return compile_schedule(bh_rows, tz_name or DEFAULT_TZ)
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def _compile_schedule(rows: Tuple[Tuple[int, str, str], ...], tz_name: str) -> CompiledSchedule:
+    offset_table(tz_name)  # fail early on unknown zones
+    if not rows:
+        intervals = [(0, WEEK_SECONDS)]
+    else:
+        pieces: List[Tuple[int, int]] = []
+        for day_of_week, start_str, end_str in rows:
+            # rows for days outside Monday (0) .. Sunday (6) never match a day
+            if not 0 <= day_of_week <= 6:
+                continue
+            start = day_of_week * DAY_SECONDS + _parse_seconds(start_str)
+            end = day_of_week * DAY_SECONDS + _parse_seconds(end_str)
+            if end <= start:
+                end += DAY_SECONDS
+            # overnight shifts running past Sunday wrap to Monday
+            if end > WEEK_SECONDS:
+                pieces.append((start, WEEK_SECONDS))
+                pieces.append((0, end - WEEK_SECONDS))
+            else:
+                pieces.append((start, end))
+        intervals = _merge([(start, end) for start, end in pieces if start < end])
+    return CompiledSchedule(
+        signature=schedule_signature(rows),
+        tz_name=tz_name,
+        intervals=tuple(intervals),
+    )
+
+
+def _raw_windows(schedule: CompiledSchedule, start: int, end: int) -> List[Tuple[int, int]]:
+    # Unclipped UTC epoch windows for every local week touching [start, end]
+    table = offset_table(schedule.tz_name)
+    # a day of slack on both sides covers any UTC offset
+    first_day = table.to_local(start) // DAY_SECONDS - 1
+    last_day = table.to_local(end) // DAY_SECONDS + 1
+    week_start = first_day - (first_day + 3) % 7  # epoch day 0 was a Thursday
+
+    raw: List[Tuple[int, int]] = []
+    while week_start <= last_day:
+        base = week_start * DAY_SECONDS
+        for interval_start, interval_end in schedule.intervals:
+            raw.append((table.to_utc(base + interval_start), table.to_utc(base + interval_end)))
+        week_start += 7
+
+    # pieces split at the week boundary are contiguous again in UTC
+    return _merge(raw)
+
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def _expand_schedule(
+    schedule: CompiledSchedule, start_utc: datetime, end_utc: datetime
+) -> Tuple[Tuple[datetime, datetime], ...]:
+    windows: List[Tuple[datetime, datetime]] = []
+    for start, end in _raw_windows(schedule, int(start_utc.timestamp()), int(end_utc.timestamp())):
+        start_window = max(start_utc, datetime.fromtimestamp(start, pytz.UTC))
+        end_window = min(end_utc, datetime.fromtimestamp(end, pytz.UTC))
+        if start_window < end_window:
+            windows.append((start_window, end_window))
+    return tuple(windows)
+
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def _expand_schedule_epoch(schedule: CompiledSchedule, start: int, end: int) -> Tuple[Tuple[int, int], ...]:
+    windows: List[Tuple[int, int]] = []
+    for window_start, window_end in _raw_windows(schedule, start, end):
+        window_start = max(start, window_start)
+        window_end = min(end, window_end)
+        if window_start < window_end:
+            windows.append((window_start, window_end))
+    return tuple(windows)
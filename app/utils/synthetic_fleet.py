@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+
+# Seeded synthetic store fleets for load tests and benchmarks, written in
+# the same zip layout load_zip_into_db ingests: store_status.csv,
+# business_hours.csv and store_timezone.csv. The same spec always writes
+# the same bytes.
+
+DEFAULT_TIMEZONE_MIX = (
+    ("America/Chicago", 0.45),
+    ("America/New_York", 0.25),
+    ("America/Los_Angeles", 0.15),
+    ("America/Denver", 0.10),
+    ("Asia/Kolkata", 0.05),
+)
+# mean run lengths, in pings, of active and inactive stretches
+STEADY_RUNS = (72.0, 2.0)
+FLAPPING_RUNS = (2.0, 2.0)
+
+
+@dataclass(frozen=True)
+class FleetSpec:
+    stores: int = 1000
+    days: int = 8  # ping history ending at end_utc; covers a 7d report
+    cadence_minutes: int = 60
+    jitter_minutes: int = 10
+    timezones: Tuple[Tuple[str, float], ...] = DEFAULT_TIMEZONE_MIX
+    missing_timezone_ratio: float = 0.05  # no timezone row: DEFAULT_TZ
+    missing_hours_ratio: float = 0.10  # no business hours: open 24x7
+    overnight_ratio: float = 0.10  # hours that cross local midnight
+    flapping_ratio: float = 0.05  # status flips every couple of pings
+    end_utc: datetime = datetime(2024, 3, 15, 12, 0)  # naive UTC
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.stores < 1 or self.days < 1 or self.cadence_minutes < 1:
+            raise ValueError("stores, days and cadence_minutes must be >= 1")
+        if not 0 <= self.jitter_minutes * 2 < self.cadence_minutes:
+            raise ValueError("jitter_minutes must be under half of cadence_minutes")
+        for ratio in (self.missing_timezone_ratio, self.missing_hours_ratio, self.overnight_ratio, self.flapping_ratio):
+            if not 0 <= ratio <= 1:
+                raise ValueError("ratios must be within [0, 1]")
+        if not self.timezones or any(weight < 0 for _, weight in self.timezones):
+            raise ValueError("timezones need at least one non-negative weight")
+
+    @property
+    def pings_per_store(self) -> int:
+        return self.days * 24 * 60 // self.cadence_minutes
+
+
+def parse_timezone_mix(text: str) -> Tuple[Tuple[str, float], ...]:
+    # "America/Chicago:0.6,Asia/Kolkata:0.4"
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.strip().rpartition(":")
+        if not name:
+            raise ValueError(f"invalid timezone weight {part!r}; expected Zone/Name:weight")
+        mix.append((name, float(weight)))
+    return tuple(mix)
+
+
+def _store_id(seed: int, index: int) -> str:
+    # stable, but spread over the id space like real ids
+    return hashlib.sha1(f"{seed}:{index}".encode()).hexdigest()[:20]
+
+
+def _hhmm(rng: np.random.Generator, low_hour: int, high_hour: int) -> str:
+    return f"{int(rng.integers(low_hour, high_hour)):02d}:{int(rng.choice((0, 30))):02d}:00"
+
+
+def _business_hours(rng: np.random.Generator, spec: FleetSpec) -> List[Tuple[int, str, str]]:
+    draw = rng.random()
+    if draw < spec.missing_hours_ratio:
+        return []
+    overnight = draw < spec.missing_hours_ratio + spec.overnight_ratio
+    closed_day = int(rng.integers(0, 7)) if rng.random() < 0.3 else None
+    if overnight:
+        start, end = _hhmm(rng, 17, 22), _hhmm(rng, 1, 6)
+    else:
+        start, end = _hhmm(rng, 6, 11), _hhmm(rng, 16, 23)
+    return [(day, start, end) for day in range(7) if day != closed_day]
+
+
+def _statuses(rng: np.random.Generator, count: int, flapping: bool) -> np.ndarray:
+    # alternating active/inactive runs with geometric lengths
+    up_mean, down_mean = FLAPPING_RUNS if flapping else STEADY_RUNS
+    codes = np.empty(count, dtype=np.uint8)
+    active = rng.random() < up_mean / (up_mean + down_mean)
+    filled = 0
+    while filled < count:
+        length = int(rng.geometric(1.0 / (up_mean if active else down_mean)))
+        codes[filled : filled + length] = active
+        filled += length
+        active = not active
+    return codes
+
+
+def _ping_times(rng: np.random.Generator, spec: FleetSpec, end: int) -> np.ndarray:
+    cadence = spec.cadence_minutes * 60
+    count = spec.pings_per_store
+    offset = int(rng.integers(0, cadence))
+    times = end - offset - cadence * np.arange(count, dtype=np.int64)[::-1]
+    jitter = spec.jitter_minutes * 60
+    if jitter:
+        times = times + rng.integers(-jitter, jitter + 1, size=count)
+    return np.minimum(times, end)
+
+
+def _fleet(spec: FleetSpec) -> Iterator[Tuple[str, str | None, List[Tuple[int, str, str]], np.ndarray, np.ndarray]]:
+    rng = np.random.default_rng(spec.seed)
+    names = [name for name, _ in spec.timezones]
+    weights = np.array([weight for _, weight in spec.timezones], dtype=float)
+    weights = weights / weights.sum()
+    end = int((spec.end_utc - datetime(1970, 1, 1)).total_seconds())
+    for index in range(spec.stores):
+        tz_name = None if rng.random() < spec.missing_timezone_ratio else names[int(rng.choice(len(names), p=weights))]
+        hours = _business_hours(rng, spec)
+        times = _ping_times(rng, spec, end)
+        codes = _statuses(rng, times.size, rng.random() < spec.flapping_ratio)
+        yield _store_id(spec.seed, index), tz_name, hours, times, codes
+
+
+def write_feed(spec: FleetSpec, path: Path) -> Dict[str, int]:
+    # Streams the fleet into a zip feed at path; returns rows per member
+    counts = {"store_status": 0, "business_hours": 0, "store_timezone": 0}
+    timezone_rows: List[Tuple[str, str]] = []
+    hours_rows: List[Tuple[str, int, str, str]] = []
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("store_status.csv", "w", force_zip64=True) as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            text.write("store_id,status,timestamp_utc\n")
+            for store_id, tz_name, hours, times, codes in _fleet(spec):
+                stamps = np.datetime_as_string(times.astype("datetime64[s]"), unit="s")
+                text.write(
+                    "".join(
+                        f"{store_id},{'active' if code else 'inactive'},{stamp[:10]} {stamp[11:]} UTC\n"
+                        for stamp, code in zip(stamps.tolist(), codes.tolist())
+                    )
+                )
+                counts["store_status"] += times.size
+                if tz_name is not None:
+                    timezone_rows.append((store_id, tz_name))
+                hours_rows.extend((store_id, day, start, end) for day, start, end in hours)
+            text.flush()
+            text.detach()
+
+        for name, header, rows in (
+            ("business_hours.csv", ("store_id", "day_of_week", "start_time_local", "end_time_local"), hours_rows),
+            ("store_timezone.csv", ("store_id", "timezone_str"), timezone_rows),
+        ):
+            with zf.open(name, "w", force_zip64=True) as raw:
+                text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                writer = csv.writer(text, lineterminator="\n")
+                writer.writerow(header)
+                writer.writerows(rows)
+                text.flush()
+                text.detach()
+            counts[name.removesuffix(".csv")] = len(rows)
+    return counts
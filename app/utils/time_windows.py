@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+from bisect import bisect_right
 from datetime import datetime, timedelta, time
 from typing import List, Sequence, Tuple
 
 import pytz
 
+from app.utils.observations import STATUS_ACTIVE, ObservationArray
+
 
 def get_business_windows_for_range(
     bh_rows: Sequence[Tuple[int, str, str]] | None,
@@ -86,3 +89,150 @@ def compute_intervals_with_status(
     return uptime, downtime
 
 
+def _build_segments(timeline, earliest, end):
+    # timeline: (time, is_active) sorted by time; returns parallel lists of
+    # the status segments inside [earliest, end]
+    first_time, first_status = timeline[0]
+    if first_time > earliest:
+        timeline.insert(0, (earliest, first_status))
+    last_time, last_status = timeline[-1]
+    if last_time < end:
+        timeline.append((end, last_status))
+
+    seg_starts = []
+    seg_ends = []
+    seg_active = []
+    for (t0, s0), (t1, _s1) in zip(timeline[:-1], timeline[1:]):
+        seg_start = max(t0, earliest)
+        seg_end = min(t1, end)
+        if seg_start >= seg_end:
+            continue
+        seg_starts.append(seg_start)
+        seg_ends.append(seg_end)
+        seg_active.append(s0)
+    return seg_starts, seg_ends, seg_active
+
+
+def _sweep_horizons(timeline, windows, end, starts):
+    # Shared by the datetime and epoch-second entry points; only needs
+    # ordering and subtraction on the time values.
+    earliest = min(starts)
+    zero = end - end
+    uptime = [zero] * len(starts)
+    downtime = [zero] * len(starts)
+
+    clipped = sorted((max(w0, earliest), min(w1, end)) for w0, w1 in windows)
+    clipped = [(w0, w1) for w0, w1 in clipped if w0 < w1]
+
+    if timeline:
+        seg_starts, seg_ends, seg_active = _build_segments(timeline, earliest, end)
+    else:
+        # no observations: all business time counts as down
+        seg_starts, seg_ends, seg_active = [earliest], [end], [False]
+
+    for w0, w1 in clipped:
+        j = bisect_right(seg_ends, w0)
+        while j < len(seg_starts) and seg_starts[j] < w1:
+            x0 = max(seg_starts[j], w0)
+            x1 = min(seg_ends[j], w1)
+            totals = uptime if seg_active[j] else downtime
+            for i, start in enumerate(starts):
+                if x1 > start:
+                    totals[i] += x1 - max(x0, start)
+            j += 1
+
+    return list(zip(uptime, downtime))
+
+
+def compute_intervals_for_horizons(
+    observations: Sequence[Tuple[datetime, str]],
+    windows: Sequence[Tuple[datetime, datetime]],
+    end_utc: datetime,
+    horizons: Sequence[timedelta],
+) -> List[Tuple[timedelta, timedelta]]:
+    # Up/down totals for several lookbacks ending at end_utc, e.g. last hour,
+    # day and week. `windows` only needs to cover the longest horizon; shorter
+    # ones are suffixes of it, so every (segment, window) overlap is visited
+    # once and credited to each horizon it falls into. Results follow the
+    # order of `horizons`.
+    if not horizons:
+        return []
+    timeline = [(t, s == "active") for t, s in sorted(observations, key=lambda x: x[0])]
+    return _sweep_horizons(timeline, windows, end_utc, [end_utc - h for h in horizons])
+
+
+def compute_epoch_intervals_for_horizons(
+    observations: ObservationArray,
+    windows: Sequence[Tuple[int, int]],
+    end: int,
+    horizons: Sequence[int],
+) -> List[Tuple[int, int]]:
+    # compute_intervals_for_horizons on epoch seconds, reading a compact
+    # ObservationArray directly; horizons and results are in seconds.
+    if not horizons:
+        return []
+    times, statuses = observations.times, observations.statuses
+    order = sorted(range(len(times)), key=times.__getitem__)
+    timeline = [(times[i], statuses[i] == STATUS_ACTIVE) for i in order]
+    return _sweep_horizons(timeline, windows, end, [end - h for h in horizons])
+
+
+def compute_horizon_totals(
+    observations: Sequence[Tuple[datetime, str]],
+    bh_rows: Sequence[Tuple[int, str, str]] | None,
+    tz,
+    end_utc: datetime,
+    horizons: Sequence[timedelta],
+) -> List[Tuple[timedelta, timedelta]]:
+    if not horizons:
+        return []
+    windows = get_business_windows_for_range(bh_rows, tz, end_utc - max(horizons), end_utc)
+    return compute_intervals_for_horizons(observations, windows, end_utc, horizons)
+
+
+def compute_epoch_buckets(
+    observations: ObservationArray,
+    windows: Sequence[Tuple[int, int]],
+    start: int,
+    end: int,
+    bucket_seconds: int,
+) -> List[Tuple[int, int, int, bool, bool]]:
+    # Splits [start, end) into fixed buckets and returns, per bucket,
+    # (bucket_start, up_seconds, down_seconds, active_at_start,
+    # active_at_end). Status semantics match compute_intervals_with_status:
+    # pings before `start` only serve to carry their status in.
+    if len(observations) == 0 or end <= start:
+        return []
+    times, statuses = observations.times, observations.statuses
+    order = sorted(range(len(times)), key=times.__getitem__)
+    timeline = [(times[i], statuses[i] == STATUS_ACTIVE) for i in order]
+    seg_starts, seg_ends, seg_active = _build_segments(timeline, start, end)
+
+    n = -(-(end - start) // bucket_seconds)
+    uptime = [0] * n
+    downtime = [0] * n
+    clipped = sorted((max(w0, start), min(w1, end)) for w0, w1 in windows)
+    for w0, w1 in clipped:
+        if w0 >= w1:
+            continue
+        j = bisect_right(seg_ends, w0)
+        while j < len(seg_starts) and seg_starts[j] < w1:
+            x0 = max(seg_starts[j], w0)
+            x1 = min(seg_ends[j], w1)
+            totals = uptime if seg_active[j] else downtime
+            b = (x0 - start) // bucket_seconds
+            while x0 < x1:
+                piece_end = min(x1, start + (b + 1) * bucket_seconds)
+                totals[b] += piece_end - x0
+                x0 = piece_end
+                b += 1
+            j += 1
+
+    buckets = []
+    for b in range(n):
+        bucket_start = start + b * bucket_seconds
+        bucket_end = min(bucket_start + bucket_seconds, end)
+        first = seg_active[bisect_right(seg_starts, bucket_start) - 1]
+        last = seg_active[bisect_right(seg_starts, bucket_end - 1) - 1]
+        buckets.append((bucket_start, uptime[b], downtime[b], first, last))
+    return buckets
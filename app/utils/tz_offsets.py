@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Tuple
+
+import pytz
+
+
+# Integer-only local <-> UTC conversion for one timezone. All values are
+# epoch seconds; a "local" value is the wall-clock time read as if it were
+# UTC. The table is built once per zone from pytz's own transition data and
+# reused by every store in that zone.
+
+EPOCH = datetime(1970, 1, 1)
+DAY_SECONDS = 24 * 3600
+GAP_PROBE_SECONDS = 6 * 3600
+TABLE_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class OffsetTable:
+    tz_name: str
+    transitions: Tuple[int, ...]  # UTC instant at which each period starts
+    offsets: Tuple[int, ...]  # utcoffset of each period, in seconds
+    dst: Tuple[bool, ...]  # whether each period is daylight saving time
+
+    def _period(self, utc: int) -> int:
+        return max(0, bisect_right(self.transitions, utc) - 1)
+
+    def offset_at(self, utc: int) -> int:
+        return self.offsets[self._period(utc)]
+
+    def to_local(self, utc: int) -> int:
+        return utc + self.offset_at(utc)
+
+    def to_utc(self, local: int) -> int:
+        # Same resolution as pytz's tz.localize(dt) (is_dst=False): try the
+        # offsets in force a day either side; in a fold prefer standard time,
+        # and in a gap use the offset from before the jump.
+        candidates = {}
+        for delta in (-DAY_SECONDS, DAY_SECONDS):
+            i = self._period(local + delta)
+            utc = local - self.offsets[i]
+            if self.offset_at(utc) == self.offsets[i]:
+                candidates.setdefault(utc, self.dst[i])
+        if len(candidates) == 1:
+            return next(iter(candidates))
+        if not candidates:
+            return self.to_utc(local - GAP_PROBE_SECONDS) + GAP_PROBE_SECONDS
+        standard = [utc for utc, is_dst in candidates.items() if not is_dst]
+        return min(standard or candidates)
+
+
+def _epoch(dt: datetime) -> int:
+    return (dt - EPOCH) // timedelta(seconds=1)
+
+
+@lru_cache(maxsize=TABLE_CACHE_SIZE)
+def offset_table(tz_name: str) -> OffsetTable:
+    tz = pytz.timezone(tz_name)
+    transition_times = getattr(tz, "_utc_transition_times", None)
+    if not transition_times:
+        offset = tz.utcoffset(EPOCH) or timedelta(0)
+        return OffsetTable(tz_name, (_epoch(datetime.min),), (offset // timedelta(seconds=1),), (False,))
+    infos = tz._transition_info
+    return OffsetTable(
+        tz_name=tz_name,
+        transitions=tuple(_epoch(t) for t in transition_times),
+        offsets=tuple(info[0] // timedelta(seconds=1) for info in infos),
+        dst=tuple(bool(info[1]) for info in infos),
+    )
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, Hashable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+
+# Vectorized counterpart of time_windows.compute_intervals_with_status.
+# Everything is int64 epoch seconds; statuses are uint8 (1 = active).
+# Status semantics match the reference implementation: each observation's
+# status holds until the next one, the first status is carried back to the
+# range start and the last one forward to the range end.
+
+STATUS_ACTIVE = 1
+STATUS_INACTIVE = 0
+
+
+def to_epoch_seconds(values: Sequence[datetime]) -> np.ndarray:
+    return np.fromiter((int(v.timestamp()) for v in values), dtype=np.int64, count=len(values))
+
+
+def offsets_from_lengths(lengths: Sequence[int]) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _cumulative_uptime(
+    times: np.ndarray, codes: np.ndarray, start: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Breakpoints of the status step function, the status in force from each
+    # breakpoint on, and the active seconds accumulated up to each breakpoint.
+    breaks = np.concatenate(([start], times))
+    states = np.concatenate((codes[:1], codes)).astype(np.int64)
+    cum = np.zeros(breaks.size, dtype=np.int64)
+    np.cumsum(np.diff(breaks) * states[:-1], out=cum[1:])
+    return breaks, states, cum
+
+
+def _uptime_at(breaks: np.ndarray, states: np.ndarray, cum: np.ndarray, x: np.ndarray) -> np.ndarray:
+    k = np.searchsorted(breaks, x, side="right") - 1
+    return cum[k] + (x - breaks[k]) * states[k]
+
+
+def compute_uptime_seconds(
+    obs_times: np.ndarray,
+    obs_status: np.ndarray,
+    win_starts: np.ndarray,
+    win_ends: np.ndarray,
+    start: int,
+    end: int,
+) -> Tuple[int, int]:
+    obs_times = np.asarray(obs_times, dtype=np.int64)
+    win_starts = np.asarray(win_starts, dtype=np.int64)
+    win_ends = np.asarray(win_ends, dtype=np.int64)
+    if obs_times.size == 0:
+        # no observations: all business time in [start, end] counts as down
+        covered = np.clip(win_ends, start, end) - np.clip(win_starts, start, end)
+        return 0, int(covered[covered > 0].sum())
+
+    order = np.argsort(obs_times, kind="stable")
+    times = np.clip(obs_times[order], start, end)
+    codes = np.asarray(obs_status, dtype=np.uint8)[order]
+    breaks, states, cum = _cumulative_uptime(times, codes, start)
+
+    x0 = np.clip(win_starts, start, end)
+    x1 = np.clip(win_ends, start, end)
+    keep = x0 < x1
+    x0, x1 = x0[keep], x1[keep]
+    covered = int((x1 - x0).sum())
+    up = int((_uptime_at(breaks, states, cum, x1) - _uptime_at(breaks, states, cum, x0)).sum())
+    return up, covered - up
+
+
+def compute_uptime_batch(
+    obs_offsets: np.ndarray,
+    obs_times: np.ndarray,
+    obs_status: np.ndarray,
+    win_offsets: np.ndarray,
+    win_starts: np.ndarray,
+    win_ends: np.ndarray,
+    start: int,
+    end: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Stores are laid out CSR-style: store i owns obs_times[obs_offsets[i]:
+    # obs_offsets[i + 1]] and likewise for windows. Each store's [start, end]
+    # range is shifted onto its own slot of one global axis so a single
+    # cumulative sum and searchsorted serve the whole batch.
+    obs_offsets = np.asarray(obs_offsets, dtype=np.int64)
+    win_offsets = np.asarray(win_offsets, dtype=np.int64)
+    obs_times = np.asarray(obs_times, dtype=np.int64)
+    obs_status = np.asarray(obs_status, dtype=np.uint8)
+    win_starts = np.asarray(win_starts, dtype=np.int64)
+    win_ends = np.asarray(win_ends, dtype=np.int64)
+
+    n = obs_offsets.size - 1
+    if win_offsets.size - 1 != n:
+        raise ValueError("obs_offsets and win_offsets describe different store counts")
+    stride = end - start + 1
+
+    obs_counts = np.diff(obs_offsets)
+    win_counts = np.diff(win_offsets)
+    obs_idx = np.repeat(np.arange(n, dtype=np.int64), obs_counts)
+    win_idx = np.repeat(np.arange(n, dtype=np.int64), win_counts)
+
+    order = np.lexsort((obs_times, obs_idx))
+    times = np.clip(obs_times[order], start, end) - start + obs_idx[order] * stride
+    codes = obs_status[order]
+
+    # Seed every non-empty store with a breakpoint at its own range start,
+    # carrying its first observed status back to it.
+    nonempty = np.flatnonzero(obs_counts > 0)
+    firsts = obs_offsets[nonempty]
+    breaks = np.insert(times, firsts, nonempty * stride)
+    states = np.insert(codes, firsts, codes[firsts]).astype(np.int64)
+    cum = np.zeros(breaks.size, dtype=np.int64)
+    if breaks.size:
+        np.cumsum(np.diff(breaks) * states[:-1], out=cum[1:])
+
+    has_obs = obs_counts[win_idx] > 0
+    x0 = np.clip(win_starts, start, end) - start + win_idx * stride
+    x1 = np.clip(win_ends, start, end) - start + win_idx * stride
+    keep = has_obs & (x0 < x1)
+    covered = np.where(keep, x1 - x0, 0)
+    up_per_window = np.zeros(win_idx.size, dtype=np.int64)
+    if keep.any():
+        up_per_window[keep] = _uptime_at(breaks, states, cum, x1[keep]) - _uptime_at(breaks, states, cum, x0[keep])
+
+    up = np.bincount(win_idx, weights=up_per_window, minlength=n).astype(np.int64)
+    down = np.bincount(win_idx, weights=covered, minlength=n).astype(np.int64) - up
+    # Stores without observations count all their business time in
+    # [start, end] as downtime.
+    idle = np.where(has_obs, 0, np.maximum(x1 - x0, 0))
+    down += np.bincount(win_idx, weights=idle, minlength=n).astype(np.int64)
+    return up, down
+
+
+def compute_uptime_for_stores(
+    store_obs: Mapping[Hashable, Tuple[np.ndarray, np.ndarray]],
+    store_windows: Mapping[Hashable, Tuple[np.ndarray, np.ndarray]],
+    start: int,
+    end: int,
+) -> Dict[Hashable, Tuple[int, int]]:
+    keys: List[Hashable] = list(store_windows.keys() | store_obs.keys())
+    empty = np.zeros(0, dtype=np.int64)
+    obs = [store_obs.get(k, (empty, empty)) for k in keys]
+    wins = [store_windows.get(k, (empty, empty)) for k in keys]
+    up, down = compute_uptime_batch(
+        offsets_from_lengths([len(t) for t, _ in obs]),
+        np.concatenate([t for t, _ in obs]) if obs else empty,
+        np.concatenate([s for _, s in obs]) if obs else empty,
+        offsets_from_lengths([len(s) for s, _ in wins]),
+        np.concatenate([s for s, _ in wins]) if wins else empty,
+        np.concatenate([e for _, e in wins]) if wins else empty,
+        start,
+        end,
+    )
+    return {k: (int(u), int(d)) for k, u, d in zip(keys, up, down)}
+
+
+def compute_uptime_sliding(
+    obs_times: np.ndarray,
+    obs_status: np.ndarray,
+    win_starts: np.ndarray,
+    win_ends: np.ndarray,
+    origin: int,
+    ends: np.ndarray,
+    horizons: Sequence[int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    # One store's (up, down) seconds for every horizon ending at each of
+    # `ends`, as (len(ends), len(horizons)) arrays. Windows are sorted and
+    # disjoint (as compiled schedules expand them) and lie in [origin,
+    # max(ends)]; every end - horizon must be >= origin. Active and business
+    # seconds are accumulated once from origin, so each (end, horizon) pair
+    # is the difference of two prefix lookups.
+    ends = np.asarray(ends, dtype=np.int64)
+    horizons = np.asarray(horizons, dtype=np.int64)
+    win_starts = np.asarray(win_starts, dtype=np.int64)
+    win_ends = np.asarray(win_ends, dtype=np.int64)
+    obs_times = np.asarray(obs_times, dtype=np.int64)
+    points = np.concatenate((ends, (ends[:, None] - horizons[None, :]).ravel()))
+    if win_starts.size == 0:
+        zeros = np.zeros((ends.size, horizons.size), dtype=np.int64)
+        return zeros, zeros.copy()
+
+    covered_before = np.zeros(win_starts.size + 1, dtype=np.int64)
+    np.cumsum(win_ends - win_starts, out=covered_before[1:])
+    k = np.searchsorted(win_starts, points, side="right") - 1
+    last = np.maximum(k, 0)
+    tail_end = np.where(k >= 0, np.minimum(points, win_ends[last]), win_starts[last])
+    covered = covered_before[last] + tail_end - win_starts[last]
+
+    if obs_times.size == 0:
+        active = np.zeros_like(covered)
+    else:
+        order = np.argsort(obs_times, kind="stable")
+        times = np.maximum(obs_times[order], origin)
+        codes = np.asarray(obs_status, dtype=np.uint8)[order]
+        breaks, states, cum = _cumulative_uptime(times, codes, origin)
+        up_in = _uptime_at(breaks, states, cum, win_ends) - _uptime_at(breaks, states, cum, win_starts)
+        up_before = np.zeros(win_starts.size + 1, dtype=np.int64)
+        np.cumsum(up_in, out=up_before[1:])
+        partial = _uptime_at(breaks, states, cum, tail_end) - _uptime_at(breaks, states, cum, win_starts[last])
+        active = up_before[last] + partial
+
+    n = ends.size
+    up = active[:n, None] - active[n:].reshape(n, -1)
+    total = covered[:n, None] - covered[n:].reshape(n, -1)
+    return up, total - up
@@ -9,6 +9,9 @@ if str(ROOT) not in sys.path:
 from app.db.base import init_db
 from app.db.session import SessionLocal
 from app.models.entities import StoreStatus, BusinessHours, StoreTimezone
+from app.services.compaction_service import rebuild_status_runs
+from app.services.rollup_service import rebuild_hourly_rollups
+from app.services.watermark_service import rebuild_watermarks
 
 
 def add_demo_data():
@@ -71,6 +74,9 @@ def add_demo_data():
                     ))
         
         db.commit()
+        rebuild_hourly_rollups(db)
+        rebuild_status_runs(db)
+        rebuild_watermarks(db)
         print(f"Added demo data for {len(stores)} stores")
         print("Business hours: 9 AM - 6 PM, Monday-Friday")
         print("Timezone: America/New_York")
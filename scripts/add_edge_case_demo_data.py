@@ -9,6 +9,9 @@ if str(ROOT) not in sys.path:
 from app.db.base import init_db
 from app.db.session import SessionLocal
 from app.models.entities import StoreStatus, BusinessHours, StoreTimezone
+from app.services.compaction_service import rebuild_status_runs
+from app.services.rollup_service import rebuild_hourly_rollups
+from app.services.watermark_service import rebuild_watermarks
 
 
 def add_edge_case_demo_data():
@@ -135,6 +138,9 @@ def add_edge_case_demo_data():
                 ))
         
         db.commit()
+        rebuild_hourly_rollups(db)
+        rebuild_status_runs(db)
+        rebuild_watermarks(db)
         print("=== EDGE CASE DEMO DATA ADDED ===")
         print("store_001: Normal case (9 AM - 6 PM, ET, hourly observations)")
         print("store_002: Missing business hours (24x7 default, every 4 hours)")
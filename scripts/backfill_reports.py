@@ -0,0 +1,66 @@
+from datetime import datetime
+from pathlib import Path
+import argparse
+import sys
+
+import pytz
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db.base import init_db
+from app.db.session import ReadSessionLocal
+from app.services.backfill_service import BACKFILL_SOURCES, BACKFILL_STORE_BATCH_SIZE, run_backfill
+from app.services.report_service import HORIZONS
+from app.utils.horizons import parse_horizon, parse_horizons
+
+
+def _utc(text: str) -> datetime:
+    value = datetime.fromisoformat(text)
+    return value.replace(tzinfo=pytz.UTC) if value.tzinfo is None else value.astimezone(pytz.UTC)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write uptime reports for a range of as-of times in one pass")
+    parser.add_argument("--start", required=True, help="first as-of, ISO timestamp (UTC if no offset)")
+    parser.add_argument("--end", required=True, help="last as-of, ISO timestamp (UTC if no offset)")
+    parser.add_argument("--step", default="1d", help="spacing of as-of times, e.g. 1h, 1d (default 1d)")
+    parser.add_argument("--horizons", default=None, help="comma-separated lookbacks, e.g. 15m,6h,30d")
+    parser.add_argument("--source", choices=BACKFILL_SOURCES, default="raw", help="raw pings or status runs")
+    parser.add_argument("--long", action="store_true", help="one long-format CSV with an as_of column")
+    parser.add_argument("--store-batch-size", type=int, default=BACKFILL_STORE_BATCH_SIZE)
+    parser.add_argument("--output-dir", default="reports/backfill")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress the CSVs")
+    args = parser.parse_args()
+    try:
+        horizons = parse_horizons(args.horizons) if args.horizons else HORIZONS
+        start, end, step = _utc(args.start), _utc(args.end), parse_horizon(args.step)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    init_db()
+    db = ReadSessionLocal()
+    try:
+        output_dir = Path(args.output_dir)
+        run = run_backfill(
+            db,
+            output_dir,
+            start,
+            end,
+            step,
+            horizons=horizons,
+            long_format=args.long,
+            compress=args.gzip,
+            store_batch_size=args.store_batch_size,
+            source=args.source,
+        )
+        print(f"Backfilled {len(run.as_of_utc)} as-of times into {len(run.paths)} file(s) under {output_dir}")
+    except ValueError as exc:
+        parser.error(str(exc))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from pathlib import Path
+import gc
+import sys
+import tracemalloc
+
+import pytz
+from sqlalchemy import select
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db.base import init_db
+from app.db.session import SessionLocal
+from app.models.entities import StoreStatus
+from app.utils.observations import ObservationArray, naive_utc_to_epoch
+
+
+def _load_orm(db):
+    # previous report path: ORM entities plus (aware datetime, status) tuples
+    statuses = list(db.execute(select(StoreStatus)).scalars())
+    store_to_obs = {}
+    for s in statuses:
+        store_to_obs.setdefault(s.store_id, []).append((s.timestamp_utc.replace(tzinfo=pytz.UTC), s.status))
+    return statuses, store_to_obs
+
+
+def _load_arrays(db):
+    store_to_obs = {}
+    rows = db.execute(select(StoreStatus.store_id, StoreStatus.timestamp_utc, StoreStatus.status))
+    for store_id, timestamp_utc, status in rows:
+        obs = store_to_obs.get(store_id)
+        if obs is None:
+            obs = store_to_obs[store_id] = ObservationArray()
+        obs.append(naive_utc_to_epoch(timestamp_utc), status)
+    return store_to_obs
+
+
+def _measure(load, db):
+    db.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    held = load(db)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return retained, peak
+
+
+def main():
+    init_db()
+    db = SessionLocal()
+    try:
+        count = db.query(StoreStatus).count()
+        if count == 0:
+            print("store_status is empty; ingest or generate data first")
+            return
+        print(f"observations: {count}")
+        print("layout                 retained B/obs   peak B/obs")
+        for name, load in (("ORM + datetime tuples", _load_orm), ("ObservationArray", _load_arrays)):
+            retained, peak = _measure(load, db)
+            print(f"{name:<22} {retained / count:>15.1f} {peak / count:>12.1f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from datetime import datetime
+from pathlib import Path
+import argparse
+import sys
+import tempfile
+import time
+
+import pytz
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db.base import init_db
+from app.db.session import SessionLocal
+from app.services.report_service import ENGINES, generate_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time generate_report for 1..N worker processes")
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--engine", choices=ENGINES, default="python")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per worker count; best is reported")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    now = datetime.now(tz=pytz.UTC)
+    baseline = None
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            print("workers  seconds  speedup")
+            for workers in range(1, args.max_workers + 1):
+                best = None
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    generate_report(db, Path(tmp), now, engine=args.engine, workers=workers)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                baseline = baseline or best
+                print(f"{workers:>7}  {best:>7.3f}  {baseline / best:>6.2f}x")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
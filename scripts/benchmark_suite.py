@@ -0,0 +1,276 @@
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytz
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models.entities import BusinessHours, StoreStatus, StoreTimezone
+from app.services.report_service import ENGINES, SOURCES, generate_report
+from app.services.store_queries import load_observations
+from app.utils import uptime_engine
+from app.utils.schedules import DEFAULT_TZ, compile_store_schedule
+from app.utils.synthetic_fleet import write_feed
+from app.utils.time_windows import (
+    compute_epoch_intervals_for_horizons,
+    compute_intervals_with_status,
+    get_business_windows_for_range,
+)
+from generate_synthetic_fleet import add_spec_arguments, load_into_new_db, spec_from_args
+
+
+# Throughput, latency and peak RSS for ingest, window expansion, interval
+# computation and end-to-end reports on a synthetic fleet. Each phase runs
+# in a fresh process, so its peak RSS and caches are its own.
+
+HORIZONS = (3600, 86400, 7 * 86400)
+DEFAULT_REPORTS = "python:raw,numpy:raw,sql:raw,python:rollup,python:compact,sql:compact"
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _result(name: str, seconds: float, items: int, unit: str, latencies=None) -> dict:
+    result = {
+        "name": name,
+        "seconds": round(seconds, 4),
+        "items": items,
+        "unit": unit,
+        "per_second": round(items / seconds, 1) if seconds > 0 else None,
+    }
+    if latencies:
+        ms = np.asarray(latencies) * 1000
+        result["latency_ms"] = {
+            "p50": round(float(np.percentile(ms, 50)), 4),
+            "p95": round(float(np.percentile(ms, 95)), 4),
+            "max": round(float(ms.max()), 4),
+        }
+    return result
+
+
+def _session(db_path: str) -> Session:
+    return Session(create_engine(f"sqlite:///{db_path}"))
+
+
+def _schedules(db: Session):
+    hours, zones = {}, {}
+    for bh in db.execute(select(BusinessHours)).scalars():
+        hours.setdefault(bh.store_id, []).append((bh.day_of_week, bh.start_time_local, bh.end_time_local))
+    for tz in db.execute(select(StoreTimezone)).scalars():
+        zones[tz.store_id] = tz.timezone_str
+    store_ids = sorted(db.execute(select(StoreStatus.store_id).distinct()).scalars())
+    return store_ids, hours, zones
+
+
+def phase_generate(spec, zip_path: str) -> list:
+    started = time.perf_counter()
+    counts = write_feed(spec, Path(zip_path))
+    return [_result("generate.feed", time.perf_counter() - started, counts["store_status"], "pings")]
+
+
+def phase_ingest(zip_path: str, db_path: str) -> list:
+    started = time.perf_counter()
+    counts = load_into_new_db(Path(zip_path), Path(db_path))
+    return [_result("ingest.load_zip_into_db", time.perf_counter() - started, counts["store_status"], "pings")]
+
+
+def phase_windows(db_path: str, end: datetime, sample: int) -> list:
+    with _session(db_path) as db:
+        store_ids, hours, zones = _schedules(db)
+    start = end - timedelta(seconds=max(HORIZONS))
+    results = []
+
+    latencies = []
+    for store_id in store_ids[:sample]:
+        tz = pytz.timezone(zones.get(store_id) or DEFAULT_TZ)
+        t0 = time.perf_counter()
+        get_business_windows_for_range(hours.get(store_id), tz, start, end)
+        latencies.append(time.perf_counter() - t0)
+    results.append(
+        _result("windows.get_business_windows_for_range", sum(latencies), len(latencies), "stores", latencies)
+    )
+
+    latencies = []
+    lo, hi = int(start.timestamp()), int(end.timestamp())
+    for store_id in store_ids:
+        t0 = time.perf_counter()
+        compile_store_schedule(hours.get(store_id, []), zones.get(store_id)).epoch_windows_for_range(lo, hi)
+        latencies.append(time.perf_counter() - t0)
+    results.append(_result("windows.compiled_schedule", sum(latencies), len(latencies), "stores", latencies))
+    return results
+
+
+def phase_intervals(db_path: str, end: datetime, sample: int) -> list:
+    with _session(db_path) as db:
+        store_ids, hours, zones = _schedules(db)
+        hi = int(end.timestamp())
+        lo = hi - max(HORIZONS)
+        store_to_obs = load_observations(db, lo, hi)
+    windows = {
+        store_id: compile_store_schedule(hours.get(store_id, []), zones.get(store_id)).epoch_windows_for_range(lo, hi)
+        for store_id in store_to_obs
+    }
+    results = []
+
+    # reference implementation, last week only, on datetimes
+    latencies = []
+    for store_id in list(store_to_obs)[:sample]:
+        obs = store_to_obs[store_id]
+        observations = [
+            (datetime.fromtimestamp(t, pytz.UTC), "active" if s else "inactive")
+            for t, s in zip(obs.times, obs.statuses)
+        ]
+        dt_windows = [
+            (datetime.fromtimestamp(a, pytz.UTC), datetime.fromtimestamp(b, pytz.UTC)) for a, b in windows[store_id]
+        ]
+        t0 = time.perf_counter()
+        compute_intervals_with_status(observations, dt_windows, end - timedelta(seconds=max(HORIZONS)), end)
+        latencies.append(time.perf_counter() - t0)
+    results.append(
+        _result("intervals.compute_intervals_with_status", sum(latencies), len(latencies), "stores", latencies)
+    )
+
+    latencies = []
+    for store_id, obs in store_to_obs.items():
+        t0 = time.perf_counter()
+        compute_epoch_intervals_for_horizons(obs, windows[store_id], hi, HORIZONS)
+        latencies.append(time.perf_counter() - t0)
+    results.append(_result("intervals.sweep_horizons", sum(latencies), len(latencies), "stores", latencies))
+
+    arrays = {store_id: obs.as_numpy() for store_id, obs in store_to_obs.items()}
+    window_arrays = {
+        store_id: tuple(np.asarray(w, dtype=np.int64).reshape(-1, 2).T) for store_id, w in windows.items()
+    }
+    started = time.perf_counter()
+    for horizon in HORIZONS:
+        uptime_engine.compute_uptime_for_stores(arrays, window_arrays, hi - horizon, hi)
+    results.append(_result("intervals.numpy_batch", time.perf_counter() - started, len(arrays), "stores"))
+    return results
+
+
+def phase_report(db_path: str, end: datetime, engine: str, source: str) -> list:
+    with _session(db_path) as db, tempfile.TemporaryDirectory() as tmp:
+        stores = len(db.execute(select(StoreStatus.store_id).distinct()).all())
+        started = time.perf_counter()
+        generate_report(db, Path(tmp), end, engine=engine, source=source, store_batch_size=1000, as_of=end)
+        return [_result(f"report.{engine}.{source}", time.perf_counter() - started, stores, "stores")]
+
+
+def _run_phase(fn, *args) -> list:
+    results = fn(*args)
+    peak = round(_peak_rss_mb(), 1)
+    for result in results:
+        result["peak_rss_mb"] = peak
+    return results
+
+
+def _isolated(fn, *args) -> list:
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_run_phase, fn, *args).result()
+
+
+def _compare(results: list, spec: dict, baseline_path: Path, threshold: float) -> int:
+    # Prints each timing against the baseline; returns how many regressed
+    loaded = json.loads(baseline_path.read_text())
+    # the spec as it round-trips through JSON
+    if loaded.get("spec") != json.loads(json.dumps(spec)):
+        print("\nwarning: the baseline was run on a different fleet spec; timings are not comparable")
+    baseline = {r["name"]: r for r in loaded["results"]}
+    regressions = 0
+    print(f"\n{'benchmark':<46} {'baseline s':>10} {'current s':>10} {'ratio':>7}")
+    for result in results:
+        before = baseline.get(result["name"])
+        if before is None or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{result['name']:<46} {before['seconds']:>10.3f} {result['seconds']:>10.3f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark ingest, windows, intervals and reports on a synthetic fleet"
+    )
+    add_spec_arguments(parser)
+    parser.add_argument("--reports", default=DEFAULT_REPORTS, help="engine:source pairs to time end to end")
+    parser.add_argument("--sample-stores", type=int, default=500, help="stores for the per-store reference timings")
+    parser.add_argument("--workdir", default=None, help="keep the feed and DB here instead of a temp dir")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio flagged as a regression")
+    args = parser.parse_args()
+    try:
+        spec = spec_from_args(args)
+        reports = [tuple(pair.split(":")) for pair in args.reports.split(",") if pair]
+        for engine, source in reports:
+            if engine not in ENGINES or source not in SOURCES:
+                raise ValueError(f"unknown report {engine}:{source}")
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    end = spec.end_utc.replace(tzinfo=pytz.UTC)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        zip_path, db_path = workdir / "fleet.zip", workdir / "fleet.db"
+        db_path.unlink(missing_ok=True)
+
+        phases = [
+            (phase_generate, spec, str(zip_path)),
+            (phase_ingest, str(zip_path), str(db_path)),
+            (phase_windows, str(db_path), end, args.sample_stores),
+            (phase_intervals, str(db_path), end, args.sample_stores),
+        ] + [(phase_report, str(db_path), end, engine, source) for engine, source in reports]
+        results = []
+        for fn, *phase_args in phases:
+            for result in _isolated(fn, *phase_args):
+                print(
+                    f"{result['name']:<46} {result['seconds']:>9.3f}s {result['per_second'] or 0:>12.1f} "
+                    f"{result['unit']}/s  {result['peak_rss_mb']:>8.1f} MB"
+                )
+                results.append(result)
+
+    output = {
+        "created_at": datetime.now(tz=pytz.UTC).isoformat(),
+        "spec": {**asdict(spec), "end_utc": spec.end_utc.isoformat()},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": np.__version__,
+            "cpus": multiprocessing.cpu_count(),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(output, indent=2))
+    print(f"Results written to {args.output}")
+    if args.compare and _compare(results, output["spec"], Path(args.compare), args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
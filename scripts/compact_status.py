@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import argparse
+import sys
+
+import pytz
+from sqlalchemy import func, select
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db.base import init_db
+from app.db.session import SessionLocal
+from app.models.entities import StoreStatus, StoreStatusRun
+from app.services.compaction_service import prune_status_pings, rebuild_status_runs
+from app.services.report_service import report_now
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run-length compact store_status and prune redundant old pings")
+    parser.add_argument("--rebuild", action="store_true", help="recompute store_status_run from scratch first")
+    parser.add_argument(
+        "--retention-days",
+        type=int,
+        default=None,
+        help="prune pings older than this many days that start no status run",
+    )
+    args = parser.parse_args()
+    if args.retention_days is not None and args.retention_days < 0:
+        parser.error("--retention-days must be >= 0")
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"Rebuilt {rebuild_status_runs(db)} status runs")
+        if args.retention_days is not None:
+            # days count back from the report clock, the later of the
+            # latest ping and now
+            now = report_now(db, datetime.now(tz=pytz.UTC))
+            cutoff = (now - timedelta(days=args.retention_days)).replace(tzinfo=None)
+            print(f"Pruned {prune_status_pings(db, cutoff)} pings before {cutoff.isoformat()}")
+        pings = db.execute(select(func.count()).select_from(StoreStatus)).scalar()
+        runs = db.execute(select(func.count()).select_from(StoreStatusRun)).scalar()
+        print(f"store_status: {pings} rows, store_status_run: {runs} rows")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 from datetime import datetime
 from pathlib import Path
+import argparse
+import json
 import sys
-from pathlib import Path
 
 import pytz
 
@@ -10,22 +11,55 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from app.db.base import init_db
-from app.db.session import SessionLocal
-from app.services.report_service import generate_report
+from app.db.session import ReadSessionLocal
+from app.services.report_service import ENGINES, HORIZONS, SOURCES, generate_report
+from app.utils.horizons import parse_horizons
+from app.utils.phase_timings import PhaseTimings
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate an uptime report CSV")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default 1)")
+    parser.add_argument("--engine", choices=ENGINES, default="python")
+    parser.add_argument("--store-batch-size", type=int, default=None, help="stores computed and written per batch")
+    parser.add_argument("--source", choices=SOURCES, default="raw", help="raw pings or hourly rollups")
+    parser.add_argument("--horizons", default=None, help="comma-separated lookbacks, e.g. 15m,6h,30d")
+    parser.add_argument("--as-of", default=None, help="report end as an ISO timestamp (UTC if no offset)")
+    parser.add_argument("--gzip", action="store_true", help="write a gzip-compressed report_<ts>.csv.gz")
+    parser.add_argument("--timings", action="store_true", help="print seconds, rows and peak memory per phase")
+    args = parser.parse_args()
+    try:
+        horizons = parse_horizons(args.horizons) if args.horizons else HORIZONS
+        as_of = datetime.fromisoformat(args.as_of) if args.as_of else None
+    except ValueError as exc:
+        parser.error(str(exc))
+    if as_of is not None:
+        as_of = as_of.replace(tzinfo=pytz.UTC) if as_of.tzinfo is None else as_of.astimezone(pytz.UTC)
+
     init_db()
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         now = datetime.now(tz=pytz.UTC)
-        out = generate_report(db, Path("reports"), now)
+        timings = PhaseTimings()
+        out = generate_report(
+            db,
+            Path("reports"),
+            now,
+            engine=args.engine,
+            workers=args.workers,
+            store_batch_size=args.store_batch_size,
+            source=args.source,
+            compress=args.gzip,
+            horizons=horizons,
+            as_of=as_of,
+            timings=timings,
+        )
         print(f"Report generated: {out}")
+        if args.timings:
+            print(json.dumps(timings.to_dict(), indent=2))
     finally:
         db.close()
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,85 @@
+from pathlib import Path
+import argparse
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.models.entities import Base
+from app.services.ingest_service import load_zip_into_db
+from app.utils.synthetic_fleet import FleetSpec, parse_timezone_mix, write_feed
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FleetSpec()
+    parser.add_argument("--stores", type=int, default=defaults.stores)
+    parser.add_argument("--days", type=int, default=defaults.days, help="days of ping history")
+    parser.add_argument("--cadence-minutes", type=int, default=defaults.cadence_minutes)
+    parser.add_argument("--jitter-minutes", type=int, default=defaults.jitter_minutes)
+    parser.add_argument("--timezones", default=None, help="weighted mix, e.g. America/Chicago:0.6,Asia/Kolkata:0.4")
+    parser.add_argument("--missing-timezone-ratio", type=float, default=defaults.missing_timezone_ratio)
+    parser.add_argument("--missing-hours-ratio", type=float, default=defaults.missing_hours_ratio)
+    parser.add_argument("--overnight-ratio", type=float, default=defaults.overnight_ratio)
+    parser.add_argument("--flapping-ratio", type=float, default=defaults.flapping_ratio)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def spec_from_args(args: argparse.Namespace) -> FleetSpec:
+    return FleetSpec(
+        stores=args.stores,
+        days=args.days,
+        cadence_minutes=args.cadence_minutes,
+        jitter_minutes=args.jitter_minutes,
+        timezones=parse_timezone_mix(args.timezones) if args.timezones else FleetSpec().timezones,
+        missing_timezone_ratio=args.missing_timezone_ratio,
+        missing_hours_ratio=args.missing_hours_ratio,
+        overnight_ratio=args.overnight_ratio,
+        flapping_ratio=args.flapping_ratio,
+        seed=args.seed,
+    )
+
+
+def load_into_new_db(zip_path: Path, db_path: Path) -> dict:
+    # A fresh SQLite file at db_path, filled through the regular ingest
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        Base.metadata.create_all(bind=engine)
+        with Session(engine) as db:
+            return load_zip_into_db(db, str(zip_path))
+    finally:
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic store fleet as a zip feed and a DB")
+    add_spec_arguments(parser)
+    parser.add_argument("--zip", default="synthetic_fleet.zip", help="feed to write")
+    parser.add_argument("--db", default=None, help="also ingest the feed into a new SQLite file here")
+    parser.add_argument("--force", action="store_true", help="replace an existing --db file")
+    args = parser.parse_args()
+    try:
+        spec = spec_from_args(args)
+    except ValueError as exc:
+        parser.error(str(exc))
+    db_path = Path(args.db) if args.db else None
+    if db_path is not None and db_path.exists():
+        if not args.force:
+            parser.error(f"{db_path} exists; pass --force to replace it")
+        db_path.unlink()
+
+    started = time.perf_counter()
+    counts = write_feed(spec, Path(args.zip))
+    print(f"Wrote {args.zip} in {time.perf_counter() - started:.1f}s: {counts}")
+    if db_path is not None:
+        started = time.perf_counter()
+        counts = load_into_new_db(Path(args.zip), db_path)
+        print(f"Ingested into {db_path} in {time.perf_counter() - started:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
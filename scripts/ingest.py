@@ -1,4 +1,5 @@
 from pathlib import Path
+import json
 import sys
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -8,14 +9,25 @@ if str(ROOT) not in sys.path:
 from app.db.base import init_db
 from app.db.session import SessionLocal
 from app.services.ingest_service import load_zip_into_db
+from app.utils.phase_timings import PhaseTimings
 
 
 def main():
     init_db()
     db = SessionLocal()
+    timings = PhaseTimings()
+    rejected = {}
     try:
-        load_zip_into_db(db, "https://storage.googleapis.com/hiring-problem-statements/store-monitoring-data.zip")
-        print("Ingestion complete")
+        counts = load_zip_into_db(
+            db,
+            "https://storage.googleapis.com/hiring-problem-statements/store-monitoring-data.zip",
+            timings=timings,
+            rejected=rejected,
+        )
+        print(f"Ingestion complete: {counts}")
+        if rejected:
+            print(f"Skipped rows that could not be loaded: {rejected}")
+        print(json.dumps(timings.to_dict(), indent=2))
     finally:
         db.close()
 
@@ -0,0 +1,32 @@
+from pathlib import Path
+import argparse
+import sys
+
+from sqlalchemy import func, select
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db.base import init_db
+from app.db.session import SessionLocal
+from app.models.entities import StoreUptimeHourly
+from app.services.rollup_service import rebuild_hourly_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute store_uptime_hourly from store_status for every store")
+    parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_hourly_rollups(db)} hourly rollups")
+        stores = db.execute(select(func.count(StoreUptimeHourly.store_id.distinct()))).scalar()
+        print(f"store_uptime_hourly covers {stores} stores")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from dataclasses import replace
+from pathlib import Path
+import argparse
+import multiprocessing
+import signal
+import sys
+import threading
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db.base import init_db
+from app.db.session import ReadSessionLocal, SessionLocal
+from app.services.report_queue import WorkerConfig, new_owner, process_jobs
+
+
+def _worker(config: WorkerConfig, stop_when_idle: bool):
+    stop = threading.Event()
+    # finish the current job, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    owner = new_owner()
+    done = process_jobs(
+        SessionLocal,
+        config,
+        owner=owner,
+        stop_when_idle=stop_when_idle,
+        stop=stop,
+        read_session_factory=ReadSessionLocal,
+    )
+    print(f"{owner}: ran {done} report job(s)")
+
+
+def main():
+    env = WorkerConfig.from_env()
+    parser = argparse.ArgumentParser(description="Run queued report jobs from report_job")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes (default 1)")
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=env.max_concurrent,
+        help="jobs running at once across all workers (REPORT_MAX_CONCURRENT)",
+    )
+    parser.add_argument("--lease-seconds", type=int, default=env.lease_seconds)
+    parser.add_argument("--poll-seconds", type=float, default=env.poll_seconds)
+    parser.add_argument("--once", action="store_true", help="exit once no job can be claimed")
+    args = parser.parse_args()
+    if args.processes < 1:
+        parser.error("--processes must be >= 1")
+
+    init_db()
+    config = replace(
+        env,
+        max_concurrent=args.max_concurrent,
+        lease_seconds=args.lease_seconds,
+        poll_seconds=args.poll_seconds,
+    )
+    config.output_dir.mkdir(exist_ok=True)
+    if args.processes == 1:
+        _worker(config, args.once)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_worker, args=(config, args.once)) for _ in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.join()
+
+
+if __name__ == "__main__":
+    main()
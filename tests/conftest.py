@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.models.entities import Base
+from app.services.ingest_service import load_zip_into_db
+from app.utils.synthetic_fleet import FleetSpec, write_feed
+
+
+# a small seeded fleet covering a week of reports, loaded through the zip
+# ingest; each test module gets its own database
+FLEET_SPEC = FleetSpec(stores=40, days=8, seed=7)
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    root = tmp_path_factory.mktemp("fleet")
+    write_feed(FLEET_SPEC, root / "fleet.zip")
+    engine = create_engine(f"sqlite:///{root / 'fleet.db'}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        load_zip_into_db(db, str(root / "fleet.zip"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    # changes made by a test are rolled back
+    with Session(engine) as db:
+        yield db
+        db.rollback()
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+import pytest
+
+from app.utils.horizons import MAX_HORIZON, parse_horizon, parse_horizons
+
+
+def test_horizons_up_to_the_maximum_parse():
+    assert parse_horizons("15m,366d,52w") == (timedelta(minutes=15), MAX_HORIZON, timedelta(weeks=52))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "367d",
+        "5000000d",  # an origin before year 1
+        "99999999999d",  # past timedelta's range
+        "0h",
+        "6x",
+    ],
+)
+def test_out_of_range_or_malformed_horizons_raise_value_error(text):
+    with pytest.raises(ValueError):
+        parse_horizon(text)
+    with pytest.raises(ValueError):
+        parse_horizons(["1h", text])
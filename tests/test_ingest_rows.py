@@ -0,0 +1,104 @@
+import zipfile
+
+import pytest
+from sqlalchemy import select
+
+from app.models.entities import BusinessHours, StoreTimezone
+from app.services.ingest_service import StreamingLoad, _business_hours_row, _timezone_row, load_zip_into_db
+
+
+@pytest.mark.parametrize(
+    "row, error",
+    [
+        ({"store_id": "s", "timezone_str": ""}, "missing timezone_str"),
+        ({"store_id": "s", "timezone_str": "Mars/Olympus"}, "unknown timezone"),
+        ({"store_id": "", "timezone_str": "Asia/Kolkata"}, "missing store_id"),
+    ],
+)
+def test_timezone_row_rejects(row, error):
+    with pytest.raises(ValueError, match=error):
+        _timezone_row(row)
+
+
+def test_timezone_row_accepts_known_zones():
+    assert _timezone_row({"store_id": " s ", "timezone": "Asia/Kolkata"}) == {
+        "store_id": "s",
+        "timezone_str": "Asia/Kolkata",
+    }
+
+
+@pytest.mark.parametrize(
+    "day, start, end, error",
+    [
+        ("7", "09:00", "17:00", "not in 0"),
+        ("-1", "09:00", "17:00", "not in 0"),
+        ("1", "9am", "17:00", "not HH:MM"),
+        ("1", "09:00", "", "not HH:MM"),
+        ("1", "24:00", "17:00", "not a time of day"),
+        ("1", "09:60", "17:00", "not a time of day"),
+        ("1", "09:00", "17:00:61", "not a time of day"),
+    ],
+)
+def test_business_hours_row_rejects(day, start, end, error):
+    row = {"store_id": "s", "day": day, "start_time_local": start, "end_time_local": end}
+    with pytest.raises(ValueError, match=error):
+        _business_hours_row(row)
+
+
+@pytest.mark.parametrize("start, end", [("9:00", "17:30"), ("00:00:00", "23:59:59")])
+def test_business_hours_row_accepts_times_of_day(start, end):
+    row = {"store_id": "s", "day_of_week": "6", "start_time_local": start, "end_time_local": end}
+    assert _business_hours_row(row)["end_time_local"] == end
+
+
+def _upload(db, table, body):
+    load = StreamingLoad(db, table, "csv")
+    try:
+        load.feed(body.encode())
+        load.finish()
+    finally:
+        load.close()
+    return load
+
+
+def test_upload_counts_unloadable_rows_as_rejects(db):
+    load = _upload(
+        db,
+        "store_timezone",
+        "store_id,timezone_str\nupload-a,Mars/Olympus\nupload-b,Asia/Kolkata\nupload-c,\n",
+    )
+    assert (load.rejected, [reject["line"] for reject in load.rejects]) == (2, [2, 4])
+    zones = dict(db.execute(select(StoreTimezone.store_id, StoreTimezone.timezone_str)).all())
+    assert zones.get("upload-b") == "Asia/Kolkata"
+    assert "upload-a" not in zones and "upload-c" not in zones
+
+    load = _upload(
+        db,
+        "business_hours",
+        "store_id,day,start_time_local,end_time_local\n"
+        "upload-b,7,09:00:00,17:00:00\nupload-b,1,25:00:00,17:00:00\nupload-b,1,09:00:00,17:00:00\n",
+    )
+    assert load.rejected == 2
+    rows = db.execute(select(BusinessHours.day_of_week).where(BusinessHours.store_id == "upload-b")).all()
+    assert rows == [(1,)]
+
+
+def test_zip_load_skips_and_counts_unloadable_rows(db, tmp_path):
+    path = tmp_path / "feed.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("store_timezone.csv", "store_id,timezone_str\nzip-a,Mars/Olympus\nzip-b,Europe/Berlin\n")
+        zf.writestr(
+            "business_hours.csv",
+            "store_id,day,start_time_local,end_time_local\n"
+            "zip-a,9,09:00:00,17:00:00\nzip-a,2,09:00:00,17:00:00\nzip-b,2,9am,17:00:00\n",
+        )
+        zf.writestr(
+            "store_status.csv",
+            "store_id,status,timestamp_utc\nzip-a,active,2024-03-15 11:00:00 UTC\nzip-b,active,nope\n",
+        )
+    rejected = {}
+    counts = load_zip_into_db(db, str(path), rejected=rejected)
+    assert rejected == {"store_timezone": 1, "business_hours": 2, "store_status": 1}
+    assert (counts["store_timezone"], counts["business_hours"], counts["store_status"]) == (1, 1, 1)
+    zones = dict(db.execute(select(StoreTimezone.store_id, StoreTimezone.timezone_str)).all())
+    assert zones.get("zip-b") == "Europe/Berlin" and "zip-a" not in zones
@@ -0,0 +1,48 @@
+import csv
+from datetime import datetime
+
+import pytest
+import pytz
+
+from app.services.report_service import ENGINES, SOURCES, generate_report, open_report
+from app.utils.horizons import parse_horizons
+from tests.conftest import FLEET_SPEC
+
+
+# Every engine and source must write the same CSV as the Python engine
+# over raw pings, the reference the others were built against.
+
+FLEET_END = FLEET_SPEC.end_utc.replace(tzinfo=pytz.UTC)
+AS_OF_TIMES = [
+    None,  # derived from the latest ping
+    datetime(2024, 3, 15, 9, 0, tzinfo=pytz.UTC),
+    datetime(2024, 3, 14, 17, 42, 13, tzinfo=pytz.UTC),
+]
+HORIZON_SETS = [None, "15m,6h,3d"]
+
+
+def _rows(db, tmp_path, engine, source, as_of, horizons):
+    kwargs = {"horizons": parse_horizons(horizons)} if horizons else {}
+    path = generate_report(
+        db, tmp_path / f"{engine}_{source}", FLEET_END, engine=engine, source=source, as_of=as_of, **kwargs
+    )
+    with open_report(path, "r") as f:
+        return list(csv.reader(f))
+
+
+@pytest.mark.parametrize("horizons", HORIZON_SETS)
+@pytest.mark.parametrize("as_of", AS_OF_TIMES)
+def test_engines_and_sources_match_python_over_raw_pings(db, tmp_path, as_of, horizons):
+    expected = _rows(db, tmp_path, "python", "raw", as_of, horizons)
+    assert len(expected) == FLEET_SPEC.stores + 1
+    for engine in ENGINES:
+        for source in SOURCES:
+            assert _rows(db, tmp_path, engine, source, as_of, horizons) == expected, (engine, source)
+
+
+def test_sql_engine_matches_python_in_batches(db, tmp_path):
+    as_of = AS_OF_TIMES[1]
+    expected = _rows(db, tmp_path, "python", "raw", as_of, None)
+    path = generate_report(db, tmp_path / "batched", FLEET_END, engine="sql", store_batch_size=7, as_of=as_of)
+    with open_report(path, "r") as f:
+        assert list(csv.reader(f)) == expected
@@ -0,0 +1,117 @@
+import threading
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+import pytz
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.models.entities import ReportJob
+from app.services import report_queue
+from app.services.report_queue import WorkerConfig, execute_job
+from app.utils.horizons import format_horizons, parse_horizons
+from tests.conftest import FLEET_SPEC
+
+
+OWNER = "test-worker"
+LATEST_PING = FLEET_SPEC.end_utc.replace(tzinfo=pytz.UTC)
+
+
+@pytest.fixture
+def run_job(engine, tmp_path, monkeypatch):
+    # Runs one report job as a claimed worker would, with the clock at `now`
+    session_factory = sessionmaker(bind=engine)
+    config = WorkerConfig(output_dir=tmp_path, store_batch_size=9)
+
+    def run(now, as_of=None, horizons=None):
+        monkeypatch.setattr(report_queue, "_now", lambda: now)
+        job_id = uuid4().hex
+        with session_factory() as db:
+            db.add(
+                ReportJob(
+                    id=job_id,
+                    status="Running",
+                    created_at=now.replace(tzinfo=None),
+                    horizons=format_horizons(parse_horizons(horizons)) if horizons else None,
+                    as_of_utc=as_of.replace(tzinfo=None) if as_of is not None else None,
+                    lease_owner=OWNER,
+                    lease_expires_at=(now + timedelta(minutes=5)).replace(tzinfo=None),
+                )
+            )
+            db.commit()
+            job = db.get(ReportJob, job_id)
+            db.expunge(job)
+        assert execute_job(session_factory, job, OWNER, config)
+        with session_factory() as db:
+            return db.get(ReportJob, job_id)
+
+    return run
+
+
+def test_as_of_reports_reuse_the_latest_report_with_the_same_end(run_job):
+    as_of = datetime(2024, 3, 14, 18, tzinfo=pytz.UTC)
+    first = run_job(datetime(2024, 6, 1, tzinfo=pytz.UTC), as_of=as_of)
+    assert (first.status, first.stores_reused) == ("Complete", 0)
+    # reports for another end, or other horizons, in between are skipped over
+    run_job(datetime(2024, 6, 1, 0, 1, tzinfo=pytz.UTC), as_of=as_of - timedelta(hours=1))
+    run_job(datetime(2024, 6, 1, 0, 2, tzinfo=pytz.UTC), as_of=as_of, horizons="15m,1d")
+    again = run_job(datetime(2024, 6, 1, 0, 3, tzinfo=pytz.UTC), as_of=as_of)
+    assert again.stores_total == FLEET_SPEC.stores
+    assert (again.stores_reused, again.reuse_ratio) == (FLEET_SPEC.stores, 1.0)
+    with open(first.csv_path) as a, open(again.csv_path) as b:
+        assert a.read() == b.read()
+
+
+def test_default_reports_only_reuse_while_their_end_is_unchanged(run_job):
+    # the default end is the later of the latest ping and the trigger time,
+    # so it moves with every trigger once the clock passes the latest ping
+    run_job(datetime(2024, 6, 1, tzinfo=pytz.UTC))
+    later = run_job(datetime(2024, 6, 1, 0, 0, 1, tzinfo=pytz.UTC))
+    assert later.stores_reused == 0
+
+    # while the latest ping is ahead of the clock it is the end every time
+    run_job(LATEST_PING - timedelta(days=1))
+    again = run_job(LATEST_PING - timedelta(hours=1))
+    assert again.report_end_utc == LATEST_PING.replace(tzinfo=None)
+    assert again.stores_reused == FLEET_SPEC.stores
+
+
+class _Session:
+    def __init__(self):
+        self.rolled_back = self.closed = False
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+def test_heartbeat_retries_a_failed_renewal_until_the_lease_is_lost(monkeypatch):
+    outcomes = [OperationalError("UPDATE report_job", {}, Exception("database is locked")), True, False]
+    sessions = []
+    calls = []
+
+    def renew_lease(db, job_id, owner, lease_seconds):
+        calls.append(db)
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def session_factory():
+        sessions.append(_Session())
+        return sessions[-1]
+
+    monkeypatch.setattr(report_queue, "renew_lease", renew_lease)
+    stop = threading.Event()
+    beat = threading.Thread(target=report_queue._heartbeat, args=(session_factory, "job", OWNER, 0.04, stop))
+    beat.start()
+    beat.join(timeout=5)
+    stop.set()
+    assert not beat.is_alive()
+    # renewed after the failure and stopped only when renew_lease said so
+    assert len(calls) == 3
+    assert [s.rolled_back for s in sessions] == [True, False, False]
+    assert all(s.closed for s in sessions)
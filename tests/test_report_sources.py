@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+from sqlalchemy import delete, select
+
+from app.models.entities import StoreStatus, StoreStatusRun, StoreUptimeHourly
+from app.services import compaction_service
+from app.services.backfill_service import run_backfill
+from app.services.report_service import generate_report
+from app.services.rollup_service import refresh_hourly_rollups, uncovered_stores
+
+
+AS_OF = datetime(2024, 3, 15, 9, 30, tzinfo=pytz.UTC)
+
+
+def _first_store(db):
+    return db.execute(select(StoreStatus.store_id).order_by(StoreStatus.store_id).limit(1)).scalar()
+
+
+def test_ingest_covers_every_store_with_rollups(db):
+    assert uncovered_stores(db, int(AS_OF.timestamp())) == []
+
+
+def test_rollup_report_fails_for_stores_without_rollups(db, tmp_path):
+    store_id = _first_store(db)
+    db.execute(delete(StoreUptimeHourly).where(StoreUptimeHourly.store_id == store_id))
+    assert uncovered_stores(db, int(AS_OF.timestamp())) == [store_id]
+    with pytest.raises(ValueError, match="without hourly rollups"):
+        generate_report(db, tmp_path, AS_OF, source="rollup", as_of=AS_OF)
+
+    refresh_hourly_rollups(db, {store_id: None}, commit=False)
+    assert uncovered_stores(db, int(AS_OF.timestamp())) == []
+
+
+def test_ingest_covers_every_store_with_status_runs(db):
+    assert compaction_service.uncovered_stores(db, int(AS_OF.timestamp())) == []
+
+
+def test_compact_report_fails_for_stores_without_status_runs(db, tmp_path):
+    store_id = _first_store(db)
+    db.execute(delete(StoreStatusRun).where(StoreStatusRun.store_id == store_id))
+    assert compaction_service.uncovered_stores(db, int(AS_OF.timestamp())) == [store_id]
+    for engine in ("python", "sql"):
+        with pytest.raises(ValueError, match="without status runs"):
+            generate_report(db, tmp_path, AS_OF, engine=engine, source="compact", as_of=AS_OF)
+    with pytest.raises(ValueError, match="without status runs"):
+        run_backfill(db, tmp_path, AS_OF - timedelta(hours=2), AS_OF, timedelta(hours=1), source="compact")
+
+    compaction_service.refresh_status_runs(db, {store_id: None}, commit=False)
+    assert compaction_service.uncovered_stores(db, int(AS_OF.timestamp())) == []
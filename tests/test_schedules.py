@@ -0,0 +1,126 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from app.utils.observations import ObservationArray
+from app.utils.schedules import DAY_SECONDS, WEEK_SECONDS, compile_schedule
+from app.utils.time_windows import compute_epoch_intervals_for_horizons, get_business_windows_for_range
+
+
+# Compiled schedules against the baseline get_business_windows_for_range,
+# on weeks without a DST change (see the DST tests for those). The baseline
+# starts from the local day holding the range start, so it misses an
+# overnight shift spilling in from the day before; results are compared a
+# day in from both ends.
+
+START = datetime(2024, 1, 8, tzinfo=pytz.UTC)
+END = START + timedelta(days=14)
+
+
+def _baseline(rows, tz_name, start=START, end=END):
+    windows = get_business_windows_for_range(rows, pytz.timezone(tz_name), start, end)
+    merged = []
+    for w0, w1 in sorted((int(a.timestamp()), int(b.timestamp())) for a, b in windows):
+        if merged and w0 <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], w1))
+        else:
+            merged.append((w0, w1))
+    return merged
+
+
+def _compiled(rows, tz_name, start=START, end=END):
+    schedule = compile_schedule(rows, tz_name)
+    return list(schedule.epoch_windows_for_range(int(start.timestamp()), int(end.timestamp())))
+
+
+def _clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:00"
+
+
+def _random_rows(rng):
+    rows = []
+    for day in rng.sample(range(7), rng.randint(1, 7)):
+        start = rng.randrange(0, 24 * 4) * 900
+        end = rng.randrange(0, 24 * 4) * 900
+        rows.append((day, _clock(start), _clock(end)))
+    return rows
+
+
+def _inner(windows, start=START, end=END):
+    lo, hi = int(start.timestamp()) + DAY_SECONDS, int(end.timestamp()) - DAY_SECONDS
+    return [(max(w0, lo), min(w1, hi)) for w0, w1 in windows if min(w1, hi) > max(w0, lo)]
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("tz_name", ["America/Chicago", "Asia/Kolkata", "Pacific/Auckland"])
+def test_random_schedules_match_baseline(seed, tz_name):
+    rows = _random_rows(random.Random(seed))
+    assert _inner(_compiled(rows, tz_name)) == _inner(_baseline(rows, tz_name))
+
+
+def test_days_outside_the_week_are_ignored():
+    valid = [(0, "09:00:00", "17:00:00")]
+    invalid = [(9, "09:00:00", "17:00:00"), (-1, "22:00:00", "06:00:00"), (7, "00:00:00", "23:00:00")]
+    schedule = compile_schedule(valid + invalid, "UTC")
+    assert schedule.intervals == ((9 * 3600, 17 * 3600),)
+    assert _compiled(valid + invalid, "UTC") == _baseline(valid + invalid, "UTC")
+
+
+def test_only_invalid_days_means_never_open():
+    schedule = compile_schedule([(9, "09:00:00", "17:00:00")], "UTC")
+    assert schedule.intervals == ()
+    assert _compiled([(9, "09:00:00", "17:00:00")], "UTC") == []
+
+
+def test_intervals_are_disjoint_and_inside_the_week():
+    for seed in range(200):
+        intervals = compile_schedule(_random_rows(random.Random(seed)), "UTC").intervals
+        assert all(0 <= start < end <= WEEK_SECONDS for start, end in intervals)
+        assert all(a[1] < b[0] for a, b in zip(intervals, intervals[1:]))
+
+
+def test_overnight_sunday_wraps_to_monday():
+    schedule = compile_schedule([(6, "22:00:00", "06:00:00")], "UTC")
+    assert schedule.intervals == ((0, 6 * 3600), (6 * DAY_SECONDS + 22 * 3600, WEEK_SECONDS))
+
+
+def _utc(*args):
+    return int(datetime(*args, tzinfo=pytz.UTC).timestamp())
+
+
+@pytest.mark.parametrize(
+    "night, start, end",
+    [
+        # spring forward: 22:00 CST to 06:00 CDT, 7 hours
+        (datetime(2024, 3, 9, tzinfo=pytz.UTC), _utc(2024, 3, 10, 4), _utc(2024, 3, 10, 11)),
+        # fall back: 22:00 CDT to 06:00 CST, 9 hours
+        (datetime(2024, 11, 2, tzinfo=pytz.UTC), _utc(2024, 11, 3, 3), _utc(2024, 11, 3, 12)),
+    ],
+)
+def test_overnight_shift_across_dst_ends_at_local_end_time(night, start, end):
+    # Times are converted on their own local day, unlike the baseline, which
+    # kept the start's UTC offset for the end and so always gave 8 hours
+    rows = [(5, "22:00:00", "06:00:00")]  # Saturday night
+    windows = _compiled(rows, "America/Chicago", night, night + timedelta(days=2))
+    assert windows == [(start, end)]
+    baseline = _baseline(rows, "America/Chicago", night, night + timedelta(days=2))
+    assert baseline[0][1] - baseline[0][0] == 8 * 3600
+
+
+def test_overnight_shift_from_the_previous_day_counts_at_range_start():
+    # A report day starting at 02:00 local Sunday includes the last four
+    # hours of Saturday's 22:00-06:00 shift. The baseline expanded from the
+    # local day holding the range start and so left them out.
+    rows = [(5, "22:00:00", "06:00:00")]
+    start = datetime(2024, 1, 14, 8, tzinfo=pytz.UTC)  # 02:00 CST
+    end = start + timedelta(days=1)
+    windows = _compiled(rows, "America/Chicago", start, end)
+    assert windows == [(_utc(2024, 1, 14, 8), _utc(2024, 1, 14, 12))]
+    assert _baseline(rows, "America/Chicago", start, end) == []
+
+    obs = ObservationArray()
+    obs.append(_utc(2024, 1, 14), "active")
+    day = int(timedelta(days=1).total_seconds())
+    assert compute_epoch_intervals_for_horizons(obs, windows, int(end.timestamp()), [day]) == [(4 * 3600, 0)]
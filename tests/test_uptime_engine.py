@@ -0,0 +1,155 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+import pytz
+
+from app.utils.schedules import compile_schedule
+from app.utils.time_windows import compute_intervals_with_status
+from app.utils.uptime_engine import compute_uptime_batch, compute_uptime_seconds, offsets_from_lengths
+
+
+# compute_intervals_with_status is the reference; the numpy engine must
+# give the same up/down seconds for the same observations and windows.
+
+START = datetime(2024, 3, 4, tzinfo=pytz.UTC)
+END = START + timedelta(days=7)
+
+
+def _dt(epoch):
+    return datetime.fromtimestamp(int(epoch), pytz.UTC)
+
+
+def _epoch(value):
+    return int(value.timestamp())
+
+
+def _windows(rows, tz_name, start=START, end=END):
+    return list(compile_schedule(rows, tz_name).epoch_windows_for_range(_epoch(start), _epoch(end)))
+
+
+def _reference(observations, windows, start, end):
+    up, down = compute_intervals_with_status(
+        [(_dt(t), status) for t, status in observations],
+        [(_dt(w0), _dt(w1)) for w0, w1 in windows],
+        _dt(start),
+        _dt(end),
+    )
+    return int(up.total_seconds()), int(down.total_seconds())
+
+
+def _engine(observations, windows, start, end):
+    times = np.array([t for t, _ in observations], dtype=np.int64)
+    codes = np.array([status == "active" for _, status in observations], dtype=np.uint8)
+    win = np.array(windows, dtype=np.int64).reshape(-1, 2)
+    return compute_uptime_seconds(times, codes, win[:, 0], win[:, 1], start, end)
+
+
+def _pings(rng, count, lo, hi):
+    return [(rng.randrange(lo, hi), rng.choice(("active", "inactive"))) for _ in range(count)]
+
+
+SCHEDULES = {
+    "24x7": ([], "America/Chicago"),
+    "office": ([(d, "09:00:00", "17:00:00") for d in range(5)], "America/New_York"),
+    "overnight": ([(d, "22:00:00", "06:00:00") for d in range(7)], "America/Los_Angeles"),
+    "split": ([(1, "08:00:00", "11:30:00"), (1, "13:00:00", "20:00:00"), (6, "23:00:00", "02:00:00")], "Asia/Kolkata"),
+}
+
+
+def _cases():
+    rng = random.Random(7)
+    lo, hi = _epoch(START), _epoch(END)
+    span = hi - lo
+    return {
+        "empty": [],
+        "one": _pings(rng, 1, lo, hi),
+        "dense": _pings(rng, 500, lo, hi),
+        "before_range": _pings(rng, 20, lo - span, lo),
+        "after_range": _pings(rng, 20, hi + 1, hi + span),
+        "straddling": _pings(rng, 60, lo - span // 3, hi + span // 3),
+        "on_edges": [(lo, "inactive"), (hi, "active"), (lo + 3600, "active")],
+    }
+
+
+@pytest.mark.parametrize("schedule", sorted(SCHEDULES))
+@pytest.mark.parametrize("case", sorted(_cases()))
+def test_seconds_match_reference(schedule, case):
+    windows = _windows(*SCHEDULES[schedule])
+    observations = _cases()[case]
+    start, end = _epoch(START), _epoch(END)
+    assert _engine(observations, windows, start, end) == _reference(observations, windows, start, end)
+
+
+def test_unsorted_input_matches_sorted():
+    rng = random.Random(11)
+    observations = _pings(rng, 200, _epoch(START), _epoch(END))
+    shuffled = observations[:]
+    rng.shuffle(shuffled)
+    windows = _windows(*SCHEDULES["office"])
+    start, end = _epoch(START), _epoch(END)
+    expected = _reference(sorted(observations), windows, start, end)
+    assert _engine(shuffled, windows, start, end) == expected
+    assert _reference(shuffled, windows, start, end) == expected
+
+
+def test_sub_range_of_longer_windows():
+    # windows cover a week, the range only its last day
+    rng = random.Random(3)
+    observations = _pings(rng, 300, _epoch(START), _epoch(END))
+    windows = _windows(*SCHEDULES["overnight"])
+    start, end = _epoch(END - timedelta(days=1)), _epoch(END)
+    clipped = [(max(w0, start), min(w1, end)) for w0, w1 in windows if min(w1, end) > max(w0, start)]
+    assert _engine(observations, windows, start, end) == _reference(observations, clipped, start, end)
+
+
+def test_no_observations_counts_only_business_time_in_range():
+    windows = _windows(*SCHEDULES["24x7"])
+    start, end = _epoch(END - timedelta(hours=1)), _epoch(END)
+    assert _engine([], windows, start, end) == (0, 3600)
+
+
+@pytest.mark.parametrize(
+    "tz_name, start",
+    [
+        ("America/New_York", datetime(2024, 3, 9, tzinfo=pytz.UTC)),  # spring forward on the 10th
+        ("America/New_York", datetime(2024, 11, 2, tzinfo=pytz.UTC)),  # fall back on the 3rd
+        ("Europe/London", datetime(2024, 3, 30, tzinfo=pytz.UTC)),
+        ("Australia/Sydney", datetime(2024, 4, 6, tzinfo=pytz.UTC)),
+    ],
+)
+@pytest.mark.parametrize("schedule", ["office", "overnight"])
+def test_dst_days_match_reference(tz_name, start, schedule):
+    rows, _ = SCHEDULES[schedule]
+    rows = rows or [(d, "00:00:00", "23:59:59") for d in range(7)]
+    end = start + timedelta(days=3)
+    windows = _windows([(d, s, e) for d, s, e in rows] + [(5, "01:00:00", "04:00:00")], tz_name, start, end)
+    rng = random.Random(5)
+    observations = _pings(rng, 150, _epoch(start) - 3600, _epoch(end) + 3600)
+    assert _engine(observations, windows, _epoch(start), _epoch(end)) == _reference(
+        observations, windows, _epoch(start), _epoch(end)
+    )
+
+
+def test_batch_matches_reference_per_store():
+    cases = _cases()
+    names = sorted(cases)
+    windows = [_windows(*SCHEDULES[sorted(SCHEDULES)[i % len(SCHEDULES)]]) for i in range(len(names))]
+    observations = [sorted(cases[name], key=lambda o: -o[0]) for name in names]  # unsorted within stores
+    start, end = _epoch(START + timedelta(days=2)), _epoch(END)
+
+    up, down = compute_uptime_batch(
+        offsets_from_lengths([len(o) for o in observations]),
+        np.array([t for o in observations for t, _ in o], dtype=np.int64),
+        np.array([s == "active" for o in observations for _, s in o], dtype=np.uint8),
+        offsets_from_lengths([len(w) for w in windows]),
+        np.array([w0 for w in windows for w0, _ in w], dtype=np.int64),
+        np.array([w1 for w in windows for _, w1 in w], dtype=np.int64),
+        start,
+        end,
+    )
+    for i, name in enumerate(names):
+        clipped = [(max(w0, start), min(w1, end)) for w0, w1 in windows[i] if min(w1, end) > max(w0, start)]
+        expected = _reference(observations[i], clipped, start, end)
+        assert (int(up[i]), int(down[i])) == expected, name